@@ -1,15 +1,110 @@
-from sklearn.datasets import fetch_openml
-from sklearn.datasets import fetch_california_housing
+"""
+FileName:
+--------------------------------------------------------------------------------
+    MLtest.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの方策・価値ネットワークの学習
+    局面データセット(position_dataset)をミニバッチで読み込み、
+    policy_value_net.PolicyValueNetを学習して重みを保存する。
+    データセットがなければgame_result.txtから書き出す。
+
+History:
+--------------------------------------------------------------------------------
+    2021/12/22 作成
+    2022/01/06 方策・価値ネットワークの学習に変更
+
+"""
+
+import argparse
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import os
+import time
+
+import policy_value_net
+import position_dataset
+import reversi_core
+import symmetry
+
+DATASET_PATH = os.path.join(reversi_core.DATA_PATH, 'positions.bin')
+
+
+def train_network(dataset_path: str = DATASET_PATH,
+                  output: str = None,
+                  epochs: int = 5,
+                  batch_size: int = 256,
+                  learning_rate: float = 1e-3,
+                  seed: int = 0,
+                  isAugment: bool = True,
+                  isVerbose: bool = True,
+                  ):
+    """ ネットワークの学習
+
+    Args:
+        dataset_path (str): 局面データセットのファイル
+        output (str): 重みファイル(未指定ならpolicy_value.npz)
+        epochs (int): エポック数
+        batch_size (int): バッチサイズ
+        learning_rate (float): 学習率
+        seed (int): 乱数シード
+        isAugment (bool): Trueならバッチごとにランダムな対称変換を適用
+        isVerbose (bool): Trueならエポックごとの損失を表示
+
+    Returns:
+        (policy_value_net.PolicyValueNet): 学習したネットワーク
+    """
+
+    if not os.path.exists(dataset_path):
+        position_dataset.export_positions(dataset_path)
+
+    dataset = position_dataset.PositionDataset(dataset_path)
+    net = policy_value_net.PolicyValueNet(seed=seed)
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        start_time = time.perf_counter()
+        policy_total, value_total, batch_count = 0.0, 0.0, 0
+
+        for batch in dataset.batches(batch_size, seed=seed + epoch, isCopy=True):
+            if isAugment:
+                batch = symmetry.augment_positions(batch, -1, rng)
+            inputs, legal_mask, moves, targets = \
+                policy_value_net.encode_positions(batch)
+            policy_loss, value_loss = net.train_batch(
+                inputs, legal_mask, moves, targets, learning_rate)
+            policy_total += policy_loss
+            value_total += value_loss
+            batch_count += 1
+
+        if isVerbose:
+            print('epoch {}: policy {:.4f}, value {:.4f} ({:.1f} sec)'.format(
+                epoch + 1, policy_total / max(1, batch_count),
+                value_total / max(1, batch_count),
+                time.perf_counter() - start_time))
+
+    net.save(output)
 
-from sklearn.datasets import load_boston
+    return net
 
-dataset = load_boston()
 
-x, t = dataset.data, dataset.target
-colums = dataset.feature_names
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reversi policy/value net')
+    parser.add_argument('-d', '--dataset', default=DATASET_PATH)
+    parser.add_argument('-o', '--output', default=None)
+    parser.add_argument('-e', '--epochs', type=int, default=5)
+    parser.add_argument('-b', '--batch-size', type=int, default=256)
+    parser.add_argument('-l', '--learning-rate', type=float, default=1e-3)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--no-augment', action='store_true')
+    args = parser.parse_args()
 
-print(type(x), x.shape)
+    train_network(
+        dataset_path=args.dataset,
+        output=args.output,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.learning_rate,
+        seed=args.seed,
+        isAugment=not args.no_augment,
+    )
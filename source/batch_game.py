@@ -0,0 +1,379 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    batch_game.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの一括対戦(NumPyベクトル化)
+    N局の盤面を(N, 2)のuint64ビットボード配列で保持し、
+    合法手の算出・着手・パス・終了判定を全レーンまとめて行う。
+    ビット番号はbitboard.pyと同じ x_index * 8 + y_index とする。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import numpy as np
+
+import bitboard
+import reversi_core
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+
+BLACK_WIN = reversi_core.BLACK_WIN
+WHITE_WIN = reversi_core.WHITE_WIN
+DRAW = reversi_core.DRAW
+PASS = reversi_core.PASS
+
+# 1局の最大手数
+MAX_PLIES = bitboard.SQUARE_COUNT - 4
+
+_UINT64_ZERO = np.uint64(0)
+_FULL_MASK = np.uint64(bitboard.FULL_MASK)
+# (シフト量, シフト元マスク)を左シフト・右シフトに分けて保持
+_LEFT_SHIFTS = tuple(
+    (np.uint64(s), np.uint64(m)) for s, m in bitboard.LEFT_SHIFTS)
+_RIGHT_SHIFTS = tuple(
+    (np.uint64(s), np.uint64(m)) for s, m in bitboard.RIGHT_SHIFTS)
+
+
+def legal_moves(player: np.array, opponent: np.array):
+    """ 合法手のビットボードを一括算出
+
+    Args:
+        player (np.array): 手番側のビットボード(uint64)
+        opponent (np.array): 相手側のビットボード(uint64)
+
+    Returns:
+        (np.array): 合法手のビットボード(uint64)
+    """
+
+    empty = ~(player | opponent)
+    moves = np.zeros_like(player)
+
+    for shift, mask in _LEFT_SHIFTS:
+        o = opponent & mask
+        t = ((player & mask) << shift) & o
+        for _ in range(5):
+            t |= (t << shift) & o
+        moves |= (t << shift) & empty
+
+    for shift, mask in _RIGHT_SHIFTS:
+        o = opponent & mask
+        t = ((player & mask) >> shift) & o
+        for _ in range(5):
+            t |= (t >> shift) & o
+        moves |= (t >> shift) & empty
+
+    return moves
+
+
+def flips(player: np.array, opponent: np.array, move_bits: np.array):
+    """ 反転駒のビットボードを一括算出
+
+    Args:
+        player (np.array): 手番側のビットボード(uint64)
+        opponent (np.array): 相手側のビットボード(uint64)
+        move_bits (np.array): 着手マス目のビットボード(uint64)
+
+    Returns:
+        (np.array): 反転する駒のビットボード(uint64)
+    """
+
+    flipped = np.zeros_like(player)
+
+    for shift, mask in _LEFT_SHIFTS:
+        o = opponent & mask
+        t = ((move_bits & mask) << shift) & o
+        for _ in range(5):
+            t |= (t << shift) & o
+        # 連続した相手駒の先に自駒があれば挟み込み可能
+        bracket = ((t & mask) << shift) & player
+        flipped |= np.where(bracket != _UINT64_ZERO, t, _UINT64_ZERO)
+
+    for shift, mask in _RIGHT_SHIFTS:
+        o = opponent & mask
+        t = ((move_bits & mask) >> shift) & o
+        for _ in range(5):
+            t |= (t >> shift) & o
+        bracket = ((t & mask) >> shift) & player
+        flipped |= np.where(bracket != _UINT64_ZERO, t, _UINT64_ZERO)
+
+    return flipped
+
+
+def unpack_bits(bits: np.array):
+    """ ビットボードをマス目ごとのbool配列に展開
+
+    Args:
+        bits (np.array): ビットボード(uint64)、形状(N,)
+
+    Returns:
+        (np.array): bool配列、形状(N, 64)
+    """
+
+    byte_array = np.ascontiguousarray(bits, dtype='<u8').view(np.uint8)
+    byte_array = byte_array.reshape(len(bits), 8)
+
+    return np.unpackbits(byte_array, axis=1, bitorder='little').astype(bool)
+
+
+def popcount(bits: np.array):
+    """ ビットボードの駒数を一括算出
+
+    Args:
+        bits (np.array): ビットボード(uint64)、形状(N,)
+
+    Returns:
+        (np.array): 駒数(int)
+    """
+
+    return unpack_bits(bits).sum(axis=1)
+
+
+class BatchReversi():
+    def __init__(self, game_count: int, seed=None):
+        """ 初期化
+
+        Args:
+            game_count (int): 同時に進める局数
+            seed (int): 乱数シード(random_movesで使用)
+        """
+
+        self.game_count = game_count
+        self.rng = np.random.default_rng(seed)
+
+        self.init_pieces()
+
+        return
+
+    def init_pieces(self):
+        """ 全レーンの盤面初期化
+        """
+
+        N = self.game_count
+
+        # ビットボード(列インデックスはBLACK_PIECE/WHITE_PIECE)
+        self.bit_boards = np.zeros((N, 2), dtype=np.uint64)
+        self.bit_boards[:, BLACK_PIECE] = bitboard.INITIAL_BLACK
+        self.bit_boards[:, WHITE_PIECE] = bitboard.INITIAL_WHITE
+
+        # 手番(黒が先手)
+        self.player_turn = np.full(N, BLACK_PIECE, dtype=np.int8)
+        # 終局フラグ
+        self.is_over = np.zeros(N, dtype=bool)
+
+        # 指し手の記録(ビット番号と手番、未着手は-1)
+        self.plies = np.zeros(N, dtype=np.int16)
+        self.move_history = np.full((N, MAX_PLIES), -1, dtype=np.int8)
+        self.turn_history = np.full((N, MAX_PLIES), -1, dtype=np.int8)
+
+        self._update_legal_moves_()
+
+        return
+
+    def _player_boards_(self):
+        """ 手番側・相手側のビットボード
+
+        Returns:
+            (tuple): (手番側, 相手側)のビットボード配列
+        """
+
+        lanes = np.arange(self.game_count)
+        turn = self.player_turn.astype(np.intp)
+        player = self.bit_boards[lanes, turn]
+        opponent = self.bit_boards[lanes, 1 - turn]
+
+        return player, opponent
+
+    def _update_legal_moves_(self):
+        """ 合法手の更新とパス・終了判定
+        """
+
+        player, opponent = self._player_boards_()
+        moves = legal_moves(player, opponent)
+        opponent_moves = legal_moves(opponent, player)
+
+        # 手番側に合法手がなく、相手にはある場合はパス
+        isPass = (moves == _UINT64_ZERO) & (opponent_moves != _UINT64_ZERO)
+        self.player_turn = np.where(
+            isPass, 1 - self.player_turn, self.player_turn).astype(np.int8)
+        moves = np.where(isPass, opponent_moves, moves)
+
+        # 双方に合法手がなければ終局
+        self.is_over |= moves == _UINT64_ZERO
+        self.legal_bits = np.where(self.is_over, _UINT64_ZERO, moves)
+
+        return
+
+    def legal_move_mask(self):
+        """ 手番側の合法手マスク
+
+        Returns:
+            (np.array): bool配列、形状(N, 64)
+        """
+
+        return unpack_bits(self.legal_bits)
+
+    def planes(self):
+        """ 黒・白の盤面プレーン
+
+        Returns:
+            (np.array): bool配列、形状(N, 2, 8, 8)
+        """
+
+        N = self.game_count
+        black = unpack_bits(self.bit_boards[:, BLACK_PIECE])
+        white = unpack_bits(self.bit_boards[:, WHITE_PIECE])
+
+        return np.stack([black, white], axis=1).reshape(
+            N, 2, bitboard.BOARD_SIZE, bitboard.BOARD_SIZE)
+
+    def step(self, moves: np.array):
+        """ 全レーンの着手
+
+        Args:
+            moves (np.array): レーンごとのビット番号(終局レーンはPASSを指定)
+
+        Raises:
+            reversi_core.ReversiException: 非合法手を指定した場合に例外送出
+        """
+
+        moves = np.asarray(moves, dtype=np.int64)
+        active = ~self.is_over
+
+        move_bits = np.where(
+            active,
+            np.left_shift(np.uint64(1), np.maximum(moves, 0).astype(np.uint64)),
+            _UINT64_ZERO,
+        )
+        if np.any(active & ((moves < 0) | (move_bits & self.legal_bits
+                                             == _UINT64_ZERO))):
+            raise reversi_core.ReversiException(
+                reversi_core.ReversiException.NOT_EMPTY)
+
+        player, opponent = self._player_boards_()
+        flipped = flips(player, opponent, move_bits)
+
+        player = player | flipped | move_bits
+        opponent = opponent & ~flipped
+
+        lanes = np.arange(self.game_count)
+        turn = self.player_turn.astype(np.intp)
+        self.bit_boards[lanes, turn] = player
+        self.bit_boards[lanes, 1 - turn] = opponent
+
+        # 指し手の記録
+        active_lanes = lanes[active]
+        ply = self.plies[active].astype(np.intp)
+        self.move_history[active_lanes, ply] = moves[active]
+        self.turn_history[active_lanes, ply] = self.player_turn[active]
+        self.plies[active] += 1
+
+        # プレイヤーターンの切替
+        self.player_turn = np.where(
+            active, 1 - self.player_turn, self.player_turn).astype(np.int8)
+
+        self._update_legal_moves_()
+
+        return
+
+    def random_moves(self):
+        """ 合法手から一様ランダムに選択
+
+        Returns:
+            (np.array): レーンごとのビット番号(終局レーンはPASS)
+        """
+
+        mask = self.legal_move_mask()
+        score = self.rng.random(mask.shape)
+        score[~mask] = -1.0
+        moves = np.argmax(score, axis=1)
+
+        return np.where(self.is_over, PASS, moves)
+
+    def run(self, policy=None):
+        """ 全レーンが終局するまで対戦
+
+        Args:
+            policy (function): BatchReversiを受け取りレーンごとの
+                ビット番号を返す関数(未指定ならランダム)
+
+        Returns:
+            (np.array): レーンごとの勝敗結果
+        """
+
+        if policy is None:
+            policy = BatchReversi.random_moves
+
+        while not np.all(self.is_over):
+            self.step(policy(self))
+
+        return self.judge()
+
+    def count_pieces(self):
+        """ 黒白コマ数カウント
+
+        Returns:
+            (dict): BLACK_PIECE,WHITE_PIECEをKeyとして、レーンごとの個数
+        """
+
+        return {
+            BLACK_PIECE: popcount(self.bit_boards[:, BLACK_PIECE]),
+            WHITE_PIECE: popcount(self.bit_boards[:, WHITE_PIECE]),
+        }
+
+    def judge(self):
+        """ レーンごとの勝敗判定
+
+        Returns:
+            (np.array): BLACK_WIN/WHITE_WIN/DRAW(未終局はPASS)
+        """
+
+        counters = self.count_pieces()
+        black = counters[BLACK_PIECE]
+        white = counters[WHITE_PIECE]
+
+        judge = np.full(self.game_count, DRAW, dtype=np.int8)
+        judge[black > white] = BLACK_WIN
+        judge[black < white] = WHITE_WIN
+        judge[~self.is_over] = PASS
+
+        return judge
+
+    def game_records(self):
+        """ 棋譜(game_result.txt形式)に変換
+
+        Returns:
+            (list): dict型(result,process)のリスト
+        """
+
+        counters = self.count_pieces()
+        player_keys = {BLACK_PIECE: 'b', WHITE_PIECE: 'w'}
+
+        records = list()
+        for lane in range(self.game_count):
+            process = ''
+            for ply in range(int(self.plies[lane])):
+                x_index, y_index = bitboard.index_to_pos(
+                    int(self.move_history[lane, ply]))
+                process += '{}{}{}'.format(
+                    player_keys[int(self.turn_history[lane, ply])],
+                    chr(0x41 + x_index),
+                    chr(0x31 + y_index),
+                )
+            records.append(
+                {
+                    'result': {
+                        'black': int(counters[BLACK_PIECE][lane]),
+                        'wihte': int(counters[WHITE_PIECE][lane]),
+                    },
+                    'process': process,
+                }
+            )
+
+        return records
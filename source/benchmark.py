@@ -0,0 +1,380 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    benchmark.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの性能計測
+    固定シードで生成した局面・棋譜に対して次の処理の速度を計測する。
+        judge_put_square : 全マス目の配置判定
+        judge_trun       : パス・ゲーム終了判定
+        self_play        : ランダム自己対戦(ゲーム/秒)
+        perft            : 初期局面から指定深さまでの全展開(ノード/秒)
+        replay           : 棋譜の再生(assemble_game_arrayと一括再生)
+    各項目はMIN_TIME秒以上繰り返す計測をREPEAT回行い、最も速い回を採用する。
+    結果はJSONで保存し、保存済みの基準(baseline)と比較できる。
+    基準より許容率を超えて遅い項目があれば終了コード1を返す。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import bitboard
+import replay
+import reversi_core
+import reversi_game
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+
+# 初期局面からの全展開のノード数(正しさの確認用)
+PERFT_NODES = (1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288)
+
+# 基準との比較で許容する速度低下の割合
+TOLERANCE = 0.10
+# 1回の計測の最短時間(秒、満たすまで繰り返して計測誤差を抑える)
+MIN_TIME = 0.2
+# 計測回数(最も速い回を採用)
+REPEAT = 5
+
+# 計測の規模(通常、quick)
+SIZES = {
+    'normal': {'positions': 500, 'games': 200, 'perft_depth': 7,
+               'replay_games': 2000},
+    'quick': {'positions': 100, 'games': 30, 'perft_depth': 5,
+              'replay_games': 200},
+}
+
+
+def random_game(rng):
+    """ ランダム対局の棋譜と途中局面
+
+    Args:
+        rng (random.Random): 乱数生成器
+
+    Returns:
+        (tuple): (棋譜文字列, 局面のリスト[(黒, 白, 手番)])
+    """
+
+    boards = [bitboard.INITIAL_BLACK, bitboard.INITIAL_WHITE]
+    turn = BLACK_PIECE
+    process = list()
+    positions = list()
+    passed = False
+    while True:
+        player, opponent = boards[turn], boards[1-turn]
+        moves = list(bitboard.iter_bits(bitboard.legal_moves(player, opponent)))
+        if not moves:
+            if passed:
+                break
+            passed = True
+            turn = 1 - turn
+            continue
+        passed = False
+        positions.append((boards[BLACK_PIECE], boards[WHITE_PIECE], turn))
+
+        index = moves[rng.randrange(len(moves))]
+        flipped = bitboard.flips(player, opponent, index)
+        boards[turn] = player | flipped | (1 << index)
+        boards[1-turn] = opponent & ~flipped
+
+        x_index, y_index = bitboard.index_to_pos(index)
+        process.append('{}{}{}'.format(
+            'b' if turn == BLACK_PIECE else 'w',
+            chr(0x41 + x_index), chr(0x31 + y_index)))
+        turn = 1 - turn
+
+    return ''.join(process), positions
+
+
+def fixed_positions(count: int, seed: int = 0):
+    """ 固定シードの局面
+
+    Returns:
+        (list): [(黒, 白, 手番)]
+    """
+
+    rng = random.Random(seed)
+    positions = list()
+    while len(positions) < count:
+        _, game_positions = random_game(rng)
+        positions.extend(game_positions)
+
+    return positions[:count]
+
+
+def fixed_records(count: int, seed: int = 0):
+    """ 固定シードの棋譜
+
+    Returns:
+        (list): 棋譜文字列のリスト
+    """
+
+    rng = random.Random(seed)
+
+    return [random_game(rng)[0] for _ in range(count)]
+
+
+def perft(player: int, opponent: int, depth: int, passed: bool = False):
+    """ 指定深さまでの葉ノード数(パスも1手、終局は葉)
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+        depth (int): 深さ
+        passed (bool): 直前がパスならTrue
+
+    Returns:
+        (int): 葉ノード数
+    """
+
+    if depth == 0:
+        return 1
+
+    moves = bitboard.legal_moves(player, opponent)
+    if not moves:
+        if passed:
+            return 1
+        return perft(opponent, player, depth - 1, True)
+
+    nodes = 0
+    for index in bitboard.iter_bits(moves):
+        flipped = bitboard.flips(player, opponent, index)
+        nodes += perft(opponent & ~flipped, player | flipped | (1 << index),
+                       depth - 1)
+
+    return nodes
+
+
+def _measure_(function, repeat: int, min_time: float = None):
+    """ 最も速い回の実行時間を計測
+
+    1回の計測はmin_time秒以上になるまでfunctionを繰り返す。
+
+    Args:
+        function (function): 処理数を返す関数
+        repeat (int): 計測回数
+        min_time (float): 1回の計測の最短時間(未指定ならMIN_TIME)
+
+    Returns:
+        (tuple): (最も速い回の秒数, その回の処理数)
+    """
+
+    if min_time is None:
+        min_time = MIN_TIME
+
+    best = None
+    for _ in range(repeat):
+        ops = 0
+        start = time.perf_counter()
+        while True:
+            ops += function()
+            seconds = time.perf_counter() - start
+            if seconds >= min_time:
+                break
+        if best is None or ops / seconds > best[1] / best[0]:
+            best = (seconds, ops)
+
+    return best
+
+
+def bench_judge_put_square(positions: list, repeat: int):
+    game = reversi_core.ReversiCore()
+    squares = [bitboard.index_to_pos(i) for i in range(bitboard.SQUARE_COUNT)]
+
+    def _run_():
+        for black, white, turn in positions:
+            game.set_position(black, white, turn)
+            for pos in squares:
+                game.judge_put_square(pos, turn)
+        return len(positions) * len(squares)
+
+    return _measure_(_run_, repeat)
+
+
+def bench_judge_trun(positions: list, repeat: int):
+    game = reversi_core.ReversiCore()
+
+    def _run_():
+        for black, white, turn in positions:
+            game.set_position(black, white, turn)
+            game.judge_trun(turn)
+        return len(positions)
+
+    return _measure_(_run_, repeat)
+
+
+def bench_self_play(game_count: int, repeat: int):
+    game = reversi_game.ReversiGame()
+
+    def _run_():
+        for seed in range(game_count):
+            random.seed(seed)
+            game.run(isMsample=True, isRecord=False)
+        return game_count
+
+    return _measure_(_run_, repeat)
+
+
+def bench_perft(depth: int, repeat: int):
+    expected = PERFT_NODES[depth] if depth < len(PERFT_NODES) else None
+
+    def _run_():
+        nodes = perft(bitboard.INITIAL_BLACK, bitboard.INITIAL_WHITE, depth)
+        if expected is not None and nodes != expected:
+            raise AssertionError(
+                'perft({}) = {}, expected {}'.format(depth, nodes, expected))
+        return nodes
+
+    return _measure_(_run_, repeat)
+
+
+def bench_replay_game(records: list, repeat: int):
+    def _run_():
+        plies = 0
+        for process in records:
+            plies += len(replay.replay_game_array(process))
+        return plies
+
+    return _measure_(_run_, repeat)
+
+
+def bench_replay_bulk(records: list, repeat: int):
+    def _run_():
+        black, white, _ = replay.replay_bitboards(records)
+        replay.to_planes(black, white)
+        return len(black)
+
+    return _measure_(_run_, repeat)
+
+
+def run_benchmarks(size: str = 'normal', repeat: int = REPEAT,
+                   only: list = None, isVerbose: bool = True):
+    """ 全項目の計測
+
+    Args:
+        size (str): 計測の規模('normal','quick')
+        repeat (int): 計測回数(最も速い回を採用、1回はMIN_TIME秒以上)
+        only (list): 計測する項目名(未指定なら全項目)
+        isVerbose (bool): Trueなら項目ごとに表示
+
+    Returns:
+        (dict): 計測結果
+    """
+
+    params = SIZES[size]
+    positions = fixed_positions(params['positions'])
+    records = fixed_records(params['replay_games'])
+
+    benchmarks = (
+        ('judge_put_square', 'squares',
+         lambda: bench_judge_put_square(positions, repeat)),
+        ('judge_trun', 'positions',
+         lambda: bench_judge_trun(positions, repeat)),
+        ('self_play', 'games',
+         lambda: bench_self_play(params['games'], repeat)),
+        ('perft', 'nodes',
+         lambda: bench_perft(params['perft_depth'], repeat)),
+        ('replay_game', 'plies',
+         lambda: bench_replay_game(records, repeat)),
+        ('replay_bulk', 'plies',
+         lambda: bench_replay_bulk(records, repeat)),
+    )
+
+    results = dict()
+    for name, unit, function in benchmarks:
+        if only and name not in only:
+            continue
+        seconds, ops = function()
+        results[name] = {
+            'unit': unit,
+            'ops': ops,
+            'seconds': seconds,
+            'ops_per_sec': ops / seconds if seconds else 0.0,
+        }
+        if isVerbose:
+            print('{:18s} {:12.1f} {}/sec ({:.3f} sec)'.format(
+                name, results[name]['ops_per_sec'], unit, seconds))
+
+    return {
+        'size': size,
+        'repeat': repeat,
+        'min_time': MIN_TIME,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = TOLERANCE):
+    """ 基準との比較
+
+    Args:
+        report (dict): 今回の計測結果
+        baseline (dict): 基準の計測結果
+        tolerance (float): 許容する速度低下の割合
+
+    Returns:
+        (list): [(項目名, 基準ops/sec, 今回ops/sec, 比率, 低下ならTrue)]
+    """
+
+    rows = list()
+    for name, result in report['results'].items():
+        base = baseline.get('results', dict()).get(name)
+        if base is None or not base['ops_per_sec']:
+            continue
+        ratio = result['ops_per_sec'] / base['ops_per_sec']
+        rows.append((name, base['ops_per_sec'], result['ops_per_sec'], ratio,
+                     ratio < 1.0 - tolerance))
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reversi benchmarks')
+    parser.add_argument('-o', '--output', default=None)
+    parser.add_argument('-b', '--baseline', default=None)
+    parser.add_argument('-t', '--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('-r', '--repeat', type=int, default=REPEAT)
+    parser.add_argument('-m', '--min-time', type=float, default=MIN_TIME)
+    parser.add_argument('--quick', action='store_true')
+    parser.add_argument('--only', nargs='*', default=None)
+    args = parser.parse_args()
+
+    MIN_TIME = args.min_time
+    report = run_benchmarks(
+        size='quick' if args.quick else 'normal',
+        repeat=args.repeat,
+        only=args.only,
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    isRegression = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('size') != report['size']:
+            print('warning: baseline size is {}'.format(baseline.get('size')))
+        print('{:18s} {:>12s} {:>12s} {:>7s}'.format(
+            'benchmark', 'baseline', 'current', 'ratio'))
+        for name, base, current, ratio, isSlow in compare(
+                report, baseline, args.tolerance):
+            print('{:18s} {:12.1f} {:12.1f} {:7.2f}{}'.format(
+                name, base, current, ratio, '  REGRESSION' if isSlow else ''))
+            isRegression = isRegression or isSlow
+
+    sys.exit(1 if isRegression else 0)
@@ -0,0 +1,290 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    bitboard.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシのビットボード演算
+    盤面を黒・白それぞれ64bit整数で表現し、シフトとマスクで
+    合法手・反転駒を算出する。
+    ビット番号はマス目インデックス(x_index,y_index)に対して
+    x_index * 8 + y_index とする。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+BOARD_SIZE = 8
+SQUARE_COUNT = BOARD_SIZE * BOARD_SIZE
+
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+# y_index == 0 / y_index == 7 のマス目
+Y_FIRST_MASK = 0x0101010101010101
+Y_LAST_MASK = 0x8080808080808080
+
+# 隣接八方向(dx, dy)
+DIRECTIONS = (
+    (-1, -1), (0, -1), (1, -1),
+    (-1, 0),           (1, 0),
+    (-1, 1),  (0, 1),  (1, 1),
+)
+
+
+def _direction_shift_(direct: tuple):
+    """ 方向に対するシフト量とシフト元マスクを算出
+
+    Args:
+        direct (tuple): 方向(dx, dy)
+
+    Returns:
+        (tuple): (シフト量, シフト元マスク)
+    """
+
+    dx, dy = direct
+    mask = FULL_MASK
+    # y方向の折り返しを防ぐため端のマス目を除外
+    if dy > 0:
+        mask &= ~Y_LAST_MASK
+    elif dy < 0:
+        mask &= ~Y_FIRST_MASK
+
+    return dx * BOARD_SIZE + dy, mask & FULL_MASK
+
+
+# 左シフト方向と右シフト方向に分けて保持(シフト量は正数)
+LEFT_SHIFTS = tuple(
+    _direction_shift_(d) for d in DIRECTIONS if _direction_shift_(d)[0] > 0)
+RIGHT_SHIFTS = tuple(
+    (-s, m) for s, m in (_direction_shift_(d) for d in DIRECTIONS) if s < 0)
+SHIFTS = tuple(_direction_shift_(d) for d in DIRECTIONS)
+
+
+def _rays_():
+    """ マス目ごと・方向ごとの走査ビット列
+
+    Returns:
+        (tuple): RAYS[ビット番号]に、方向ごとのビット列(2マス以上)のタプル
+    """
+
+    rays = list()
+    for index in range(SQUARE_COUNT):
+        x_index, y_index = divmod(index, BOARD_SIZE)
+        square_rays = list()
+        for dx, dy in DIRECTIONS:
+            ray = list()
+            x, y = x_index + dx, y_index + dy
+            while 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+                ray.append(1 << (x * BOARD_SIZE + y))
+                x, y = x + dx, y + dy
+            # 挟み込みには2マス以上必要
+            if len(ray) >= 2:
+                square_rays.append(tuple(ray))
+        rays.append(tuple(square_rays))
+
+    return tuple(rays)
+
+
+RAYS = _rays_()
+
+# 初期配置
+INITIAL_BLACK = (1 << (3 * BOARD_SIZE + 3)) | (1 << (4 * BOARD_SIZE + 4))
+INITIAL_WHITE = (1 << (3 * BOARD_SIZE + 4)) | (1 << (4 * BOARD_SIZE + 3))
+
+
+def pos_to_index(pos_index):
+    """ マス目インデックスをビット番号に変換
+
+    Args:
+        pos_index (list): マス目インデックス(x_index,y_index)
+
+    Returns:
+        (int): ビット番号
+    """
+
+    x_index, y_index = pos_index
+    return int(x_index) * BOARD_SIZE + int(y_index)
+
+
+def index_to_pos(index: int):
+    """ ビット番号をマス目インデックスに変換
+
+    Args:
+        index (int): ビット番号
+
+    Returns:
+        (tuple): マス目インデックス(x_index,y_index)
+    """
+
+    return divmod(index, BOARD_SIZE)
+
+
+def in_board(pos_index):
+    """ マス目インデックスが盤面内か判定
+
+    Args:
+        pos_index (list): マス目インデックス(x_index,y_index)
+
+    Returns:
+        (bool): 盤面内ならTrue
+    """
+
+    x_index, y_index = pos_index
+    return 0 <= x_index < BOARD_SIZE and 0 <= y_index < BOARD_SIZE
+
+
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:
+    def popcount(bits: int):
+        """ 立っているビット数
+
+        Args:
+            bits (int): ビットボード
+
+        Returns:
+            (int): ビット数
+        """
+
+        return bin(bits).count('1')
+
+
+def iter_bits(bits: int):
+    """ 立っているビット番号を昇順に列挙
+
+    Args:
+        bits (int): ビットボード
+
+    Yields:
+        (int): ビット番号
+    """
+
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def legal_moves(player: int, opponent: int):
+    """ 合法手のビットボードを算出
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (int): 合法手のマス目に立つビットボード
+    """
+
+    empty = ~(player | opponent) & FULL_MASK
+    moves = 0
+
+    for shift, mask in LEFT_SHIFTS:
+        o = opponent & mask
+        t = ((player & mask) << shift) & o
+        t |= (t << shift) & o
+        t |= (t << shift) & o
+        t |= (t << shift) & o
+        t |= (t << shift) & o
+        t |= (t << shift) & o
+        moves |= ((t & mask) << shift) & empty
+
+    for shift, mask in RIGHT_SHIFTS:
+        o = opponent & mask
+        t = ((player & mask) >> shift) & o
+        t |= (t >> shift) & o
+        t |= (t >> shift) & o
+        t |= (t >> shift) & o
+        t |= (t >> shift) & o
+        t |= (t >> shift) & o
+        moves |= ((t & mask) >> shift) & empty
+
+    return moves
+
+
+def flips_by_direction(player: int, opponent: int, index: int):
+    """ 方向ごとの反転駒を算出
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+        index (int): 配置するマス目のビット番号
+
+    Returns:
+        (list): (方向(dx, dy), 反転駒のビット番号リスト)のリスト
+    """
+
+    result = list()
+    origin = 1 << index
+
+    for direct, (shift, mask) in zip(DIRECTIONS, SHIFTS):
+        line = list()
+        cursor = origin
+        while True:
+            if not cursor & mask:
+                line = None
+                break
+            if shift > 0:
+                cursor = (cursor << shift) & FULL_MASK
+            else:
+                cursor >>= -shift
+            if cursor & opponent:
+                line.append(cursor.bit_length() - 1)
+            else:
+                if not (cursor & player) or not line:
+                    line = None
+                break
+        if line:
+            result.append((direct, line))
+
+    return result
+
+
+def flips(player: int, opponent: int, index: int):
+    """ 反転駒のビットボードを算出
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+        index (int): 配置するマス目のビット番号
+
+    Returns:
+        (int): 反転する駒のビットボード(非合法手なら0)
+    """
+
+    flipped = 0
+
+    for ray in RAYS[index]:
+        line = 0
+        for bit in ray:
+            if bit & opponent:
+                line |= bit
+            else:
+                if bit & player:
+                    flipped |= line
+                break
+
+    return flipped
+
+
+def play(player: int, opponent: int, index: int):
+    """ 着手後のビットボードを算出
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+        index (int): 配置するマス目のビット番号
+
+    Returns:
+        (tuple): 着手後の(手番側, 相手側)ビットボード。非合法手ならNone
+    """
+
+    if (player | opponent) >> index & 1:
+        return None
+    flipped = flips(player, opponent, index)
+    if not flipped:
+        return None
+
+    return player | flipped | (1 << index), opponent & ~flipped
@@ -6,6 +6,10 @@ FileName:
 Description:
 --------------------------------------------------------------------------------
     リバーシのゲーム描画
+    背景・盤面枠・マス目インデックスは初期化時に1枚の静的レイヤーへ、
+    駒とテキストは初回に描画したSurfaceをキャッシュして再利用する。
+    前回から変化したマス目・表示のみを描き直し、その矩形だけを
+    update_displayで画面に反映する。
 
 History:
 --------------------------------------------------------------------------------
@@ -16,17 +20,18 @@ History:
 import numpy as np
 import pygame
 
-BLACK_PIECE = 0
-WHITE_PIECE = 1
+import reversi_core
 
-BLACK_WIN = 0
-WHITE_WIN = 1
-DRAW = 2
-PASS = -1
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+EMPTY_PIECE = reversi_core.EMPTY_PIECE
 
+BLACK_WIN = reversi_core.BLACK_WIN
+WHITE_WIN = reversi_core.WHITE_WIN
+DRAW = reversi_core.DRAW
+PASS = reversi_core.PASS
 
-class ReversiException(Exception):
-    NOT_EMPTY = 'NOT EMPTY SQUARE'
+ReversiException = reversi_core.ReversiException
 
 
 class BoardSurface():
@@ -50,6 +55,25 @@ class BoardSurface():
         # フォントサイズ
         self.font_size = 24
 
+        # 描画キャッシュ(init_pygemeで生成)
+        self.static_layer = None
+        self.piece_glyphs = dict()
+        self.text_glyphs = dict()
+        self.reset_dirty()
+
+        return
+
+    def reset_dirty(self):
+        """ 差分描画の状態を初期化(次の描画で全体を描き直す)
+        """
+
+        self.isFrameDrawn = False
+        self.last_pieces = None
+        self.last_player = None
+        self.last_counter = None
+        self.dirty_rects = list()
+        self.isFullUpdate = True
+
         return
 
     def init_pygeme(self):
@@ -66,19 +90,130 @@ class BoardSurface():
         self.game_font = pygame.font.Font(
             None, self.font_size)
 
+        self.init_cache()
+
+        return
+
+    def init_cache(self):
+        """ 静的レイヤーと駒のSurfaceを生成
+        """
+
+        X, Y = 0, 1
+
+        self.text_glyphs = dict()
+
+        self.static_layer = pygame.Surface(self.screen_size)
+        self.static_layer.fill('darkgreen')
+        self._render_board_frame_(self.static_layer)
+
+        p_offset = 2
+        glyph_size = (int(self.square_size[X]), int(self.square_size[Y]))
+        self.piece_glyphs = dict()
+        for piece, color in ((BLACK_PIECE, 'black'), (WHITE_PIECE, 'white')):
+            glyph = pygame.Surface(glyph_size, pygame.SRCALPHA)
+            pygame.draw.circle(
+                surface=glyph,
+                color=color,
+                center=(self.square_size[X]/2, self.square_size[Y]/2),
+                radius=self.square_size[X]/2-p_offset*2,
+            )
+            self.piece_glyphs[piece] = glyph
+
+        self.reset_dirty()
+
+        return
+
+    def render_text(self, text_msg: str, color: str):
+        """ テキストのSurface(キャッシュ)
+
+        Args:
+            text_msg (str): 文字列
+            color (str): 文字色
+
+        Returns:
+            (pygame.Surface): 描画済みのテキスト
+        """
+
+        key = (text_msg, color)
+        text = self.text_glyphs.get(key)
+        if text is None:
+            text = self.game_font.render(text_msg, False, color)
+            self.text_glyphs[key] = text
+
+        return text
+
+    def square_rect(self, mpos_index: tuple):
+        """ マス目の矩形
+
+        Args:
+            mpos_index (tuple): マス目インデックス(x_index,y_index)
+
+        Returns:
+            (pygame.Rect): 画面上の矩形
+        """
+
+        X, Y = 0, 1
+        offset_x, offset_y = self.screnn_offset
+        x_index, y_index = mpos_index
+
+        return pygame.Rect(
+            offset_x + self.square_size[X] * x_index,
+            offset_y + self.square_size[Y] * y_index,
+            self.square_size[X], self.square_size[Y],
+        )
+
+    def restore_rect(self, rect: pygame.Rect):
+        """ 静的レイヤーで矩形を描き戻して更新対象に追加
+
+        Args:
+            rect (pygame.Rect): 矩形
+        """
+
+        self.game_screen.blit(self.static_layer, rect, rect)
+        self.dirty_rects.append(rect)
+
+        return
+
+    def update_display(self):
+        """ 変化した矩形のみを画面に反映
+        """
+
+        if self.isFullUpdate:
+            pygame.display.update()
+        elif self.dirty_rects:
+            pygame.display.update(self.dirty_rects)
+
+        self.dirty_rects = list()
+        self.isFullUpdate = False
+
         return
 
     def draw_background(self):
         """ 背景描画
         """
 
-        self.game_screen.fill('darkgreen')
+        self.game_screen.blit(self.static_layer, (0, 0))
+        self.reset_dirty()
+        self.isFrameDrawn = True
 
     def draw_board_frame(self):
-        """ 盤面枠の描画
+        """ 盤面枠の描画(静的レイヤーを描画済みなら何もしない)
+        """
+
+        if self.isFrameDrawn:
+            return
+
+        self.draw_background()
+
+        return
+
+    def _render_board_frame_(self, screen):
+        """ 盤面枠を静的レイヤーに描画
+
+        Args:
+            screen (pygame.Surface): 描画先
         """
         X, Y = 0, 1
-        screen = self.game_screen
         offset_x, offset_y = self.screnn_offset
         board_w, board_h = self.board_size
 
@@ -182,68 +317,39 @@ class BoardSurface():
         return
 
     def draw_pieces(self, pieces_on_board):
-        """ 駒配置描画
+        """ 駒配置描画(前回から変化したマス目のみ)
         """
 
-        X, Y = 0, 1
-        screen = self.game_screen
-        offset_x, offset_y = self.screnn_offset
+        if self.last_pieces is None:
+            changed = np.ones(pieces_on_board.shape, dtype=bool)
+        else:
+            changed = pieces_on_board != self.last_pieces
 
-        p_offset = 2
+        for x_index, y_index in zip(*np.nonzero(changed)):
+            rect = self.square_rect((x_index, y_index))
+            self.restore_rect(rect)
+            glyph = self.piece_glyphs.get(int(pieces_on_board[x_index, y_index]))
+            if glyph is not None:
+                self.game_screen.blit(glyph, rect)
 
-        # 黒白コマのマス目を抽出
-        black_pieces = np.where(pieces_on_board == BLACK_PIECE)
-        white_pieces = np.where(pieces_on_board == WHITE_PIECE)
-
-        if black_pieces:
-            raw, clm = black_pieces
-            for x_index, y_index in zip(raw, clm):
-                cx = offset_x + self.square_size[X] * \
-                    x_index + self.square_size[X]/2
-                cy = offset_y + self.square_size[Y] * \
-                    y_index + self.square_size[Y]/2
-                pygame.draw.circle(
-                    surface=screen,
-                    color='black',
-                    center=(cx, cy),
-                    radius=self.square_size[X]/2-p_offset*2,
-                )
-
-        if white_pieces:
-            raw, clm = white_pieces
-            for x_index, y_index in zip(raw, clm):
-                cx = offset_x + self.square_size[X] * \
-                    x_index + self.square_size[X]/2
-                cy = offset_y + self.square_size[Y] * \
-                    y_index + self.square_size[Y]/2
-                pygame.draw.circle(
-                    surface=screen,
-                    color='white',
-                    center=(cx, cy),
-                    radius=self.square_size[X]/2-p_offset*2,
-                )
+        self.last_pieces = np.array(pieces_on_board, copy=True)
 
         return
 
     def draw_player(self, player_turn):
-        """ プレイヤーターン描画
+        """ プレイヤーターン描画(手番が変わった場合のみ)
         """
 
+        if player_turn == self.last_player:
+            return
+
         X, Y = 0, 1
         t_offset_x, t_offset_y = 10, 20
         screen = self.game_screen
 
         text_msg = 'Player'
-        text = self.game_font.render(
-            text_msg,
-            False,
-            'white',
-        )
-        screen.blit(
-            text,
-            [t_offset_x, t_offset_y]
-        )
-        size = self.game_font.size(text_msg)
+        text = self.render_text(text_msg, 'white')
+        size = text.get_size()
 
         if player_turn == BLACK_PIECE:
             color = 'black'
@@ -251,28 +357,48 @@ class BoardSurface():
             color = 'white'
 
         circle_size = self.font_size/2
+        center = (t_offset_x*4+size[X], t_offset_y+size[Y]/2)
 
+        self.restore_rect(pygame.Rect(
+            t_offset_x, t_offset_y - circle_size,
+            center[X] + circle_size - t_offset_x + 1,
+            size[Y] + circle_size * 2,
+        ))
+        screen.blit(
+            text,
+            [t_offset_x, t_offset_y]
+        )
         pygame.draw.circle(
             surface=screen,
             color=color,
-            center=(t_offset_x*4+size[X], t_offset_y+size[Y]/2),
+            center=center,
             radius=circle_size,
         )
 
+        self.last_player = player_turn
+
         return
 
     def draw_counter(self, pieces_on_board):
-        """ 黒白コマ数描画
-
+        """ 黒白コマ数描画(コマ数が変わった場合のみ)
         """
-        Y = 1
+        X, Y = 0, 1
         t_offset_x = 10
         screen = self.game_screen
         circle_size = self.font_size/2
 
+        pieces_counter = self.count_pieces(pieces_on_board)
+        if pieces_counter == self.last_counter:
+            return
+
         cx = t_offset_x+circle_size
         cy = self.screen_size[Y] - self.font_size
 
+        self.restore_rect(pygame.Rect(
+            0, cy - circle_size - 2,
+            self.screen_size[X] // 2, circle_size * 2 + 4,
+        ))
+
         pygame.draw.circle(
             surface=screen,
             color='black',
@@ -287,30 +413,19 @@ class BoardSurface():
             radius=circle_size,
         )
 
-        pieces_counter = self.count_pieces(pieces_on_board)
-        text_msg = str(pieces_counter[BLACK_PIECE])
-        text = self.game_font.render(
-            text_msg,
-            False,
-            'white',
-            'darkgreen'
-        )
+        text = self.render_text(str(pieces_counter[BLACK_PIECE]), 'white')
         screen.blit(
             text,
             [cx+circle_size*2, cy-5]
         )
-        text_msg = str(pieces_counter[WHITE_PIECE])
-        text = self.game_font.render(
-            text_msg,
-            False,
-            'white',
-            'darkgreen'
-        )
+        text = self.render_text(str(pieces_counter[WHITE_PIECE]), 'white')
         screen.blit(
             text,
             [cx+circle_size*7, cy-5]
         )
 
+        self.last_counter = pieces_counter
+
         return
 
     def draw_game_over(self, judge: int):
@@ -360,6 +475,13 @@ class BoardSurface():
                 ]
             )
 
+        self.dirty_rects.append(pygame.Rect(
+            screen_w/2-dialog_size[X]/2, screen_h/2-dialog_size[Y]/2,
+            dialog_size[X], dialog_size[Y],
+        ))
+        # ダイアログの下のマス目は次の描画で描き直す
+        self.last_pieces = None
+
     def count_pieces(self, pieces_on_board):
         """ 黒白コマ数カウント
 
@@ -367,7 +489,7 @@ class BoardSurface():
             (dict): BLACK_PIECE,WHITE_PIECEをKeyとして、個数をDict型で返信
         """
 
-        black_count = np.count_nonzero(pieces_on_board == BLACK_PIECE)
-        white_count = np.count_nonzero(pieces_on_board == WHITE_PIECE)
+        black_count = int(np.count_nonzero(pieces_on_board == BLACK_PIECE))
+        white_count = int(np.count_nonzero(pieces_on_board == WHITE_PIECE))
 
         return {BLACK_PIECE: black_count, WHITE_PIECE: white_count}
@@ -0,0 +1,408 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    endgame.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの終盤完全読み
+    終局まで探索し、正確な石差(手番側 - 相手側)を求める。
+    残り空きマスが多い局面は置換表と速さ優先(相手の着手可能数が少ない順)、
+    少ない局面は偶奇(空きマスが奇数の象限を優先)で手を並べ、
+    残り2マス・1マスは専用処理で求める。
+    勝敗のみ(WLD)はnull-window(-1, 1)で探索する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import time
+
+import bitboard
+import reversi_core
+import transposition
+
+INFINITY = 1 << 10
+# 石差の範囲
+MAX_SCORE = bitboard.SQUARE_COUNT
+
+# これ以下の空きマス数は偶奇で並べ替え(置換表は使用しない)
+PARITY_EMPTIES = 6
+
+# 時間切れ確認の間隔(ノード数、2の累乗-1)
+CHECK_INTERVAL = 4095
+
+
+class SolverTimeout(Exception):
+    pass
+
+
+def _quadrant_masks_():
+    """ 象限ごとのマス目マスク
+
+    Returns:
+        (list): 4象限のビットボード
+    """
+
+    masks = [0, 0, 0, 0]
+    for index in range(bitboard.SQUARE_COUNT):
+        x_index, y_index = bitboard.index_to_pos(index)
+        quadrant = (x_index >= 4) * 2 + (y_index >= 4)
+        masks[quadrant] |= 1 << index
+
+    return masks
+
+
+QUADRANT_MASKS = _quadrant_masks_()
+
+
+def disc_difference(player: int, opponent: int):
+    """ 石差
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (int): 手番側 - 相手側の駒数
+    """
+
+    return bitboard.popcount(player) - bitboard.popcount(opponent)
+
+
+class EndgameSolver():
+    def __init__(self, table_bits: int = 18):
+        """ 初期化
+
+        Args:
+            table_bits (int): 置換表のエントリ数(2のtable_bits乗)
+        """
+
+        self.table = transposition.TranspositionTable(table_bits)
+        self.nodes = 0
+        self.deadline = None
+
+        return
+
+    def solve(self, player: int, opponent: int,
+              alpha: int = -MAX_SCORE, beta: int = MAX_SCORE,
+              deadline: float = None):
+        """ 局面の完全読み
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+            alpha (int): 探索窓の下限
+            beta (int): 探索窓の上限
+            deadline (float): time.perf_counter()基準の打ち切り時刻
+
+        Raises:
+            SolverTimeout: 打ち切り時刻を過ぎた場合に例外送出
+
+        Returns:
+            (int): 手番側から見た石差(窓の外ならその方向の境界値)
+        """
+
+        self._begin_(deadline)
+
+        return self._solve_(player, opponent, alpha, beta, False)
+
+    def solve_wld(self, player: int, opponent: int, deadline: float = None):
+        """ 勝敗のみの完全読み(null-window)
+
+        Returns:
+            (int): 勝ち1、引き分け0、負け-1
+        """
+
+        value = self.solve(player, opponent, -1, 1, deadline)
+
+        return (value > 0) - (value < 0)
+
+    def best_move(self, player: int, opponent: int,
+                  isWLD: bool = False, deadline: float = None):
+        """ 完全読みによる最善手
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+            isWLD (bool): Trueなら勝敗のみを読む
+            deadline (float): time.perf_counter()基準の打ち切り時刻
+
+        Raises:
+            SolverTimeout: 打ち切り時刻を過ぎた場合に例外送出
+
+        Returns:
+            (tuple): (最善手のビット番号, 石差)、合法手がなければ(None, 石差)
+        """
+
+        self._begin_(deadline)
+
+        moves = bitboard.legal_moves(player, opponent)
+        if not moves:
+            return None, -self._solve_(
+                opponent, player, -MAX_SCORE, MAX_SCORE, True)
+
+        if isWLD:
+            alpha, beta = -1, 1
+        else:
+            alpha, beta = -MAX_SCORE, MAX_SCORE
+
+        best_value = -INFINITY
+        best_index = None
+        for index, flipped in self._fastest_first_(player, opponent, moves):
+            value = -self._solve_(
+                opponent & ~flipped,
+                player | flipped | (1 << index),
+                -beta, -alpha, False,
+            )
+            if value > best_value:
+                best_value = value
+                best_index = index
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                break
+
+        return best_index, best_value
+
+    def _begin_(self, deadline):
+        """ 探索開始時の初期化
+        """
+
+        self.deadline = deadline
+        self.nodes = 0
+        self.table.new_search()
+
+        return
+
+    def _fastest_first_(self, player, opponent, moves, tt_move=-1):
+        """ 速さ優先の並べ替え(着手後の相手の着手可能数が少ない順)
+
+        Returns:
+            (list): (ビット番号, 反転駒)のリスト
+        """
+
+        scored = list()
+        for index in bitboard.iter_bits(moves):
+            flipped = bitboard.flips(player, opponent, index)
+            if index == tt_move:
+                score = -1
+            else:
+                score = bitboard.popcount(bitboard.legal_moves(
+                    opponent & ~flipped, player | flipped | (1 << index)))
+            scored.append((score, index, flipped))
+        scored.sort()
+
+        return [(index, flipped) for _, index, flipped in scored]
+
+    def _solve_(self, player, opponent, alpha, beta, passed):
+        """ 完全読み(ネガマックス、αβ枝刈り)
+
+        Returns:
+            (int): 手番側から見た石差
+        """
+
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & CHECK_INTERVAL \
+                and time.perf_counter() > self.deadline:
+            raise SolverTimeout()
+
+        empty = ~(player | opponent) & bitboard.FULL_MASK
+        empty_count = bitboard.popcount(empty)
+
+        if empty_count == 0:
+            return disc_difference(player, opponent)
+        if empty_count == 1:
+            return self._last1_(player, opponent, empty.bit_length() - 1)
+        if empty_count == 2:
+            first = (empty & -empty).bit_length() - 1
+            second = empty.bit_length() - 1
+            return self._last2_(
+                player, opponent, first, second, alpha, beta, passed)
+        if empty_count <= PARITY_EMPTIES:
+            return self._solve_parity_(
+                player, opponent, empty, alpha, beta, passed)
+
+        return self._solve_table_(
+            player, opponent, empty_count, alpha, beta, passed)
+
+    def _last1_(self, player, opponent, index):
+        """ 残り1マスの石差
+
+        Returns:
+            (int): 手番側から見た石差
+        """
+
+        diff = disc_difference(player, opponent)
+
+        flipped = bitboard.popcount(bitboard.flips(player, opponent, index))
+        if flipped:
+            return diff + 2 * flipped + 1
+
+        # 手番側がパスの場合は相手が打つ
+        flipped = bitboard.popcount(bitboard.flips(opponent, player, index))
+        if flipped:
+            return diff - 2 * flipped - 1
+
+        return diff
+
+    def _last2_(self, player, opponent, first, second, alpha, beta, passed):
+        """ 残り2マスの石差
+
+        Returns:
+            (int): 手番側から見た石差
+        """
+
+        best_value = -INFINITY
+
+        flipped = bitboard.flips(player, opponent, first)
+        if flipped:
+            best_value = -self._last1_(
+                opponent & ~flipped, player | flipped | (1 << first), second)
+            if best_value >= beta:
+                return best_value
+
+        flipped = bitboard.flips(player, opponent, second)
+        if flipped:
+            value = -self._last1_(
+                opponent & ~flipped, player | flipped | (1 << second), first)
+            if value > best_value:
+                best_value = value
+
+        if best_value == -INFINITY:
+            if passed:
+                return disc_difference(player, opponent)
+            return -self._last2_(
+                opponent, player, first, second, -beta, -alpha, True)
+
+        return best_value
+
+    def _solve_parity_(self, player, opponent, empty, alpha, beta, passed):
+        """ 偶奇で並べ替えた完全読み
+
+        Returns:
+            (int): 手番側から見た石差
+        """
+
+        odd, even = list(), list()
+        for mask in QUADRANT_MASKS:
+            region = empty & mask
+            if bitboard.popcount(region) & 1:
+                odd.extend(bitboard.iter_bits(region))
+            else:
+                even.extend(bitboard.iter_bits(region))
+
+        best_value = -INFINITY
+        for index in odd + even:
+            flipped = bitboard.flips(player, opponent, index)
+            if not flipped:
+                continue
+            value = -self._solve_(
+                opponent & ~flipped,
+                player | flipped | (1 << index),
+                -beta, -alpha, False,
+            )
+            if value > best_value:
+                best_value = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if best_value == -INFINITY:
+            if passed:
+                return disc_difference(player, opponent)
+            return -self._solve_(opponent, player, -beta, -alpha, True)
+
+        return best_value
+
+    def _solve_table_(self, player, opponent, empty_count, alpha, beta,
+                      passed):
+        """ 置換表と速さ優先で並べ替えた完全読み
+
+        Returns:
+            (int): 手番側から見た石差
+        """
+
+        moves = bitboard.legal_moves(player, opponent)
+        if not moves:
+            if passed:
+                return disc_difference(player, opponent)
+            return -self._solve_(opponent, player, -beta, -alpha, True)
+
+        key = transposition.zobrist_hash(player, opponent)
+        tt_move = -1
+        entry = self.table.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            value, flag = entry[2], entry[3]
+            if flag == transposition.EXACT:
+                return value
+            if flag == transposition.LOWER and value > alpha:
+                alpha = value
+            elif flag == transposition.UPPER and value < beta:
+                beta = value
+            if alpha >= beta:
+                return value
+
+        alpha_orig = alpha
+        best_value = -INFINITY
+        best_index = -1
+        for index, flipped in self._fastest_first_(
+                player, opponent, moves, tt_move):
+            next_player = opponent & ~flipped
+            next_opponent = player | flipped | (1 << index)
+            if best_value == -INFINITY:
+                value = -self._solve_(
+                    next_player, next_opponent, -beta, -alpha, False)
+            else:
+                # 2手目以降はnull-windowで確認し、超えた場合のみ再探索
+                value = -self._solve_(
+                    next_player, next_opponent, -alpha - 1, -alpha, False)
+                if alpha < value < beta:
+                    value = -self._solve_(
+                        next_player, next_opponent, -beta, -value, False)
+            if value > best_value:
+                best_value = value
+                best_index = index
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        if best_value <= alpha_orig:
+            flag = transposition.UPPER
+        elif best_value >= beta:
+            flag = transposition.LOWER
+        else:
+            flag = transposition.EXACT
+        self.table.store(key, empty_count, best_value, flag, best_index)
+
+        return best_value
+
+
+def solve_position(black: int, white: int, turn: int, isWLD: bool = False):
+    """ 黒から見た完全読みの結果(学習データのラベル付け用)
+
+    Args:
+        black (int): 黒のビットボード
+        white (int): 白のビットボード
+        turn (int): 手番(BLACK_PIECE/WHITE_PIECE)
+        isWLD (bool): Trueなら勝敗のみを読む
+
+    Returns:
+        (int): 黒から見た石差(isWLDなら勝ち1、引き分け0、負け-1)
+    """
+
+    solver = EndgameSolver()
+    if turn == reversi_core.BLACK_PIECE:
+        player, opponent, sign = black, white, 1
+    else:
+        player, opponent, sign = white, black, -1
+
+    if isWLD:
+        return sign * solver.solve_wld(player, opponent)
+
+    return sign * solver.solve(player, opponent)
@@ -0,0 +1,121 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    game_records.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの棋譜ファイル(game_result.txt)の読み込み
+    1行1局のJSONを先頭から1回だけ走査し、条件に合う棋譜を順に返す。
+    ファイル全体をメモリに読み込まない。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import json
+
+import result_sink
+import reversi_core
+
+BLACK_WIN = reversi_core.BLACK_WIN
+WHITE_WIN = reversi_core.WHITE_WIN
+DRAW = reversi_core.DRAW
+
+# 1手あたりの文字数(手番、x、y 例:'bF4')
+MOVE_LENGTH = 3
+
+
+def split_process(process: str):
+    """ 棋譜文字列を1手ずつに分割
+
+    Args:
+        process (str): 棋譜文字列(例:'bF4wF5...')
+
+    Returns:
+        (list): 1手ずつの文字列のリスト
+    """
+
+    return [process[i: i+MOVE_LENGTH]
+            for i in range(0, len(process), MOVE_LENGTH)]
+
+
+def judge_result(result: dict):
+    """ 棋譜の結果から勝敗を判定
+
+    Args:
+        result (dict): 棋譜の'result'(black,wihte)
+
+    Returns:
+        (int): BLACK_WIN/WHITE_WIN/DRAW
+    """
+
+    black = result.get('black') or 0
+    white = result.get('wihte', result.get('white')) or 0
+
+    if black > white:
+        return BLACK_WIN
+    if black < white:
+        return WHITE_WIN
+
+    return DRAW
+
+
+def iter_game_records(file_path: str = None,
+                      judge: int = None,
+                      min_moves: int = None,
+                      max_moves: int = None,
+                      start: int = 0,
+                      stop: int = None,
+                      isFullRecord: bool = False,
+                      ):
+    """ 棋譜の逐次読み込み
+
+    Args:
+        file_path (str): 棋譜ファイル(未指定ならgame_result.txt、
+            拡張子が.gzならgzip)
+        judge (int): 指定した勝敗(BLACK_WIN/WHITE_WIN/DRAW)の棋譜のみ
+        min_moves (int): 手数がこれ以上の棋譜のみ
+        max_moves (int): 手数がこれ以下の棋譜のみ
+        start (int): 先頭から読み飛ばす行数
+        stop (int): この行番号で読み込みを終了
+        isFullRecord (bool): Trueなら指手リストの代わりに棋譜のdictを返す
+
+    Yields:
+        (tuple): (行番号, 指手のリスト)、isFullRecordなら(行番号, 棋譜dict)
+    """
+
+    if file_path is None:
+        file_path = reversi_core.RESULT_FILE_PATH
+
+    with result_sink.open_record_file(file_path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            if line_number <= start:
+                continue
+            if stop is not None and line_number > stop:
+                break
+            if not line.strip():
+                continue
+
+            data = json.loads(line)
+            if not isinstance(data, dict) or 'process' not in data:
+                continue
+
+            process = data['process']
+            move_count = len(process) // MOVE_LENGTH
+            if min_moves is not None and move_count < min_moves:
+                continue
+            if max_moves is not None and move_count > max_moves:
+                continue
+            if judge is not None and \
+                    judge_result(data.get('result', dict())) != judge:
+                continue
+
+            if isFullRecord:
+                yield line_number, data
+            else:
+                yield line_number, split_process(process)
+
+    return
@@ -0,0 +1,639 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    game_server.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの対局サーバー(asyncio)
+    TCPまたはUnixソケットで1行1リクエストのJSONを受け付け、
+    複数の対局をメモリ上のReversiCoreで管理する。
+    盤面操作はイベントループ上で即時に処理し、AIの思考(engine_move)は
+    プロセスプールで実行してイベントループを止めない。
+    1つの接続で複数のリクエストを送ってよい(応答は完了順、idで対応付け)。
+
+    リクエスト例(応答は {"id": ..., "ok": true, ...} または
+    {"id": ..., "ok": false, "error": "..."}):
+        {"op": "new_game"}
+        {"op": "state", "game": 1}
+        {"op": "legal_moves", "game": 1}
+        {"op": "play", "game": 1, "move": "F5"}
+        {"op": "engine_move", "game": 1, "engine": "search",
+         "options": {"time_limit": 0.5}}
+        {"op": "close_game", "game": 1}
+    指手はマス目の列(A-H)と行(1-8)、engine_moveは"play": falseなら
+    着手せずに手だけを返す。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import itertools
+import json
+import os
+import time
+
+import bitboard
+import mcts
+import players
+import result_sink
+import reversi_core
+import search
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+
+BLACK_WIN = reversi_core.BLACK_WIN
+WHITE_WIN = reversi_core.WHITE_WIN
+DRAW = reversi_core.DRAW
+PASS = reversi_core.PASS
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# 同時に保持する対局数の上限、無操作で破棄するまでの秒数
+MAX_GAMES = 10000
+GAME_TTL = 3600.0
+# 1接続あたりの処理中リクエスト数の上限、接続待ちキューの長さ
+MAX_PENDING = 64
+BACKLOG = 1024
+# 思考時間の上限(秒)、応答待ちの猶予(秒)
+MAX_TIME_LIMIT = 10.0
+ENGINE_GRACE = 5.0
+# AIの引数の上限(time_limitはMAX_TIME_LIMIT)
+OPTION_LIMITS = {
+    'time_limit': MAX_TIME_LIMIT,
+    'max_depth': 60,
+    'playouts': 100000,
+}
+
+TURN_NAMES = {BLACK_PIECE: 'black', WHITE_PIECE: 'white'}
+JUDGE_NAMES = {BLACK_WIN: 'black', WHITE_WIN: 'white', DRAW: 'draw'}
+SQUARE_MARKS = {BLACK_PIECE: 'X', WHITE_PIECE: 'O'}
+
+# AIの種類(クラス, 既定の引数, 指定できる引数)
+ENGINES = {
+    'random': (players.RandomPlayer, dict(), ()),
+    'weighted': (players.WeightedRandomPlayer, dict(), ()),
+    'greedy': (players.GreedyPlayer, dict(), ()),
+    'search': (search.SearchPlayer, {'time_limit': 0.5},
+               ('time_limit', 'max_depth')),
+    'mcts': (mcts.MCTSPlayer, {'playouts': 500, 'isReuse': False},
+             ('playouts', 'time_limit')),
+}
+
+# ワーカープロセスごとのAI(種類ごとに再利用) 種類 -> (AI, 引数の既定値)
+_engine_players = dict()
+
+
+class RequestError(Exception):
+    """ リクエストの誤り(応答のerrorとして返す)
+    """
+    pass
+
+
+def _engine_move_(black: int, white: int, turn: int, engine: str,
+                  options: dict):
+    """ AIの着手選択(ワーカープロセス側)
+
+    Args:
+        black (int): 黒のビットボード
+        white (int): 白のビットボード
+        turn (int): 手番（BLACK_PIECE/WHITE_PIECE）
+        engine (str): AIの種類(ENGINESのキー)
+        options (dict): AIの引数
+
+    Returns:
+        (tuple): マス目インデックス(x_index,y_index)、合法手がなければNone
+    """
+
+    player_class, defaults, allowed = ENGINES[engine]
+    cached = _engine_players.get(engine)
+    if cached is None:
+        player = player_class(**defaults)
+        cached = _engine_players[engine] = (
+            player, {name: getattr(player, name) for name in allowed})
+    player, initial = cached
+
+    # 思考時間などは1手ごとに設定する(置換表などはリクエスト間で使い回す)
+    for name in allowed:
+        setattr(player, name, options.get(name, initial[name]))
+
+    game = reversi_core.ReversiCore()
+    game.set_position(black, white, turn)
+
+    return player.select_move(game)
+
+
+def parse_move(move: str):
+    """ 指手文字列をマス目インデックスに変換
+
+    Args:
+        move (str): 指手('F5'など)
+
+    Returns:
+        (tuple): マス目インデックス(x_index,y_index)
+    """
+
+    if not isinstance(move, str) or len(move) != 2:
+        raise RequestError('invalid move: {!r}'.format(move))
+
+    x_index = ord(move[0].upper()) - 0x41
+    y_index = ord(move[1]) - 0x31
+    if not bitboard.in_board((x_index, y_index)):
+        raise RequestError('invalid move: {!r}'.format(move))
+
+    return x_index, y_index
+
+
+def format_move(pos: tuple):
+    """ マス目インデックスを指手文字列に変換
+
+    Args:
+        pos (tuple): マス目インデックス(x_index,y_index)
+
+    Returns:
+        (str): 指手('F5'など)
+    """
+
+    x_index, y_index = pos
+
+    return '{}{}'.format(chr(0x41 + int(x_index)), chr(0x31 + int(y_index)))
+
+
+def engine_options(engine: str, options: dict):
+    """ AIの引数の検証
+
+    Args:
+        engine (str): AIの種類(ENGINESのキー)
+        options (dict): リクエストで指定された引数
+
+    Returns:
+        (dict): 既定値を補った引数
+    """
+
+    if not isinstance(engine, str) or engine not in ENGINES:
+        raise RequestError('unknown engine: {!r}'.format(engine))
+
+    _, defaults, allowed = ENGINES[engine]
+    if options is None:
+        options = dict()
+    if not isinstance(options, dict):
+        raise RequestError('options must be an object')
+
+    merged = dict(defaults)
+    for name, value in options.items():
+        if name not in allowed:
+            raise RequestError('unknown option for {}: {!r}'.format(
+                engine, name))
+        if isinstance(value, bool) or not isinstance(value, (int, float)) \
+                or not 0 < value <= OPTION_LIMITS[name]:
+            raise RequestError('invalid value for {}: {!r} (max {})'.format(
+                name, value, OPTION_LIMITS[name]))
+        merged[name] = value
+
+    # 思考時間を指定できるAIは常に上限を設けてワーカーの占有を防ぐ
+    if 'time_limit' in allowed:
+        merged['time_limit'] = float(
+            merged.get('time_limit') or MAX_TIME_LIMIT)
+    if 'max_depth' in merged:
+        merged['max_depth'] = int(merged['max_depth'])
+    if 'playouts' in merged:
+        merged['playouts'] = int(merged['playouts'])
+
+    return merged
+
+
+class ServerGame():
+    """ サーバー上の1対局
+    """
+
+    __slots__ = ('game', 'lock', 'judge', 'updated')
+
+    def __init__(self, sink=None):
+        """ 初期化
+
+        Args:
+            sink (result_sink.ResultSink): 終局時の棋譜の書き出し先
+        """
+
+        self.game = reversi_core.ReversiCore()
+        self.game.set_result_sink(sink)
+        # AIの思考中に他の着手を受け付けないためのロック
+        self.lock = asyncio.Lock()
+        # 勝敗(終局までNone)
+        self.judge = None
+        self.updated = time.monotonic()
+
+        return
+
+
+class GameServer():
+    def __init__(self,
+                 workers: int = None,
+                 max_games: int = MAX_GAMES,
+                 isRecord: bool = False,
+                 file_path: str = None,
+                 ):
+        """ 初期化
+
+        Args:
+            workers (int): AI用のワーカープロセス数(未指定ならCPU数)
+            max_games (int): 同時に保持する対局数の上限
+            isRecord (bool): Trueなら終局した対局の棋譜を追記
+            file_path (str): 追記先ファイル(未指定ならgame_result.txt)
+        """
+
+        self.workers = workers or os.cpu_count() or 1
+        self.max_games = max_games
+        self.games = dict()
+        self.game_ids = itertools.count(1)
+        self.pool = None
+
+        self.sink = None
+        if isRecord:
+            self.sink = result_sink.BufferedResultWriter(file_path)
+
+        self.handlers = {
+            'new_game': self.handle_new_game,
+            'state': self.handle_state,
+            'legal_moves': self.handle_legal_moves,
+            'play': self.handle_play,
+            'engine_move': self.handle_engine_move,
+            'close_game': self.handle_close_game,
+        }
+
+        return
+
+    def start_pool(self):
+        """ AI用のプロセスプールの起動
+        """
+
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers)
+
+        return self.pool
+
+    def close(self):
+        """ プロセスプールの終了と棋譜の書き出し
+        """
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        if self.sink is not None:
+            self.sink.close()
+            self.sink = None
+
+        return
+
+    def expire_games(self):
+        """ 無操作の対局を破棄
+        """
+
+        deadline = time.monotonic() - GAME_TTL
+        for game_id in [game_id for game_id, entry in self.games.items()
+                        if entry.updated < deadline and not entry.lock.locked()]:
+            del self.games[game_id]
+
+        return
+
+    def get_game(self, request: dict):
+        """ リクエストの対局
+
+        Args:
+            request (dict): リクエスト
+
+        Returns:
+            (tuple): (対局番号, ServerGame)
+        """
+
+        game_id = request.get('game')
+        if isinstance(game_id, bool) or not isinstance(game_id, int):
+            raise RequestError('invalid game: {!r}'.format(game_id))
+        entry = self.games.get(game_id)
+        if entry is None:
+            raise RequestError('unknown game: {!r}'.format(game_id))
+        entry.updated = time.monotonic()
+
+        return game_id, entry
+
+    def game_state(self, game_id: int, entry: ServerGame):
+        """ 対局の状態
+
+        Args:
+            game_id (int): 対局番号
+            entry (ServerGame): 対局
+
+        Returns:
+            (dict): 応答に含める状態
+        """
+
+        game = entry.game
+        black, white = game.bit_boards
+        pieces = game.pieces_on_board
+
+        board = list()
+        for y_index in range(bitboard.BOARD_SIZE):
+            board.append(''.join(
+                SQUARE_MARKS.get(int(pieces[x_index, y_index]), '.')
+                for x_index in range(bitboard.BOARD_SIZE)))
+
+        counts = game.count_pieces()
+
+        return {
+            'game': game_id,
+            'board': board,
+            'black': '{:016x}'.format(black),
+            'white': '{:016x}'.format(white),
+            'turn': TURN_NAMES[game.player_turn],
+            'counts': {TURN_NAMES[turn]: count
+                       for turn, count in counts.items()},
+            'legal_moves': self.legal_moves(entry),
+            'process': game.game_record['process'],
+            'judge': JUDGE_NAMES.get(entry.judge),
+        }
+
+    def legal_moves(self, entry: ServerGame):
+        """ 手番側の合法手
+
+        Returns:
+            (list): 指手文字列のリスト(終局後は空)
+        """
+
+        if entry.judge is not None:
+            return list()
+
+        return [format_move(pos) for pos in entry.game.get_legal_moves()]
+
+    def apply_move(self, entry: ServerGame, pos: tuple):
+        """ 着手と判定(パスなら手番を進め、終局なら棋譜を記録)
+
+        Args:
+            entry (ServerGame): 対局
+            pos (tuple): マス目インデックス(x_index,y_index)
+
+        Returns:
+            (bool): 相手がパスした場合True
+        """
+
+        game = entry.game
+        if entry.judge is not None:
+            raise RequestError('game is over')
+        if not game.player_procedure(pos):
+            raise RequestError('illegal move: {}'.format(format_move(pos)))
+
+        isPass = False
+        judge = game.judge_trun(game.player_turn)
+        if 'player_turn' in judge:
+            game.player_turn = judge['player_turn']
+        if 'judge' in judge:
+            if judge['judge'] == PASS:
+                isPass = True
+            else:
+                entry.judge = judge['judge']
+                game.record_game_result(isWrite=self.sink is not None)
+
+        return isPass
+
+    async def handle_new_game(self, request: dict):
+        if len(self.games) >= self.max_games:
+            self.expire_games()
+        if len(self.games) >= self.max_games:
+            raise RequestError('too many games')
+
+        game_id = next(self.game_ids)
+        entry = self.games[game_id] = ServerGame(self.sink)
+
+        return self.game_state(game_id, entry)
+
+    async def handle_state(self, request: dict):
+        game_id, entry = self.get_game(request)
+
+        return self.game_state(game_id, entry)
+
+    async def handle_legal_moves(self, request: dict):
+        game_id, entry = self.get_game(request)
+
+        return {
+            'game': game_id,
+            'turn': TURN_NAMES[entry.game.player_turn],
+            'legal_moves': self.legal_moves(entry),
+        }
+
+    async def handle_play(self, request: dict):
+        game_id, entry = self.get_game(request)
+        pos = parse_move(request.get('move'))
+
+        if entry.lock.locked():
+            raise RequestError('engine is thinking')
+        isPass = self.apply_move(entry, pos)
+
+        response = self.game_state(game_id, entry)
+        response['move'] = format_move(pos)
+        response['passed'] = isPass
+
+        return response
+
+    async def handle_engine_move(self, request: dict):
+        game_id, entry = self.get_game(request)
+        engine = request.get('engine', 'search')
+        options = engine_options(engine, request.get('options'))
+        isPlay = request.get('play', True)
+        if not isinstance(isPlay, bool):
+            raise RequestError('play must be true or false')
+
+        if entry.lock.locked():
+            raise RequestError('engine is thinking')
+
+        async with entry.lock:
+            if entry.judge is not None:
+                raise RequestError('game is over')
+
+            game = entry.game
+            black, white = game.bit_boards
+            timeout = (options.get('time_limit') or MAX_TIME_LIMIT) + \
+                ENGINE_GRACE
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self.start_pool(), _engine_move_,
+                black, white, game.player_turn, engine, options)
+            try:
+                pos = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                raise RequestError('engine timed out')
+            except concurrent.futures.process.BrokenProcessPool:
+                # 次のengine_moveでプロセスプールを作り直す
+                self.pool = None
+                raise RequestError('engine worker crashed')
+
+            if pos is None:
+                raise RequestError('no legal move')
+
+            isPass = False
+            if isPlay:
+                isPass = self.apply_move(entry, pos)
+
+        response = self.game_state(game_id, entry)
+        response['move'] = format_move(pos)
+        response['passed'] = isPass
+
+        return response
+
+    async def handle_close_game(self, request: dict):
+        game_id, entry = self.get_game(request)
+        del self.games[game_id]
+
+        return {'game': game_id}
+
+    async def dispatch(self, line: bytes):
+        """ 1リクエストの処理
+
+        Args:
+            line (bytes): JSON(1行)
+
+        Returns:
+            (dict): 応答
+        """
+
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                raise RequestError('invalid json: {}'.format(e))
+            if not isinstance(request, dict):
+                raise RequestError('request must be an object')
+            request_id = request.get('id')
+
+            op = request.get('op')
+            handler = self.handlers.get(op) if isinstance(op, str) else None
+            if handler is None:
+                raise RequestError('unknown op: {!r}'.format(op))
+            response = await handler(request)
+            response['ok'] = True
+        except RequestError as e:
+            response = {'ok': False, 'error': str(e)}
+        except Exception as e:
+            # ワーカーの異常(BrokenProcessPoolなど)も応答を返す
+            response = {'ok': False, 'error': 'internal error: {}: {}'.format(
+                type(e).__name__, e)}
+
+        response['id'] = request_id
+
+        return response
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        """ 1接続の処理(リクエストごとにタスクを作成し、完了順に応答)
+        """
+
+        pending = asyncio.Semaphore(MAX_PENDING)
+        tasks = set()
+
+        async def _respond_(line):
+            try:
+                response = await self.dispatch(line)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                pending.release()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await pending.acquire()
+                task = asyncio.create_task(_respond_(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            # 読み込みの異常で抜けた場合は処理中のリクエストを取り消す
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+        return
+
+    async def serve(self, host: str = HOST, port: int = PORT,
+                    unix_path: str = None):
+        """ サーバーの実行(終了まで戻らない)
+
+        Args:
+            host (str): 待ち受けアドレス
+            port (int): 待ち受けポート
+            unix_path (str): Unixソケットのパス(指定時はTCPの代わりに使用)
+        """
+
+        self.start_pool()
+        if unix_path:
+            server = await asyncio.start_unix_server(
+                self.handle_client, path=unix_path, backlog=BACKLOG)
+        else:
+            server = await asyncio.start_server(
+                self.handle_client, host, port, backlog=BACKLOG)
+
+        async with server:
+            await server.serve_forever()
+
+
+def run_server(host: str = HOST, port: int = PORT, unix_path: str = None,
+               **kwargs):
+    """ サーバーの起動
+
+    Args:
+        host (str): 待ち受けアドレス
+        port (int): 待ち受けポート
+        unix_path (str): Unixソケットのパス
+        kwargs (dict): GameServerの引数
+    """
+
+    server = GameServer(**kwargs)
+    try:
+        asyncio.run(server.serve(host, port, unix_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reversi game server')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('-p', '--port', type=int, default=PORT)
+    parser.add_argument('-u', '--unix', default=None)
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('--max-games', type=int, default=MAX_GAMES)
+    parser.add_argument('--record', action='store_true')
+    parser.add_argument('-o', '--output', default=None)
+    args = parser.parse_args()
+
+    run_server(
+        host=args.host,
+        port=args.port,
+        unix_path=args.unix,
+        workers=args.workers,
+        max_games=args.max_games,
+        isRecord=args.record,
+        file_path=args.output,
+    )
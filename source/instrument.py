@@ -0,0 +1,356 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    instrument.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシのゲームループの計測
+    有効にするとHOT_PATHSのメソッドを計測用のラッパーに差し替え、
+    呼び出し回数・合計時間・最大時間を集計する(無効時は元のメソッドの
+    ままなのでオーバーヘッドはない)。
+    環境変数 REVERSI_INSTRUMENT=1 でimport時に有効になり、終了時に
+    集計表を表示する。REVERSI_INSTRUMENT_OUTPUT を指定するとJSONも書き出す。
+    ワーカープロセスの集計はcollectで取り出してmergeで本体に合算する。
+    profileはcProfileで関数全体を計測する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import importlib
+import json
+import multiprocessing
+import os
+import pstats
+import sys
+import time
+
+ENV_VAR = 'REVERSI_INSTRUMENT'
+ENV_OUTPUT = 'REVERSI_INSTRUMENT_OUTPUT'
+
+# 計測対象(モジュール名, クラス名, メソッド名)
+HOT_PATHS = (
+    ('reversi_game', 'ReversiGame', 'run'),
+    ('reversi_game', 'ReversiGame', 'auto_player'),
+    ('reversi_game', 'ReversiGame', 'select_auto_move'),
+    ('reversi_core', 'ReversiCore', 'player_procedure'),
+    ('reversi_core', 'ReversiCore', 'judge_trun'),
+    ('reversi_core', 'ReversiCore', 'judge_put_square'),
+    ('reversi_core', 'ReversiCore', 'record_game_result'),
+)
+
+isEnabled = False
+
+# 計測名 -> [呼び出し回数, 合計秒数, 最大秒数]
+_timers = dict()
+# 計測名 -> 回数
+_counters = dict()
+# 差し替え前のメソッド[(クラス, メソッド名, 元のメソッド)]
+_patched = list()
+
+
+def _timer_(name: str):
+    """ 計測名の集計リスト(なければ作成)
+    """
+
+    stats = _timers.get(name)
+    if stats is None:
+        stats = _timers[name] = [0, 0.0, 0.0]
+
+    return stats
+
+
+def _wrap_(function, name: str):
+    """ 関数を計測用のラッパーで包む
+
+    Args:
+        function (function): 計測する関数
+        name (str): 計測名
+
+    Returns:
+        (function): ラッパー
+    """
+
+    stats = _timer_(name)
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def _timed_(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = perf_counter() - start
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+    return _timed_
+
+
+def enable(hot_paths: tuple = HOT_PATHS):
+    """ 計測の開始(HOT_PATHSのメソッドを差し替え)
+
+    spawnで起動するワーカープロセスにも引き継ぐため環境変数も設定する。
+
+    Args:
+        hot_paths (tuple): 計測対象(モジュール名, クラス名, メソッド名)
+    """
+
+    global isEnabled
+
+    if isEnabled:
+        return
+
+    for module_name, class_name, method_name in hot_paths:
+        owner = getattr(importlib.import_module(module_name), class_name)
+        # 継承したメソッドは定義元のクラスで差し替える
+        method = owner.__dict__.get(method_name)
+        if method is None:
+            continue
+        setattr(owner, method_name, _wrap_(
+            method, '{}.{}'.format(class_name, method_name)))
+        _patched.append((owner, method_name, method))
+
+    os.environ[ENV_VAR] = '1'
+    isEnabled = True
+
+    return
+
+
+def disable():
+    """ 計測の終了(差し替えたメソッドを元に戻す、集計は保持)
+    """
+
+    global isEnabled
+
+    while _patched:
+        owner, method_name, method = _patched.pop()
+        setattr(owner, method_name, method)
+
+    os.environ.pop(ENV_VAR, None)
+    isEnabled = False
+
+    return
+
+
+def reset():
+    """ 集計の初期化
+    """
+
+    for stats in _timers.values():
+        stats[:] = [0, 0.0, 0.0]
+    _counters.clear()
+
+    return
+
+
+def count(name: str, n: int = 1):
+    """ 回数の加算(計測が無効なら何もしない)
+
+    Args:
+        name (str): 計測名
+        n (int): 加算する回数
+    """
+
+    if isEnabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+    return
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """ 区間の計測(with文、計測が無効なら何もしない)
+
+    Args:
+        name (str): 計測名
+    """
+
+    if not isEnabled:
+        yield
+        return
+
+    stats = _timer_(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stats[0] += 1
+        stats[1] += seconds
+        if seconds > stats[2]:
+            stats[2] = seconds
+
+
+def collect():
+    """ 集計の取り出し(取り出した分は初期化、ワーカープロセス用)
+
+    Returns:
+        (dict): mergeに渡す集計、計測が無効ならNone
+    """
+
+    if not isEnabled:
+        return None
+
+    stats = {
+        'timers': {name: list(values) for name, values in _timers.items()
+                   if values[0]},
+        'counters': dict(_counters),
+    }
+    reset()
+
+    return stats
+
+
+def merge(stats: dict):
+    """ collectの集計を合算
+
+    Args:
+        stats (dict): collectの戻り値(Noneなら何もしない)
+    """
+
+    if not stats:
+        return
+
+    for name, (calls, seconds, max_seconds) in stats['timers'].items():
+        values = _timer_(name)
+        values[0] += calls
+        values[1] += seconds
+        values[2] = max(values[2], max_seconds)
+    for name, n in stats['counters'].items():
+        _counters[name] = _counters.get(name, 0) + n
+
+    return
+
+
+def summary():
+    """ 集計結果
+
+    Returns:
+        (dict): timers(計測名ごとのcalls,total,mean,max 秒)とcounters
+    """
+
+    timers = dict()
+    for name, (calls, seconds, max_seconds) in sorted(
+            _timers.items(), key=lambda item: -item[1][1]):
+        if not calls:
+            continue
+        timers[name] = {
+            'calls': calls,
+            'total': seconds,
+            'mean': seconds / calls,
+            'max': max_seconds,
+        }
+
+    return {
+        'pid': os.getpid(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'timers': timers,
+        'counters': dict(sorted(_counters.items())),
+    }
+
+
+def format_table(stats: dict = None):
+    """ 集計結果の表
+
+    Args:
+        stats (dict): summaryの戻り値(未指定なら現在の集計)
+
+    Returns:
+        (str): 表の文字列
+    """
+
+    if stats is None:
+        stats = summary()
+
+    lines = ['{:32s} {:>10s} {:>10s} {:>10s} {:>10s}'.format(
+        'timer', 'calls', 'total(s)', 'mean(us)', 'max(us)')]
+    for name, values in stats['timers'].items():
+        lines.append('{:32s} {:10d} {:10.3f} {:10.1f} {:10.1f}'.format(
+            name, values['calls'], values['total'],
+            values['mean'] * 1e6, values['max'] * 1e6))
+
+    if stats['counters']:
+        lines.append('{:32s} {:>10s}'.format('counter', 'count'))
+        for name, n in stats['counters'].items():
+            lines.append('{:32s} {:10d}'.format(name, n))
+
+    return '\n'.join(lines)
+
+
+def report(output: str = None, stream=None):
+    """ 集計表の表示とJSONの書き出し
+
+    Args:
+        output (str): JSONの書き出し先(未指定なら書き出さない)
+        stream (file): 表の出力先(未指定ならsys.stderr)
+
+    Returns:
+        (dict): summaryの戻り値
+    """
+
+    stats = summary()
+
+    print(format_table(stats), file=stream or sys.stderr)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+    return stats
+
+
+def profile(function, args: tuple = (), kwargs: dict = None,
+            output: str = None, sort: str = 'cumulative', limit: int = 30,
+            stream=None):
+    """ cProfileによる関数全体の計測
+
+    Args:
+        function (function): 計測する関数
+        args (tuple): 位置引数
+        kwargs (dict): キーワード引数
+        output (str): プロファイルの書き出し先(pstats形式、未指定なら書き出さない)
+        sort (str): 表示の並び順(pstatsのキー)
+        limit (int): 表示する関数の数
+        stream (file): 表示先(未指定ならsys.stderr)
+
+    Returns:
+        (object): 関数の戻り値
+    """
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **(kwargs or dict()))
+
+    stats = pstats.Stats(profiler, stream=stream or sys.stderr)
+    stats.sort_stats(sort).print_stats(limit)
+    if output:
+        profiler.dump_stats(output)
+
+    return result
+
+
+def _report_at_exit_():
+    """ 環境変数で有効にした場合の終了時の表示(ワーカープロセスでは表示しない)
+    """
+
+    if multiprocessing.parent_process() is not None:
+        return
+    if not any(values[0] for values in _timers.values()) and not _counters:
+        return
+
+    report(os.environ.get(ENV_OUTPUT))
+
+    return
+
+
+if os.environ.get(ENV_VAR, '') not in ('', '0'):
+    enable()
+    atexit.register(_report_at_exit_)
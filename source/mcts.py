@@ -0,0 +1,494 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    mcts.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシのモンテカルロ木探索(MCTS)AI
+    UCTによる選択、展開、プレイアウト(ランダムまたは方策)、逆伝播を行う。
+    ノードはNodePoolで再利用し、着手間で一致する部分木を引き継ぐ。
+    workers > 1 の場合はプロセスごとに独立した木を探索し、
+    ルートの訪問回数を合算する(ルート並列)。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import math
+import multiprocessing
+import random
+import time
+
+import bitboard
+import players
+
+PASS_MOVE = -1
+
+# UCTの探索係数
+EXPLORATION = 1.4
+
+# 時間切れ確認の間隔(プレイアウト数、2の累乗-1)
+CHECK_INTERVAL = 15
+
+
+class Node():
+    __slots__ = (
+        'player', 'opponent', 'move', 'parent',
+        'children', 'untried', 'visits', 'wins',
+    )
+
+
+class NodePool():
+    def __init__(self, max_nodes: int = 200000):
+        """ 初期化
+
+        Args:
+            max_nodes (int): 同時に保持するノード数の上限
+        """
+
+        self.max_nodes = max_nodes
+        self.free = list()
+        self.used = 0
+
+        return
+
+    def is_full(self):
+        """ ノード数が上限に達しているか
+
+        Returns:
+            (bool): 上限ならTrue
+        """
+
+        return self.used >= self.max_nodes
+
+    def allocate(self, player: int, opponent: int, move: int, parent, rng):
+        """ ノードの確保
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+            move (int): 親からの着手(ビット番号、パスはPASS_MOVE)
+            parent (Node): 親ノード
+            rng (random.Random): 未展開手の並び替えに使う乱数生成器
+
+        Returns:
+            (Node): ノード
+        """
+
+        node = self.free.pop() if self.free else Node()
+        node.player = player
+        node.opponent = opponent
+        node.move = move
+        node.parent = parent
+        node.children = list()
+        node.visits = 0
+        node.wins = 0.0
+
+        moves = list(bitboard.iter_bits(bitboard.legal_moves(player, opponent)))
+        if moves:
+            rng.shuffle(moves)
+        elif bitboard.legal_moves(opponent, player):
+            moves = [PASS_MOVE]
+        node.untried = moves
+
+        self.used += 1
+
+        return node
+
+    def release(self, node: Node):
+        """ 部分木の解放
+
+        Args:
+            node (Node): 解放する部分木のルート
+        """
+
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            stack.extend(current.children)
+            current.children = None
+            current.parent = None
+            self.free.append(current)
+            self.used -= 1
+
+        return
+
+
+def _playout_result_(player: int, opponent: int, sign: int):
+    """ プレイアウト終局時の結果
+
+    Args:
+        player (int): 終局時の手番側のビットボード
+        opponent (int): 終局時の相手側のビットボード
+        sign (int): 開始局面の手番側が終局時の手番側なら1、相手側なら-1
+
+    Returns:
+        (float): 開始局面の手番側から見た結果(勝ち1、引き分け0.5、負け0)
+    """
+
+    diff = (bitboard.popcount(player) - bitboard.popcount(opponent)) * sign
+    if diff > 0:
+        return 1.0
+    if diff < 0:
+        return 0.0
+
+    return 0.5
+
+
+def random_playout(player: int, opponent: int, rng):
+    """ ランダムプレイアウト
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+        rng (random.Random): 乱数生成器
+
+    Returns:
+        (float): 開始局面の手番側から見た結果(勝ち1、引き分け0.5、負け0)
+    """
+
+    sign = 1
+    passed = False
+    while True:
+        moves = bitboard.legal_moves(player, opponent)
+        if moves:
+            passed = False
+            candidates = list(bitboard.iter_bits(moves))
+            index = candidates[rng.randrange(len(candidates))]
+            flipped = bitboard.flips(player, opponent, index)
+            player, opponent = \
+                opponent & ~flipped, player | flipped | (1 << index)
+        elif passed:
+            break
+        else:
+            passed = True
+            player, opponent = opponent, player
+        sign = -sign
+
+    return _playout_result_(player, opponent, sign)
+
+
+def policy_playout(policy):
+    """ 方策プレイアウトの生成
+
+    Args:
+        policy (function): policy(player, opponent, rng)で着手のビット番号を
+            返す関数(合法手がある局面でのみ呼ばれる)
+
+    Returns:
+        (function): playout(player, opponent, rng)
+    """
+
+    def _playout_(player, opponent, rng):
+        sign = 1
+        passed = False
+        while True:
+            if bitboard.legal_moves(player, opponent):
+                passed = False
+                index = policy(player, opponent, rng)
+                flipped = bitboard.flips(player, opponent, index)
+                player, opponent = \
+                    opponent & ~flipped, player | flipped | (1 << index)
+            elif passed:
+                break
+            else:
+                passed = True
+                player, opponent = opponent, player
+            sign = -sign
+
+        return _playout_result_(player, opponent, sign)
+
+    return _playout_
+
+
+def _worker_search_(task: tuple):
+    """ ルート並列のワーカー探索(ワーカープロセス側)
+
+    Args:
+        task (tuple): (手番側, 相手側, プレイアウト数, 思考時間, 乱数シード,
+            探索係数, プレイアウト関数)
+
+    Returns:
+        (dict): 着手のビット番号をKeyとした(訪問回数, 勝ち数)
+    """
+
+    player, opponent, playouts, time_limit, seed, exploration, playout = task
+
+    searcher = MCTSPlayer(
+        playouts=playouts,
+        time_limit=time_limit,
+        exploration=exploration,
+        playout=playout,
+        isReuse=False,
+        rng=random.Random(seed),
+    )
+    root = searcher.search(player, opponent)
+
+    return {child.move: (child.visits, child.wins) for child in root.children}
+
+
+class MCTSPlayer(players.Player):
+    def __init__(self,
+                 playouts: int = 2000,
+                 time_limit: float = None,
+                 exploration: float = EXPLORATION,
+                 playout=random_playout,
+                 workers: int = 1,
+                 max_nodes: int = 200000,
+                 isReuse: bool = True,
+                 rng=None,
+                 ):
+        """ 初期化
+
+        Args:
+            playouts (int): 1手あたりのプレイアウト数(Noneなら時間のみ)
+            time_limit (float): 1手あたりの思考時間(秒、Noneなら回数のみ)
+            exploration (float): UCTの探索係数
+            playout (function): playout(player, opponent, rng)
+                (workers > 1 の場合はpickle可能なモジュール関数)
+            workers (int): ルート並列のプロセス数
+            max_nodes (int): 木のノード数の上限
+            isReuse (bool): Trueなら着手間で部分木を引き継ぐ
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+
+        Raises:
+            ValueError: playoutsとtime_limitがどちらもNoneの場合に例外送出
+        """
+
+        super().__init__(rng)
+
+        # どちらも未指定ではプレイアウトが終わらない
+        if playouts is None and time_limit is None:
+            raise ValueError('playouts or time_limit must be specified')
+
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.playout = playout
+        self.workers = workers
+        self.isReuse = isReuse
+
+        self.pool = NodePool(max_nodes)
+        self.root = None
+        self.process_pool = None
+
+        return
+
+    def reset(self):
+        """ 新しいゲーム開始時の初期化(木の解放)
+        """
+
+        if self.root is not None:
+            self.pool.release(self.root)
+            self.root = None
+
+        return
+
+    def close(self, isTerminate: bool = False):
+        """ ワーカープロセスの終了
+
+        Args:
+            isTerminate (bool): Trueなら終了を待たずに強制終了
+        """
+
+        process_pool = self.process_pool
+        self.process_pool = None
+        if process_pool is not None:
+            if isTerminate:
+                process_pool.terminate()
+            else:
+                process_pool.close()
+                process_pool.join()
+
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+        return False
+
+    def __del__(self):
+        # close()を呼ばずに破棄された場合もワーカーを残さない
+        if getattr(self, 'process_pool', None) is not None:
+            self.close(isTerminate=True)
+
+    def select_move(self, game):
+        """ MCTSで着手を選択
+        """
+
+        turn = game.player_turn
+        player = game.bit_boards[turn]
+        opponent = game.bit_boards[1-turn]
+
+        if not bitboard.legal_moves(player, opponent):
+            return None
+
+        if self.workers > 1:
+            index = self._parallel_search_(player, opponent)
+        else:
+            root = self.search(player, opponent)
+            if not root.children:
+                # ノードプールが満杯で展開できなかった場合は合法手から選択
+                moves = list(bitboard.iter_bits(
+                    bitboard.legal_moves(player, opponent)))
+                return bitboard.index_to_pos(
+                    moves[self.rng.randrange(len(moves))])
+            best = max(root.children, key=lambda child: child.visits)
+            index = best.move
+            if self.isReuse:
+                # 自分の着手後の部分木をルートとして残す
+                self._reroot_(best)
+
+        return bitboard.index_to_pos(index)
+
+    def search(self, player: int, opponent: int):
+        """ MCTSの実行
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+
+        Returns:
+            (Node): 探索後のルートノード
+        """
+
+        root = self._find_root_(player, opponent)
+
+        # 時間切れでも着手を選べるよう最低1回は実行
+        start = time.perf_counter()
+        count = 0
+        while True:
+            self._iterate_(root)
+            count += 1
+            if self.playouts is not None and count >= self.playouts:
+                break
+            if self.time_limit is not None and not count & CHECK_INTERVAL \
+                    and time.perf_counter() - start > self.time_limit:
+                break
+
+        self.root = root
+
+        return root
+
+    def _find_root_(self, player, opponent):
+        """ 引き継いだ木から現在局面のノードを探す(見つからなければ新規)
+
+        Returns:
+            (Node): ルートノード
+        """
+
+        found = None
+        if self.isReuse and self.root is not None:
+            # 前回のルート、または相手の着手(パスを含む)後の子ノード
+            stack = [self.root]
+            for _ in range(3):
+                next_stack = list()
+                for node in stack:
+                    if node.player == player and node.opponent == opponent:
+                        found = node
+                        break
+                    next_stack.extend(node.children)
+                if found is not None:
+                    break
+                stack = next_stack
+            if found is not None:
+                self._reroot_(found)
+                return found
+
+        self.reset()
+
+        return self.pool.allocate(player, opponent, PASS_MOVE, None, self.rng)
+
+    def _reroot_(self, node: Node):
+        """ 指定ノード以外の木を解放し、ルートとする
+        """
+
+        if self.root is not None and self.root is not node:
+            parent = node.parent
+            if parent is not None:
+                parent.children.remove(node)
+            self.pool.release(self.root)
+        node.parent = None
+        self.root = node
+
+        return
+
+    def _iterate_(self, root: Node):
+        """ 選択・展開・プレイアウト・逆伝播を1回実行
+        """
+
+        node = root
+        log = math.log
+        sqrt = math.sqrt
+        exploration = self.exploration
+
+        # 選択(UCT)
+        while not node.untried and node.children:
+            log_visits = log(node.visits)
+            best_score = -1.0
+            best_child = None
+            for child in node.children:
+                score = child.wins / child.visits + \
+                    exploration * sqrt(log_visits / child.visits)
+                if score > best_score:
+                    best_score = score
+                    best_child = child
+            node = best_child
+
+        # 展開
+        if node.untried and not self.pool.is_full():
+            index = node.untried.pop()
+            if index == PASS_MOVE:
+                player, opponent = node.opponent, node.player
+            else:
+                flipped = bitboard.flips(node.player, node.opponent, index)
+                player = node.opponent & ~flipped
+                opponent = node.player | flipped | (1 << index)
+            child = self.pool.allocate(player, opponent, index, node, self.rng)
+            node.children.append(child)
+            node = child
+
+        # プレイアウト(ノードの手番側から見た結果)
+        result = self.playout(node.player, node.opponent, self.rng)
+
+        # 逆伝播(各ノードには親の手番側から見た勝ち数を加算)
+        while node is not None:
+            node.visits += 1
+            node.wins += 1.0 - result
+            result = 1.0 - result
+            node = node.parent
+
+        return
+
+    def _parallel_search_(self, player, opponent):
+        """ ルート並列探索
+
+        Returns:
+            (int): 訪問回数が最大の着手のビット番号
+        """
+
+        if self.process_pool is None:
+            self.process_pool = multiprocessing.Pool(processes=self.workers)
+
+        playouts = None
+        if self.playouts is not None:
+            playouts = max(1, self.playouts // self.workers)
+        seeds = [self.rng.getrandbits(32) for _ in range(self.workers)]
+        tasks = [
+            (player, opponent, playouts, self.time_limit, seed,
+             self.exploration, self.playout)
+            for seed in seeds
+        ]
+
+        totals = dict()
+        for stats in self.process_pool.map(_worker_search_, tasks):
+            for move, (visits, _) in stats.items():
+                totals[move] = totals.get(move, 0) + visits
+
+        return max(totals, key=totals.get)
@@ -0,0 +1,274 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    opening_book.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの定石(オープニングブック)
+    棋譜の序盤の局面を対称変換の正規形ハッシュで集計し、着手ごとの
+    勝ち・引き分け・負け(着手した側から見た結果)を保持する。
+    ファイル形式(.rvob)
+        ファイルヘッダ 12バイト : MAGIC + バージョン + エントリ数
+        エントリ 21バイト       : 正規形ハッシュ(uint64)、着手(正規形の
+                                  ビット番号)、勝ち数、引き分け数、負け数
+    読み込み後は正規形ハッシュをKeyとしたdictで引く。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import numpy as np
+import os
+import random
+import struct
+
+import bitboard
+import game_records
+import players
+import position_dataset
+import reversi_core
+import symmetry
+import transposition
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+
+MAGIC = b'RVOB'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sBxxxI')
+ENTRY_DTYPE = np.dtype([
+    ('key', '<u8'),
+    ('move', 'u1'),
+    ('wins', '<u4'),
+    ('draws', '<u4'),
+    ('losses', '<u4'),
+])
+
+BOOK_FILE_PATH = os.path.join(reversi_core.DATA_PATH, 'opening_book.rvob')
+
+# 定石として集計する手数
+MAX_PLIES = 20
+
+# 定石を採用する最小の出現回数
+MIN_VISITS = 2
+
+
+def build_book(records=None, max_plies: int = MAX_PLIES):
+    """ 棋譜から定石を集計
+
+    Args:
+        records (iterable): 棋譜dict(result,process)の列
+            (未指定ならgame_result.txt)
+        max_plies (int): 集計する手数
+
+    Returns:
+        (OpeningBook): 定石
+    """
+
+    if records is None:
+        records = (record for _, record in game_records.iter_game_records(
+            isFullRecord=True))
+
+    stats = dict()
+    for record in records:
+        positions, score = position_dataset.process_positions(
+            record['process'])
+        for black, white, _, move, turn in positions[:max_plies]:
+            if turn == BLACK_PIECE:
+                player, opponent, result = black, white, score
+            else:
+                player, opponent, result = white, black, -score
+
+            player, opponent, k = symmetry.canonical(player, opponent)
+            key = transposition.zobrist_hash(player, opponent)
+            move = symmetry.transform_index(move, k)
+
+            counts = stats.setdefault(key, dict()).setdefault(move, [0, 0, 0])
+            if result > 0:
+                counts[0] += 1
+            elif result == 0:
+                counts[1] += 1
+            else:
+                counts[2] += 1
+
+    return OpeningBook(stats)
+
+
+class OpeningBook():
+    def __init__(self, stats: dict = None):
+        """ 初期化
+
+        Args:
+            stats (dict): 正規形ハッシュをKeyとした
+                {正規形の着手: [勝ち数, 引き分け数, 負け数]}
+        """
+
+        self.stats = stats if stats is not None else dict()
+
+        return
+
+    def __len__(self):
+        return len(self.stats)
+
+    @classmethod
+    def load(cls, file_path: str = None):
+        """ ファイルから読み込み
+
+        Args:
+            file_path (str): 定石ファイル(未指定ならopening_book.rvob)
+
+        Returns:
+            (OpeningBook): 定石
+
+        Raises:
+            ValueError: ファイル形式が異なる場合に例外送出
+        """
+
+        if file_path is None:
+            file_path = BOOK_FILE_PATH
+
+        with open(file_path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                raise ValueError('invalid opening book file: ' + file_path)
+            magic, version, count = FILE_HEADER.unpack(header)
+            if (magic, version) != (MAGIC, VERSION):
+                raise ValueError('invalid opening book file: ' + file_path)
+            entries = np.frombuffer(
+                f.read(count * ENTRY_DTYPE.itemsize), dtype=ENTRY_DTYPE)
+
+        stats = dict()
+        for key, move, wins, draws, losses in entries.tolist():
+            stats.setdefault(key, dict())[move] = [wins, draws, losses]
+
+        return cls(stats)
+
+    def save(self, file_path: str = None):
+        """ ファイルへ書き出し
+
+        Args:
+            file_path (str): 定石ファイル(未指定ならopening_book.rvob)
+        """
+
+        if file_path is None:
+            file_path = BOOK_FILE_PATH
+
+        entries = np.array(
+            [(key, move, *counts)
+             for key, moves in sorted(self.stats.items())
+             for move, counts in sorted(moves.items())],
+            dtype=ENTRY_DTYPE)
+
+        with open(file_path, 'wb') as f:
+            f.write(FILE_HEADER.pack(MAGIC, VERSION, len(entries)))
+            f.write(entries.tobytes())
+
+        return
+
+    def lookup(self, player: int, opponent: int):
+        """ 局面の定石の着手
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+
+        Returns:
+            (list): [(ビット番号, 勝ち数, 引き分け数, 負け数)]
+                (定石になければ空)
+        """
+
+        canonical_player, canonical_opponent, k = \
+            symmetry.canonical(player, opponent)
+        key = transposition.zobrist_hash(
+            canonical_player, canonical_opponent)
+
+        moves = self.stats.get(key)
+        if not moves:
+            return list()
+
+        inverse = symmetry.INVERSE[k]
+
+        return [(symmetry.transform_index(move, inverse), *counts)
+                for move, counts in moves.items()]
+
+    def best_move(self, player: int, opponent: int,
+                  min_visits: int = MIN_VISITS, rng=None):
+        """ 定石から着手を選択(期待得点が最大、同点はランダム)
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+            min_visits (int): 採用する最小の出現回数
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+
+        Returns:
+            (int): ビット番号(定石になければNone)
+        """
+
+        if rng is None:
+            rng = random
+
+        best_moves = list()
+        best_score = -1.0
+        for index, wins, draws, losses in self.lookup(player, opponent):
+            visits = wins + draws + losses
+            if visits < min_visits:
+                continue
+            score = (wins + 0.5 * draws) / visits
+            if score > best_score:
+                best_moves = [index]
+                best_score = score
+            elif score == best_score:
+                best_moves.append(index)
+
+        if not best_moves:
+            return None
+
+        return best_moves[rng.randrange(len(best_moves))]
+
+
+class BookPlayer(players.Player):
+    def __init__(self, book: OpeningBook, min_visits: int = MIN_VISITS,
+                 rng=None):
+        """ 初期化
+
+        Args:
+            book (OpeningBook): 定石
+            min_visits (int): 採用する最小の出現回数
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+        """
+
+        super().__init__(rng)
+
+        self.book = book
+        self.min_visits = min_visits
+
+        return
+
+    def select_move(self, game):
+        """ 定石から着手を選択(定石になければNone)
+        """
+
+        turn = game.player_turn
+        player = game.bit_boards[turn]
+        opponent = game.bit_boards[1-turn]
+
+        index = self.book.best_move(
+            player, opponent, self.min_visits, self.rng)
+        if index is None:
+            return None
+
+        return bitboard.index_to_pos(index)
+
+
+if __name__ == '__main__':
+    import sys
+
+    book = build_book(
+        max_plies=int(sys.argv[1]) if len(sys.argv) > 1 else MAX_PLIES)
+    book.save()
+    print('{} positions saved.'.format(len(book)))
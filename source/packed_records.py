@@ -0,0 +1,416 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    packed_records.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの棋譜のバイナリ形式(1手1バイト)と索引ファイル
+    データファイル(.rvb)
+        ファイルヘッダ 8バイト  : MAGIC_DATA + バージョン
+        1局ごと
+            局ヘッダ 4バイト    : 手数(パスを含む)、黒コマ数、白コマ数、勝敗
+            指手 1バイト×手数   : bit0-5 ビット番号(x_index*8+y_index)
+                                  bit6   手番(0:黒、1:白)
+                                  bit7   パス
+    索引ファイル(.rvb.idx)
+        ファイルヘッダ 8バイト  : MAGIC_INDEX + バージョン
+        1局ごと 8バイト         : データファイル内の局の先頭位置(uint64)
+    索引によりN局目を1回のシークで読み出せる。
+    索引ファイルがなければrebuild_indexでデータファイルから作り直せる
+    (書き込み途中で切れた末尾の局は切り詰める)。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import os
+import struct
+
+import bitboard
+import game_records
+import reversi_core
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+
+MAGIC_DATA = b'RVRB'
+MAGIC_INDEX = b'RVRI'
+VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sBxxx')
+GAME_HEADER = struct.Struct('<BBBB')
+OFFSET = struct.Struct('<Q')
+
+INDEX_SUFFIX = '.idx'
+
+TURN_BIT = 0x40
+PASS_BIT = 0x80
+SQUARE_MASK = 0x3F
+
+# 局ヘッダの勝敗(結果未記録)
+NO_RESULT = 0xFF
+
+
+def encode_move(move: str):
+    """ 指手文字列を1バイトに変換
+
+    Args:
+        move (str): 指手文字列(例:'bF4')
+
+    Returns:
+        (int): 指手バイト
+    """
+
+    turn = BLACK_PIECE if move[0] == 'b' else WHITE_PIECE
+    x_index, y_index = ord(move[1]) - 0x41, ord(move[2]) - 0x31
+
+    return (turn << 6) | bitboard.pos_to_index((x_index, y_index))
+
+
+def decode_move(value: int):
+    """ 指手バイトを指手文字列に変換
+
+    Args:
+        value (int): 指手バイト
+
+    Returns:
+        (str): 指手文字列(パスならNone)
+    """
+
+    if value & PASS_BIT:
+        return None
+
+    player_key = 'w' if value & TURN_BIT else 'b'
+    x_index, y_index = bitboard.index_to_pos(value & SQUARE_MASK)
+
+    return '{}{}{}'.format(player_key, chr(0x41 + x_index), chr(0x31 + y_index))
+
+
+def encode_process(process: str):
+    """ 棋譜文字列を指手バイト列に変換
+
+    同じ手番が続く箇所には相手のパスを挿入する。
+
+    Args:
+        process (str): 棋譜文字列(例:'bF4wF5...')
+
+    Returns:
+        (bytes): 指手バイト列
+    """
+
+    values = bytearray()
+    last_turn = None
+    for move in game_records.split_process(process):
+        value = encode_move(move)
+        turn = (value & TURN_BIT) >> 6
+        if last_turn is not None and turn == last_turn:
+            values.append(PASS_BIT | ((1 - turn) << 6))
+        values.append(value)
+        last_turn = turn
+
+    return bytes(values)
+
+
+def decode_process(values: bytes):
+    """ 指手バイト列を棋譜文字列に変換(パスは除く)
+
+    Args:
+        values (bytes): 指手バイト列
+
+    Returns:
+        (str): 棋譜文字列
+    """
+
+    moves = [decode_move(value) for value in values]
+
+    return ''.join(move for move in moves if move is not None)
+
+
+def _check_header_(f, magic: bytes):
+    """ ファイルヘッダの確認(先頭から読み込む)
+
+    Raises:
+        ValueError: ファイル形式が異なる場合に例外送出
+    """
+
+    f.seek(0)
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size or \
+            FILE_HEADER.unpack(header) != (magic, VERSION):
+        raise ValueError('invalid packed record file: ' + f.name)
+
+    return
+
+
+def rebuild_index(file_path: str):
+    """ データファイルを先頭から走査して索引ファイルを作り直す
+
+    書き込み途中で切れた末尾の局はデータファイルから切り詰める。
+
+    Args:
+        file_path (str): データファイル
+
+    Raises:
+        ValueError: ファイル形式が異なる場合に例外送出
+
+    Returns:
+        (int): 索引に書き出した局数
+    """
+
+    game_count = 0
+    with open(file_path, 'r+b') as data_file:
+        _check_header_(data_file, MAGIC_DATA)
+        index_file = open(file_path + INDEX_SUFFIX, 'wb')
+        index_file.write(FILE_HEADER.pack(MAGIC_INDEX, VERSION))
+
+        data_size = os.fstat(data_file.fileno()).st_size
+        offset = FILE_HEADER.size
+        while offset + GAME_HEADER.size <= data_size:
+            data_file.seek(offset)
+            move_count = GAME_HEADER.unpack(
+                data_file.read(GAME_HEADER.size))[0]
+            # 書き込み途中で切れた局は含めない
+            if offset + GAME_HEADER.size + move_count > data_size:
+                break
+            index_file.write(OFFSET.pack(offset))
+            offset += GAME_HEADER.size + move_count
+            game_count += 1
+        index_file.close()
+
+        # 追記する局が切れた局の後ろに続かないように切り詰める
+        if offset < data_size:
+            data_file.truncate(offset)
+
+    return game_count
+
+
+class PackedRecordWriter():
+    def __init__(self, file_path: str):
+        """ 初期化(既存ファイルには追記)
+
+        既存のデータファイルはヘッダを確認し、索引ファイルがなければ
+        データファイルから作り直す。
+
+        Args:
+            file_path (str): データファイル
+
+        Raises:
+            ValueError: 既存ファイルの形式が異なる場合に例外送出
+        """
+
+        self.file_path = file_path
+        index_path = file_path + INDEX_SUFFIX
+
+        isNew = not os.path.exists(file_path) or \
+            not os.path.getsize(file_path)
+        if not isNew:
+            if not os.path.exists(index_path) or \
+                    not os.path.getsize(index_path):
+                rebuild_index(file_path)
+            for path, magic in ((file_path, MAGIC_DATA),
+                                (index_path, MAGIC_INDEX)):
+                with open(path, 'rb') as f:
+                    _check_header_(f, magic)
+
+        self.data_file = open(file_path, 'ab')
+        self.index_file = open(index_path, 'wb' if isNew else 'ab')
+        if isNew:
+            self.data_file.write(FILE_HEADER.pack(MAGIC_DATA, VERSION))
+            self.index_file.write(FILE_HEADER.pack(MAGIC_INDEX, VERSION))
+
+        self.offset = self.data_file.tell()
+
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, game_record: dict):
+        """ 1局の追記
+
+        Args:
+            game_record (dict): 棋譜(result,process)
+        """
+
+        values = encode_process(game_record['process'])
+        result = game_record.get('result') or dict()
+        black = result.get('black')
+        white = result.get('wihte', result.get('white'))
+        if black is None or white is None:
+            black, white, judge = 0, 0, NO_RESULT
+        else:
+            judge = game_records.judge_result(result)
+
+        data = GAME_HEADER.pack(len(values), black, white, judge) + values
+        self.data_file.write(data)
+        self.index_file.write(OFFSET.pack(self.offset))
+        self.offset += len(data)
+
+        return
+
+    def close(self):
+        """ ファイルを閉じる
+        """
+
+        self.data_file.close()
+        self.index_file.close()
+
+        return
+
+
+class PackedRecordReader():
+    def __init__(self, file_path: str):
+        """ 初期化
+
+        Args:
+            file_path (str): データファイル
+
+        Raises:
+            ValueError: ファイル形式が異なる場合に例外送出
+        """
+
+        self.file_path = file_path
+        self.data_file = open(file_path, 'rb')
+        self.index_file = open(file_path + INDEX_SUFFIX, 'rb')
+
+        _check_header_(self.data_file, MAGIC_DATA)
+        _check_header_(self.index_file, MAGIC_INDEX)
+
+        index_size = os.fstat(self.index_file.fileno()).st_size
+        self.game_count = (index_size - FILE_HEADER.size) // OFFSET.size
+
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.game_count
+
+    def __iter__(self):
+        """ 先頭から順に読み込み(索引の位置を使うので索引外のデータは読まない)
+
+        Yields:
+            (dict): 棋譜(result,process)
+        """
+
+        for number in range(self.game_count):
+            yield self.read(number)
+
+    def read_values(self, number: int):
+        """ N局目の指手バイト列と局ヘッダ
+
+        Args:
+            number (int): 局番号(0始まり)
+
+        Returns:
+            (tuple): (指手バイト列, 黒コマ数, 白コマ数, 勝敗)
+        """
+
+        self._seek_(number)
+
+        return self._read_values_()
+
+    def read(self, number: int):
+        """ N局目の棋譜
+
+        Args:
+            number (int): 局番号(0始まり)
+
+        Returns:
+            (dict): 棋譜(result,process)
+        """
+
+        self._seek_(number)
+
+        return self._read_game_()
+
+    def _seek_(self, number: int):
+        """ 索引からN局目の先頭位置へ移動
+
+        Raises:
+            IndexError: 局番号が範囲外の場合に例外送出
+        """
+
+        if not 0 <= number < self.game_count:
+            raise IndexError(number)
+
+        self.index_file.seek(FILE_HEADER.size + number * OFFSET.size)
+        offset, = OFFSET.unpack(self.index_file.read(OFFSET.size))
+        self.data_file.seek(offset)
+
+        return
+
+    def _read_values_(self):
+        """ 現在位置から1局分の局ヘッダと指手を読み込み
+        """
+
+        header = self.data_file.read(GAME_HEADER.size)
+        move_count, black, white, judge = GAME_HEADER.unpack(header)
+        values = self.data_file.read(move_count)
+
+        return values, black, white, judge
+
+    def _read_game_(self):
+        """ 現在位置から1局分を棋譜dictとして読み込み
+        """
+
+        values, black, white, judge = self._read_values_()
+        if judge == NO_RESULT:
+            black, white = None, None
+
+        return {
+            'result': {'black': black, 'wihte': white},
+            'process': decode_process(values),
+        }
+
+    def close(self):
+        """ ファイルを閉じる
+        """
+
+        self.data_file.close()
+        self.index_file.close()
+
+        return
+
+
+def convert_text_records(text_path: str = None, packed_path: str = None):
+    """ テキスト形式(game_result.txt)をバイナリ形式に変換
+
+    Args:
+        text_path (str): テキスト形式の棋譜ファイル(未指定ならgame_result.txt)
+        packed_path (str): 出力先データファイル(未指定なら拡張子を.rvbに変更)
+
+    Returns:
+        (int): 変換した局数
+    """
+
+    if text_path is None:
+        text_path = reversi_core.RESULT_FILE_PATH
+    if packed_path is None:
+        packed_path = os.path.splitext(text_path)[0] + '.rvb'
+
+    count = 0
+    with PackedRecordWriter(packed_path) as writer:
+        for _, game_record in game_records.iter_game_records(
+                text_path, isFullRecord=True):
+            writer.write(game_record)
+            count += 1
+
+    return count
+
+
+if __name__ == '__main__':
+    import sys
+
+    count = convert_text_records(*sys.argv[1:3])
+    print('{} games converted.'.format(count))
@@ -0,0 +1,279 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    pattern_eval.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシのパターン評価関数
+    辺・隅・斜めなどのパターン(マス目の並び)の状態を3進数の
+    インデックス(空き0、手番側1、相手側2)にして重み表を引く。
+    パターンは基本形を対称変換した全インスタンスで同じ重み表を共有する。
+    インデックスはビットボードの1バイト(x_index固定の8マス)ごとに
+    部分インデックスを事前計算した表の和で求める。
+    重み表は進行度(空きマス数)ごとに持ち、着手可能数と偶数理論
+    (空きマスの偶奇)の特徴を加える。重みはpattern_train.pyで学習する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import numpy as np
+import os
+
+import batch_game
+import bitboard
+import reversi_core
+import symmetry
+
+WEIGHTS_FILE_PATH = os.path.join(reversi_core.DATA_PATH, 'pattern_weights.npz')
+
+# パターンの基本形(マス目インデックス(x_index,y_index)の並び)
+PATTERNS = (
+    ('edge2x', tuple((x, 0) for x in range(8)) + ((1, 1), (6, 1))),
+    ('corner3x3', tuple((x, y) for x in range(3) for y in range(3))),
+    ('corner2x5', tuple((x, y) for y in range(2) for x in range(5))),
+    ('line2', tuple((x, 1) for x in range(8))),
+    ('line3', tuple((x, 2) for x in range(8))),
+    ('line4', tuple((x, 3) for x in range(8))),
+    ('diag8', tuple((i, i) for i in range(8))),
+    ('diag7', tuple((i, i + 1) for i in range(7))),
+    ('diag6', tuple((i, i + 2) for i in range(6))),
+    ('diag5', tuple((i, i + 3) for i in range(5))),
+    ('diag4', tuple((i, i + 4) for i in range(4))),
+)
+
+# 進行度の区分数(空きマス数で等分)
+PHASE_COUNT = 4
+PHASE_EMPTIES = (bitboard.SQUARE_COUNT - 4 + PHASE_COUNT - 1) // PHASE_COUNT
+
+# 評価値の倍率(石差1あたり、search.DISC_SCALEより十分小さくする)
+EVAL_SCALE = 256
+
+
+def _pattern_instances_():
+    """ パターンの全インスタンス
+
+    Returns:
+        (list): [(パターン番号, ビット番号のタプル)]
+            マス目の集合が同じになる対称変換は1つにまとめる
+    """
+
+    instances = list()
+    for number, (_, squares) in enumerate(PATTERNS):
+        seen = set()
+        for k in range(symmetry.SYMMETRY_COUNT):
+            indices = tuple(
+                bitboard.pos_to_index(symmetry.transform_pos(pos, k))
+                for pos in squares)
+            if frozenset(indices) in seen:
+                continue
+            seen.add(frozenset(indices))
+            instances.append((number, indices))
+
+    return instances
+
+
+INSTANCES = _pattern_instances_()
+
+# パターンごとの重み表のサイズと、全パターンを連結した中での先頭位置
+PATTERN_SIZES = tuple(3 ** len(squares) for _, squares in PATTERNS)
+PATTERN_OFFSETS = tuple(
+    int(np.sum(PATTERN_SIZES[:number])) for number in range(len(PATTERNS)))
+
+# 連結した重み表の後ろに置くスカラー特徴(着手可能数の差、偶奇、定数項)
+MOBILITY_FEATURE = int(np.sum(PATTERN_SIZES))
+PARITY_FEATURE = MOBILITY_FEATURE + 1
+BIAS_FEATURE = MOBILITY_FEATURE + 2
+FEATURE_COUNT = MOBILITY_FEATURE + 3
+
+
+def _byte_tables_(indices: tuple):
+    """ インスタンスのバイト単位の部分インデックス表
+
+    Args:
+        indices (tuple): インスタンスのビット番号の並び
+
+    Returns:
+        (tuple): ((シフト量, 表[バイト値]), ...) パターンを含むバイトのみ
+    """
+
+    tables = list()
+    for x_index in range(bitboard.BOARD_SIZE):
+        shift = x_index * bitboard.BOARD_SIZE
+        digits = [(j, index - shift) for j, index in enumerate(indices)
+                  if shift <= index < shift + bitboard.BOARD_SIZE]
+        if not digits:
+            continue
+        table = tuple(
+            sum(3 ** j for j, bit in digits if value >> bit & 1)
+            for value in range(256))
+        tables.append((shift, table))
+
+    return tuple(tables)
+
+
+INSTANCE_TABLES = tuple(_byte_tables_(indices) for _, indices in INSTANCES)
+
+
+def pattern_indices(player: int, opponent: int):
+    """ 全インスタンスのインデックス
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (list): インスタンスごとの3進数インデックス
+    """
+
+    result = list()
+    for byte_tables in INSTANCE_TABLES:
+        index = 0
+        for shift, table in byte_tables:
+            index += table[player >> shift & 0xFF] + \
+                2 * table[opponent >> shift & 0xFF]
+        result.append(index)
+
+    return result
+
+
+def features_array(player: np.array, opponent: np.array):
+    """ 特徴の一括算出(学習用)
+
+    Args:
+        player (np.array): 手番側のビットボード(uint64)、形状(N,)
+        opponent (np.array): 相手側のビットボード(uint64)、形状(N,)
+
+    Returns:
+        (tuple): (連結した重み表での列番号 int64 (N, インスタンス数),
+            スカラー特徴 float64 (N, 3)[着手可能数の差、偶奇、定数項],
+            進行度 int (N,))
+    """
+
+    player = np.asarray(player, dtype=np.uint64)
+    opponent = np.asarray(opponent, dtype=np.uint64)
+    one = np.uint64(1)
+
+    columns = np.empty((len(player), len(INSTANCES)), dtype=np.int64)
+    for i, (number, indices) in enumerate(INSTANCES):
+        index = np.zeros(len(player), dtype=np.int64)
+        for j, square in enumerate(indices):
+            square = np.uint64(square)
+            state = ((player >> square) & one) + \
+                2 * ((opponent >> square) & one)
+            index += state.astype(np.int64) * 3 ** j
+        columns[:, i] = PATTERN_OFFSETS[number] + index
+
+    empties = bitboard.SQUARE_COUNT - \
+        batch_game.popcount(player | opponent).astype(np.int64)
+    mobility = batch_game.popcount(batch_game.legal_moves(player, opponent)) \
+        .astype(np.int64) - \
+        batch_game.popcount(batch_game.legal_moves(opponent, player)) \
+        .astype(np.int64)
+
+    scalars = np.empty((len(player), 3), dtype=np.float64)
+    scalars[:, 0] = mobility
+    scalars[:, 1] = np.where(empties % 2 == 1, 1.0, -1.0)
+    scalars[:, 2] = 1.0
+
+    phases = np.minimum(
+        PHASE_COUNT - 1, (bitboard.SQUARE_COUNT - 4 - empties) // PHASE_EMPTIES)
+
+    return columns, scalars, phases
+
+
+class PatternEvaluator():
+    def __init__(self, weights: np.array):
+        """ 初期化
+
+        Args:
+            weights (np.array): 重み(石差単位)、形状(PHASE_COUNT, FEATURE_COUNT)
+        """
+
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.shape != (PHASE_COUNT, FEATURE_COUNT):
+            raise ValueError('invalid weights shape: {}'.format(weights.shape))
+
+        self.weights = weights
+
+        # 整数化した重み表(インスタンスごとに参照する表を並べる)
+        scaled = np.rint(weights * EVAL_SCALE).astype(np.int64)
+        self.tables = list()
+        self.scalars = list()
+        for phase_weights in scaled:
+            pattern_tables = [
+                phase_weights[offset: offset + size].tolist()
+                for offset, size in zip(PATTERN_OFFSETS, PATTERN_SIZES)]
+            self.tables.append(tuple(
+                (pattern_tables[number], byte_tables)
+                for (number, _), byte_tables in zip(INSTANCES, INSTANCE_TABLES)))
+            self.scalars.append(
+                phase_weights[MOBILITY_FEATURE:].tolist())
+
+        return
+
+    @classmethod
+    def load(cls, file_path: str = None):
+        """ 重みファイルから読み込み
+
+        Args:
+            file_path (str): 重みファイル(未指定ならpattern_weights.npz)
+
+        Returns:
+            (PatternEvaluator): 評価関数
+        """
+
+        if file_path is None:
+            file_path = WEIGHTS_FILE_PATH
+
+        with np.load(file_path) as data:
+            return cls(data['weights'])
+
+    def save(self, file_path: str = None):
+        """ 重みファイルへ書き出し
+
+        Args:
+            file_path (str): 重みファイル(未指定ならpattern_weights.npz)
+        """
+
+        if file_path is None:
+            file_path = WEIGHTS_FILE_PATH
+
+        np.savez_compressed(
+            file_path, weights=self.weights.astype(np.float32))
+
+        return
+
+    def __call__(self, player: int, opponent: int):
+        """ 静的評価(search.SearchPlayerのevaluateとして使用)
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+
+        Returns:
+            (int): 手番側から見た評価値(石差 * EVAL_SCALE)
+        """
+
+        empties = bitboard.SQUARE_COUNT - bitboard.popcount(player | opponent)
+        stage = min(PHASE_COUNT - 1,
+                    (bitboard.SQUARE_COUNT - 4 - empties) // PHASE_EMPTIES)
+
+        score = 0
+        for weights, byte_tables in self.tables[stage]:
+            index = 0
+            for shift, table in byte_tables:
+                index += table[player >> shift & 0xFF] + \
+                    2 * table[opponent >> shift & 0xFF]
+            score += weights[index]
+
+        mobility_weight, parity_weight, bias = self.scalars[stage]
+        mobility = bitboard.popcount(bitboard.legal_moves(player, opponent)) - \
+            bitboard.popcount(bitboard.legal_moves(opponent, player))
+        score += mobility * mobility_weight + bias
+        score += parity_weight if empties & 1 else -parity_weight
+
+        return score
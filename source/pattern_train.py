@@ -0,0 +1,203 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    pattern_train.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシのパターン評価関数の学習
+    棋譜の各局面について、手番側から見た終局時の石差を目的変数とし、
+    進行度ごとにパターンの重みを最小二乗法(リッジ正則化)で求める。
+    特徴は疎(1局面あたりインスタンス数個の1)のため、正規方程式を
+    共役勾配法で解く(行列は作らずnp.bincountで積を計算する)。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import argparse
+import numpy as np
+
+import game_records
+import pattern_eval
+import position_dataset
+import reversi_core
+import symmetry
+
+# リッジ正則化の係数
+RIDGE = 1.0
+# 共役勾配法の反復回数
+ITERATIONS = 200
+
+
+def load_positions(records=None, dataset_path: str = None):
+    """ 学習用の局面の読み込み
+
+    Args:
+        records (iterable): 棋譜dict(result,process)の列
+            (未指定ならgame_result.txt)
+        dataset_path (str): 局面データセット(position_dataset)のファイル
+            (指定した場合は棋譜の代わりに使う)
+
+    Returns:
+        (np.array): 局面レコード(position_dataset.POSITION_DTYPE)
+    """
+
+    if dataset_path is not None:
+        return np.array(position_dataset.PositionDataset(dataset_path).positions)
+
+    if records is None:
+        records = (record for _, record in game_records.iter_game_records(
+            isFullRecord=True))
+
+    rows = list()
+    for record in records:
+        positions, score = position_dataset.process_positions(
+            record['process'])
+        for black, white, legal, move, turn in positions:
+            rows.append((black, white, legal, move, turn, score))
+
+    return np.array(rows, dtype=position_dataset.POSITION_DTYPE)
+
+
+def _solve_phase_(columns, scalars, target, ridge, iterations):
+    """ 1つの進行度の重みを共役勾配法で算出
+
+    (A^T A + ridge * I) w = A^T y を解く。
+
+    Returns:
+        (np.array): 重み、形状(FEATURE_COUNT,)
+    """
+
+    feature_count = pattern_eval.FEATURE_COUNT
+    scalar_start = pattern_eval.MOBILITY_FEATURE
+    flat_columns = columns.ravel()
+    instance_count = columns.shape[1]
+
+    def _forward_(w):
+        return w[columns].sum(axis=1) + scalars @ w[scalar_start:]
+
+    def _backward_(r):
+        g = np.bincount(flat_columns, weights=np.repeat(r, instance_count),
+                        minlength=feature_count)
+        g[scalar_start:] += scalars.T @ r
+        return g
+
+    def _normal_(w):
+        return _backward_(_forward_(w)) + ridge * w
+
+    w = np.zeros(feature_count)
+    r = _backward_(target)
+    p = r.copy()
+    rr = r @ r
+    for _ in range(iterations):
+        if rr < 1e-12:
+            break
+        q = _normal_(p)
+        alpha = rr / (p @ q)
+        w += alpha * p
+        r -= alpha * q
+        rr_next = r @ r
+        p = r + (rr_next / rr) * p
+        rr = rr_next
+
+    return w
+
+
+def fit_weights(positions: np.array,
+                ridge: float = RIDGE,
+                iterations: int = ITERATIONS,
+                isVerbose: bool = True,
+                ):
+    """ パターンの重みの学習
+
+    Args:
+        positions (np.array): 局面レコード(position_dataset.POSITION_DTYPE)
+        ridge (float): リッジ正則化の係数
+        iterations (int): 共役勾配法の反復回数
+        isVerbose (bool): Trueなら進行度ごとの誤差を表示
+
+    Returns:
+        (np.array): 重み、形状(PHASE_COUNT, FEATURE_COUNT)
+    """
+
+    isWhite = positions['turn'] == reversi_core.WHITE_PIECE
+    player = np.where(isWhite, positions['white'], positions['black'])
+    opponent = np.where(isWhite, positions['black'], positions['white'])
+    target = np.where(isWhite, -positions['score'].astype(np.float64),
+                      positions['score'].astype(np.float64))
+
+    columns, scalars, phases = pattern_eval.features_array(player, opponent)
+
+    weights = np.zeros((pattern_eval.PHASE_COUNT, pattern_eval.FEATURE_COUNT))
+    for stage in range(pattern_eval.PHASE_COUNT):
+        selected = phases == stage
+        if not selected.any():
+            continue
+        weights[stage] = _solve_phase_(
+            columns[selected], scalars[selected], target[selected],
+            ridge, iterations)
+
+        if isVerbose:
+            predicted = weights[stage][columns[selected]].sum(axis=1) + \
+                scalars[selected] @ weights[stage][pattern_eval.MOBILITY_FEATURE:]
+            rmse = np.sqrt(np.mean((predicted - target[selected]) ** 2))
+            print('phase {}: {:7d} positions, rmse {:.2f} discs'.format(
+                stage, int(selected.sum()), rmse))
+
+    return weights
+
+
+def train(records=None,
+          dataset_path: str = None,
+          output: str = None,
+          ridge: float = RIDGE,
+          iterations: int = ITERATIONS,
+          isAugment: bool = False,
+          isVerbose: bool = True,
+          ):
+    """ 学習して重みファイルを書き出し
+
+    Args:
+        records (iterable): 棋譜dict(result,process)の列
+        dataset_path (str): 局面データセットのファイル
+        output (str): 重みファイル(未指定ならpattern_weights.npz)
+        ridge (float): リッジ正則化の係数
+        iterations (int): 共役勾配法の反復回数
+        isAugment (bool): Trueなら対称変換で8倍に水増し
+        isVerbose (bool): Trueなら進行度ごとの誤差を表示
+
+    Returns:
+        (pattern_eval.PatternEvaluator): 評価関数
+    """
+
+    positions = load_positions(records, dataset_path)
+    if isAugment:
+        positions = symmetry.augment_positions(positions)
+
+    weights = fit_weights(positions, ridge, iterations, isVerbose)
+
+    evaluator = pattern_eval.PatternEvaluator(weights)
+    evaluator.save(output)
+
+    return evaluator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reversi pattern training')
+    parser.add_argument('-d', '--dataset', default=None)
+    parser.add_argument('-o', '--output', default=None)
+    parser.add_argument('-r', '--ridge', type=float, default=RIDGE)
+    parser.add_argument('-i', '--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--augment', action='store_true')
+    args = parser.parse_args()
+
+    train(
+        dataset_path=args.dataset,
+        output=args.output,
+        ridge=args.ridge,
+        iterations=args.iterations,
+        isAugment=args.augment,
+    )
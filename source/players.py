@@ -0,0 +1,130 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    players.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの自動プレイヤー
+    select_move(game)で合法手から着手を選ぶ。gameはreversi_core.ReversiCore。
+    合法手のリストから直接選ぶため、やり直し(リトライ)は発生しない。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import random
+
+import bitboard
+
+# マス目ごとの重み(角を優先し、角の隣を避ける)
+SQUARE_WEIGHTS = (
+    (100, 1, 20, 15, 15, 20, 1, 100),
+    (1, 1, 5, 5, 5, 5, 1, 1),
+    (20, 5, 15, 10, 10, 15, 5, 20),
+    (15, 5, 10, 5, 5, 10, 5, 15),
+    (15, 5, 10, 5, 5, 10, 5, 15),
+    (20, 5, 15, 10, 10, 15, 5, 20),
+    (1, 1, 5, 5, 5, 5, 1, 1),
+    (100, 1, 20, 15, 15, 20, 1, 100),
+)
+
+
+class Player():
+    def __init__(self, rng=None):
+        """ 初期化
+
+        Args:
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+        """
+
+        self.rng = rng if rng is not None else random
+
+        return
+
+    def select_move(self, game):
+        """ 着手の選択
+
+        Args:
+            game (reversi_core.ReversiCore): 対局中のゲーム
+
+        Returns:
+            (tuple): マス目インデックス(x_index,y_index)、合法手がなければNone
+        """
+
+        raise NotImplementedError
+
+    def reset(self):
+        """ 新しいゲーム開始時の初期化
+        """
+
+        return
+
+
+class RandomPlayer(Player):
+    def select_move(self, game):
+        """ 合法手から一様ランダムに選択
+        """
+
+        moves = game.get_legal_moves()
+        if not moves:
+            return None
+
+        return moves[self.rng.randrange(len(moves))]
+
+
+class WeightedRandomPlayer(Player):
+    def __init__(self, weights=SQUARE_WEIGHTS, rng=None):
+        """ 初期化
+
+        Args:
+            weights (tuple): マス目ごとの重み weights[x_index][y_index]
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+        """
+
+        super().__init__(rng)
+
+        self.weights = weights
+
+        return
+
+    def select_move(self, game):
+        """ 合法手からマス目の重みに比例してランダムに選択
+        """
+
+        moves = game.get_legal_moves()
+        if not moves:
+            return None
+
+        weights = [self.weights[x][y] for x, y in moves]
+
+        return self.rng.choices(moves, weights=weights)[0]
+
+
+class GreedyPlayer(Player):
+    def select_move(self, game):
+        """ ひっくり返す駒数が最大の合法手を選択(同数はランダム)
+        """
+
+        turn = game.player_turn
+        player = game.bit_boards[turn]
+        opponent = game.bit_boards[1-turn]
+
+        best_moves = list()
+        best_count = 0
+        for index in bitboard.iter_bits(game.get_legal_bits(turn)):
+            count = bitboard.popcount(bitboard.flips(player, opponent, index))
+            if count > best_count:
+                best_moves = [index]
+                best_count = count
+            elif count == best_count:
+                best_moves.append(index)
+
+        if not best_moves:
+            return None
+
+        index = best_moves[self.rng.randrange(len(best_moves))]
+
+        return bitboard.index_to_pos(index)
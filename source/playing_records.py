@@ -6,6 +6,8 @@ FileName:
 Description:
 --------------------------------------------------------------------------------
     リバーシのゲーム結果の学習
+    1つのウィンドウで棋譜を再生し、キー操作で手数・局を移動する。
+    局面は局ごとに再生してキャッシュする。
 
 History:
 --------------------------------------------------------------------------------
@@ -14,157 +16,327 @@ History:
 """
 
 
-import json
-import linecache
-import numpy as np
+import collections
 import os
 import pygame
-import sys
 
-source_path = os.getcwd() + '\\source'
-if os.path.exists(source_path):
-    sys.path.append(source_path)
-    import reversi_game as game
-    import draw_game
-else:
-    print('error:The source code path is incorrect.')
-    sys.exit()
+import draw_game
+import game_records
+import replay
+import reversi_core
+import reversi_game as game
+
+
+# 自動再生の1手あたりの表示時間(ミリ秒)、早送り時
+PLAY_INTERVAL = 300
+FAST_INTERVAL = 30
+# 局面をキャッシュする局数
+CACHE_GAMES = 256
+
+# キー操作
+KEY_HELP = """
+    Right/Left      : 1手進む/戻る(局をまたぐ)
+    Down/Up         : 次の局/前の局
+    PageDown/PageUp : 10局進む/戻る
+    Home/End        : 初手/最終手
+    Space           : 自動再生/停止
+    F               : 早送りの切替
+    数字 + G        : 指定した番号の局に移動
+    数字 + Enter    : 指定した手数に移動
+    Esc/Q           : 終了
+"""
 
 
 class PlayingGameRecords():
     def __init__(self):
         """ 初期化
         """
-        current = os.getcwd()
-        file_path = current + "/source/data/game_result.txt"
+        file_path = reversi_core.RESULT_FILE_PATH
         if os.path.exists(file_path):
             self.file_path = file_path
         else:
             self.file_path = None
 
-    def run(self):
-        """ 実行ループ処理
+        self.surface = None
+
+        # 棋譜の一覧[(行番号, 指手のリスト)]と表示中の局・手数
+        self.records = list()
+        self.game_index = 0
+        self.ply = 0
+
+        # 局ごとの局面配列(最近表示した局のみ保持)
+        self.positions_cache = collections.OrderedDict()
+
+    def run(self, start_game: int = 0, isPlay: bool = True, **filters):
+        """ 実行ループ処理(1つのウィンドウで全局を再生)
+
+        Args:
+            start_game (int): 最初に表示する局(0始まり)
+            isPlay (bool): Trueなら自動再生で開始
+            filters (dict): game_records.iter_game_recordsの絞り込み条件
         """
 
-        if self.file_path:
-
-            game_records = self.read_game_record()
-            for game_record in game_records.values():
-                self.create_reversi_game()
-                record_pieces_on_board = self.assemble_game_array(game_record)
-
-                self.game.init_pygeme()
-                self.game.draw_background()
-                self.game.draw_board_frame()
-
-                isSuspend = False
-
-                for record_pieces in record_pieces_on_board:
-                    on_board = record_pieces[0]
-                    self.game.draw_pieces(on_board)
-                    pygame.display.update()
-                    cnt_limit = 300
-                    interval = 60
-                    timer_id = 25
-                    pygame.time.set_timer(timer_id, interval)
-
-                    while(cnt_limit):
-                        for event in pygame.event.get():
-                            if event.type == pygame.QUIT:
-                                cnt_limit = 0
-                                isSuspend = True
-                                pygame.event.clear()
-                                break
-                            if event.type == timer_id:
-                                cnt_limit -= interval
-                    if isSuspend:
-                        break
-
-                pygame.register_quit(self.quit)
-                pygame.time.wait(200)
-                pygame.quit()
+        if not self.file_path:
+            return
+
+        self.load_records(**filters)
+        if not self.records:
+            return
+
+        if self.surface is None:
+            self.surface = draw_game.BoardSurface()
+        self.surface.init_pygeme()
+        self.surface.draw_background()
+        pygame.key.set_repeat(300, 30)
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        print(KEY_HELP)
+
+        step_event = pygame.event.custom_type()
+        interval = PLAY_INTERVAL
+        digits = ''
+
+        self.seek(start_game, 0)
+        isRedraw = True
+        timer_interval = None
+
+        while(True):
+            if isRedraw:
+                isRedraw = False
+                self.draw_position()
+
+            # 自動再生のタイマーは状態が変わった場合のみ設定
+            if timer_interval != (interval if isPlay else 0):
+                timer_interval = interval if isPlay else 0
+                pygame.time.set_timer(step_event, timer_interval)
+
+            event = pygame.event.wait()
+            if event.type == pygame.QUIT:
+                break
+
+            if event.type == pygame.VIDEOEXPOSE:
+                self.surface.isFullUpdate = True
+                isRedraw = True
+
+            if event.type == step_event:
+                if not self.step(1):
+                    isPlay = False
+                isRedraw = True
+
+            if event.type != pygame.KEYDOWN:
+                continue
+
+            key = event.key
+            if key in (pygame.K_ESCAPE, pygame.K_q):
+                break
+            if event.unicode.isdigit():
+                digits += event.unicode
+                continue
+
+            if key == pygame.K_RIGHT:
+                self.step(1)
+            elif key == pygame.K_LEFT:
+                self.step(-1)
+            elif key == pygame.K_DOWN:
+                self.seek(self.game_index + 1, 0)
+            elif key == pygame.K_UP:
+                self.seek(self.game_index - 1, 0)
+            elif key == pygame.K_PAGEDOWN:
+                self.seek(self.game_index + 10, 0)
+            elif key == pygame.K_PAGEUP:
+                self.seek(self.game_index - 10, 0)
+            elif key == pygame.K_HOME:
+                self.seek(self.game_index, 0)
+            elif key == pygame.K_END:
+                self.seek(self.game_index, -1)
+            elif key == pygame.K_SPACE:
+                isPlay = not isPlay
+            elif key == pygame.K_f:
+                if interval == PLAY_INTERVAL:
+                    interval = FAST_INTERVAL
+                else:
+                    interval = PLAY_INTERVAL
+            elif key == pygame.K_g and digits:
+                self.seek(int(digits) - 1, 0)
+            elif key in (pygame.K_RETURN, pygame.K_KP_ENTER) and digits:
+                self.seek(self.game_index, int(digits))
+            digits = ''
+            isRedraw = True
+
+        pygame.time.set_timer(step_event, 0)
+        pygame.register_quit(self.quit)
+        pygame.quit()
 
         return
 
-    def create_reversi_game(self):
-        """ リバーシゲームのインスタンス生成
+    def load_records(self, **filters):
+        """ 棋譜の一覧の読み込み
+
+        Args:
+            filters (dict): game_records.iter_game_recordsの絞り込み条件
         """
 
-        self.game = game.ReversiGame()
-        self.game.init_pieces()
+        self.records = list(self.iter_game_records(**filters))
+        self.positions_cache.clear()
+        self.game_index = 0
+        self.ply = 0
 
-    def read_game_record(self):
-        """ ゲーム結果の読み込み
+        return
+
+    def game_positions(self, game_index: int):
+        """ 局の全局面(キャッシュ)
+
+        Args:
+            game_index (int): 局(0始まり)
+
+        Returns:
+            (np.array): assemble_game_arrayの結果
         """
 
-        game_records = dict()
+        cache = self.positions_cache
+        positions = cache.get(game_index)
+        if positions is None:
+            _, game_record = self.records[game_index]
+            positions = self.assemble_game_array(game_record)
+            cache[game_index] = positions
+            if len(cache) > CACHE_GAMES:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(game_index)
+
+        return positions
 
-        with open(self.file_path) as f:
-            line_count = sum([1 for line in f])
+    def seek(self, game_index: int, ply: int):
+        """ 指定した局・手数に移動
 
-        if line_count:
-            for line_number in range(line_count):
-                game_record = list()
+        Args:
+            game_index (int): 局(0始まり、範囲外は先頭・末尾に補正)
+            ply (int): 手数(負の値は最終手から数える)
+        """
 
-                line = linecache.getline(self.file_path, line_number+1)
-                data = json.loads(line)
-                if isinstance(data, dict):
-                    if 'process' in data:
-                        game_record = data['process']
-                        game_record = [game_record[i: i+3]
-                                       for i in range(0, len(game_record), 3)]
-                        game_records.setdefault(line_number+1, game_record)
-        return game_records
+        game_index = min(max(game_index, 0), len(self.records) - 1)
+        last_ply = len(self.game_positions(game_index)) - 1
+        if ply < 0:
+            ply += last_ply + 1
 
-    def assemble_game_array(self, game_record):
-        """ ゲーム指手の配列作成
+        self.game_index = game_index
+        self.ply = min(max(ply, 0), last_ply)
+
+        return
+
+    def step(self, delta: int):
+        """ 手数を進める・戻す(局の最後・最初では次・前の局に移動)
 
         Args:
-            game_record (list): ゲーム指手の文字列リスト
+            delta (int): 手数の増減
+
+        Returns:
+            (bool): 移動できた場合True
         """
 
-        def _create_borad_():
-            """ 盤面の作成
+        last_ply = len(self.game_positions(self.game_index)) - 1
+        ply = self.ply + delta
+
+        if ply > last_ply:
+            if self.game_index + 1 >= len(self.records):
+                return False
+            self.seek(self.game_index + 1, 0)
+        elif ply < 0:
+            if self.game_index == 0:
+                return False
+            self.seek(self.game_index - 1, -1)
+        else:
+            self.ply = ply
 
-            Returns:
-                (list): np.arrayのリスト(盤面、黒盤面、白盤面)
-            """
-            board = self.game.pieces_on_board.copy()
-            black_board = np.where(board == game.WHITE_PIECE, np.nan, board)
-            black_board = np.where(
-                black_board == game.BLACK_PIECE, 1, black_board)
-            black_board = np.where(np.isnan(black_board), 0, black_board)
-            white_board = np.where(board == game.BLACK_PIECE, np.nan, board)
-            white_board = np.where(
-                white_board == game.WHITE_PIECE, 1, white_board)
-            white_board = np.where(np.isnan(white_board), 0, white_board)
+        return True
 
-            return board, black_board, white_board
+    def draw_position(self):
+        """ 表示中の局面の描画
+        """
 
-        record_pieces_on_board = np.full(
-            [1, 3, ] + list(self.game.board_squares), np.nan)
-        record_pieces_on_board[0][0] = self.game.pieces_on_board.copy()
+        surface = self.surface
+        line_number, game_record = self.records[self.game_index]
+        positions = self.game_positions(self.game_index)
+        on_board = positions[self.ply][0]
+
+        surface.draw_board_frame()
+        surface.draw_pieces(on_board)
+        surface.draw_counter(on_board)
+        if self.ply < len(game_record):
+            # 次の手番(パスを含めて棋譜の指手から判定)
+            if game_record[self.ply][0] == 'w':
+                surface.draw_player(game.WHITE_PIECE)
+            else:
+                surface.draw_player(game.BLACK_PIECE)
+        else:
+            surface.draw_game_over({
+                'judge': game_records.judge_result(
+                    self.judge_counts(on_board))})
+        surface.update_display()
 
-        board, black_board, white_board = _create_borad_()
-        record_pieces_on_board[0][1] = black_board
-        record_pieces_on_board[0][2] = white_board
+        pygame.display.set_caption(
+            'ReversiAI - game {}/{} (line {}) - move {}/{}'.format(
+                self.game_index + 1, len(self.records), line_number,
+                self.ply, len(positions) - 1))
 
-        for turn in game_record:
-            if turn[0] == 'b':
-                self.game.player_turn = game.BLACK_PIECE
-            elif turn[0] == 'w':
-                self.game.player_turn = game.WHITE_PIECE
-            x_index, y_index = ord(turn[1])-0x41, ord(turn[2])-0x31
+        return
+
+    def judge_counts(self, on_board):
+        """ 盤面の黒白コマ数(棋譜のresult形式)
+
+        Returns:
+            (dict): {'black': 黒のコマ数, 'wihte': 白のコマ数}
+        """
+
+        counts = self.surface.count_pieces(on_board)
+
+        return {
+            'black': counts[game.BLACK_PIECE],
+            'wihte': counts[game.WHITE_PIECE],
+        }
+
+    def create_reversi_game(self):
+        """ リバーシゲームのインスタンス生成
+        """
+
+        self.game = game.ReversiGame()
+        self.game.init_pieces()
+
+    def iter_game_records(self, **filters):
+        """ ゲーム結果の逐次読み込み
 
-            self.game.player_procedure(mpos_index=(x_index, y_index))
+        Args:
+            filters (dict): game_records.iter_game_recordsの絞り込み条件
 
-            board, black_board, white_board = _create_borad_()
+        Yields:
+            (tuple): (行番号, 指手のリスト)
+        """
 
-            record_pieces_on_board = \
-                np.append(record_pieces_on_board,
-                          [[board, black_board, white_board]], axis=0)
+        return game_records.iter_game_records(self.file_path, **filters)
+
+    def read_game_record(self, **filters):
+        """ ゲーム結果の読み込み
+
+        Args:
+            filters (dict): game_records.iter_game_recordsの絞り込み条件
+
+        Returns:
+            (dict): 行番号をKeyとした指手のリスト
+        """
+
+        return dict(self.iter_game_records(**filters))
+
+    def assemble_game_array(self, game_record):
+        """ ゲーム指手の配列作成
+
+        Args:
+            game_record (list): ゲーム指手の文字列リスト
+
+        Returns:
+            (np.array): int8、形状(手数 + 1, 3, 8, 8)
+                [盤面, 黒盤面, 白盤面]
+        """
 
-        return record_pieces_on_board
+        return replay.replay_game_array(game_record)
 
     def quit(self):
         print('終了します。')
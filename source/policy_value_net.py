@@ -0,0 +1,477 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    policy_value_net.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの方策・価値ネットワーク(NumPyのみ、CPU実行)
+    入力は手番側・相手側の盤面プレーンと合法手プレーン(各8x8)、
+    全結合2層の後に方策(64マスのsoftmax、合法手のみ)と
+    価値(tanh、手番側から見た勝敗)を出力する。
+    InferenceQueueは複数のゲーム・探索スレッドからの評価要求を集め、
+    まとめて1回の行列積で評価する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import concurrent.futures
+import numpy as np
+import os
+import queue
+import threading
+import time
+
+import batch_game
+import bitboard
+import players
+import reversi_core
+
+WEIGHTS_FILE_PATH = os.path.join(reversi_core.DATA_PATH, 'policy_value.npz')
+
+SQUARE_COUNT = bitboard.SQUARE_COUNT
+# 入力(手番側、相手側、合法手の3プレーン)
+INPUT_SIZE = SQUARE_COUNT * 3
+HIDDEN_SIZE = 256
+
+# Adamの係数
+ADAM_BETA1 = 0.9
+ADAM_BETA2 = 0.999
+ADAM_EPSILON = 1e-8
+
+# 推論キューの既定値(最大バッチサイズ、要求を待つ最大秒数)
+MAX_BATCH = 256
+MAX_WAIT = 0.002
+
+
+def encode_inputs(player: np.array, opponent: np.array, legal: np.array = None):
+    """ ビットボードをネットワークの入力に変換
+
+    Args:
+        player (np.array): 手番側のビットボード(uint64)、形状(N,)
+        opponent (np.array): 相手側のビットボード(uint64)、形状(N,)
+        legal (np.array): 合法手のビットボード(未指定なら算出)
+
+    Returns:
+        (tuple): (入力 float32 (N, INPUT_SIZE), 合法手 bool (N, 64))
+            マス目の並びはビット番号(x_index*8+y_index)順
+    """
+
+    player = np.asarray(player, dtype=np.uint64)
+    opponent = np.asarray(opponent, dtype=np.uint64)
+    if legal is None:
+        legal = batch_game.legal_moves(player, opponent)
+
+    legal_mask = batch_game.unpack_bits(np.asarray(legal, dtype=np.uint64))
+
+    inputs = np.empty((len(player), INPUT_SIZE), dtype=np.float32)
+    inputs[:, :SQUARE_COUNT] = batch_game.unpack_bits(player)
+    inputs[:, SQUARE_COUNT:SQUARE_COUNT * 2] = batch_game.unpack_bits(opponent)
+    inputs[:, SQUARE_COUNT * 2:] = legal_mask
+
+    return inputs, legal_mask
+
+
+def encode_positions(positions: np.array):
+    """ 局面レコード(position_dataset.POSITION_DTYPE)を学習データに変換
+
+    Args:
+        positions (np.array): 局面レコードの配列
+
+    Returns:
+        (tuple): (入力, 合法手, 着手のビット番号, 価値の目標値(勝ち1、
+            引き分け0、負け-1、手番側から見た値))
+    """
+
+    isWhite = positions['turn'] == reversi_core.WHITE_PIECE
+    player = np.where(isWhite, positions['white'], positions['black'])
+    opponent = np.where(isWhite, positions['black'], positions['white'])
+    inputs, legal_mask = encode_inputs(player, opponent, positions['legal'])
+
+    score = positions['score'].astype(np.float32)
+    values = np.sign(np.where(isWhite, -score, score))
+
+    return inputs, legal_mask, positions['move'].astype(np.int64), values
+
+
+class PolicyValueNet():
+    def __init__(self, hidden_size: int = HIDDEN_SIZE, seed=None):
+        """ 初期化(Heの初期値)
+
+        Args:
+            hidden_size (int): 中間層のユニット数
+            seed (int): 乱数シード
+        """
+
+        rng = np.random.default_rng(seed)
+
+        def _he_(rows, cols):
+            return (rng.standard_normal((rows, cols)) *
+                    np.sqrt(2.0 / rows)).astype(np.float32)
+
+        self.params = {
+            'w1': _he_(INPUT_SIZE, hidden_size),
+            'b1': np.zeros(hidden_size, dtype=np.float32),
+            'w2': _he_(hidden_size, hidden_size),
+            'b2': np.zeros(hidden_size, dtype=np.float32),
+            'wp': _he_(hidden_size, SQUARE_COUNT),
+            'bp': np.zeros(SQUARE_COUNT, dtype=np.float32),
+            'wv': _he_(hidden_size, 1),
+            'bv': np.zeros(1, dtype=np.float32),
+        }
+
+        self.moments = None
+        self.step_count = 0
+
+        return
+
+    @classmethod
+    def load(cls, file_path: str = None):
+        """ 重みファイルから読み込み
+
+        Args:
+            file_path (str): 重みファイル(未指定ならpolicy_value.npz)
+
+        Returns:
+            (PolicyValueNet): ネットワーク
+        """
+
+        if file_path is None:
+            file_path = WEIGHTS_FILE_PATH
+
+        with np.load(file_path) as data:
+            params = {key: data[key].astype(np.float32) for key in data.files}
+
+        net = cls(hidden_size=params['b1'].shape[0])
+        net.params = params
+
+        return net
+
+    def save(self, file_path: str = None):
+        """ 重みファイルへ書き出し
+
+        Args:
+            file_path (str): 重みファイル(未指定ならpolicy_value.npz)
+        """
+
+        if file_path is None:
+            file_path = WEIGHTS_FILE_PATH
+
+        np.savez_compressed(file_path, **self.params)
+
+        return
+
+    def forward(self, inputs: np.array):
+        """ 順伝播
+
+        Args:
+            inputs (np.array): 入力 float32 (N, INPUT_SIZE)
+
+        Returns:
+            (tuple): (方策のロジット (N, 64), 価値 (N,), 中間層の出力)
+        """
+
+        p = self.params
+        h1 = np.maximum(inputs @ p['w1'] + p['b1'], 0.0)
+        h2 = np.maximum(h1 @ p['w2'] + p['b2'], 0.0)
+        logits = h2 @ p['wp'] + p['bp']
+        values = np.tanh(h2 @ p['wv'] + p['bv'])[:, 0]
+
+        return logits, values, (h1, h2)
+
+    def predict(self, inputs: np.array, legal_mask: np.array):
+        """ 推論
+
+        Args:
+            inputs (np.array): 入力 float32 (N, INPUT_SIZE)
+            legal_mask (np.array): 合法手 bool (N, 64)
+
+        Returns:
+            (tuple): (方策 float32 (N, 64)、合法手以外は0, 価値 (N,))
+        """
+
+        logits, values, _ = self.forward(inputs)
+
+        return _masked_softmax_(logits, legal_mask), values
+
+    def train_batch(self, inputs: np.array, legal_mask: np.array,
+                    moves: np.array, targets: np.array,
+                    learning_rate: float = 1e-3):
+        """ 1バッチの学習(Adam)
+
+        損失は方策の交差エントロピーと価値の二乗誤差の和。
+
+        Args:
+            inputs (np.array): 入力 float32 (N, INPUT_SIZE)
+            legal_mask (np.array): 合法手 bool (N, 64)
+            moves (np.array): 着手のビット番号 (N,)
+            targets (np.array): 価値の目標値 (N,)
+            learning_rate (float): 学習率
+
+        Returns:
+            (tuple): (方策の損失, 価値の損失)
+        """
+
+        p = self.params
+        count = len(inputs)
+        rows = np.arange(count)
+
+        logits, values, (h1, h2) = self.forward(inputs)
+        probs = _masked_softmax_(logits, legal_mask)
+
+        policy_loss = -np.mean(np.log(probs[rows, moves] + 1e-12))
+        value_loss = np.mean((values - targets) ** 2)
+
+        # 逆伝播
+        d_logits = probs
+        d_logits[rows, moves] -= 1.0
+        d_logits /= count
+        d_values = (2.0 / count) * (values - targets) * (1.0 - values ** 2)
+        d_values = d_values[:, None].astype(np.float32)
+
+        grads = dict()
+        grads['wp'] = h2.T @ d_logits
+        grads['bp'] = d_logits.sum(axis=0)
+        grads['wv'] = h2.T @ d_values
+        grads['bv'] = d_values.sum(axis=0)
+
+        d_h2 = (d_logits @ p['wp'].T + d_values @ p['wv'].T) * (h2 > 0)
+        grads['w2'] = h1.T @ d_h2
+        grads['b2'] = d_h2.sum(axis=0)
+
+        d_h1 = (d_h2 @ p['w2'].T) * (h1 > 0)
+        grads['w1'] = inputs.T @ d_h1
+        grads['b1'] = d_h1.sum(axis=0)
+
+        self._adam_(grads, learning_rate)
+
+        return float(policy_loss), float(value_loss)
+
+    def _adam_(self, grads: dict, learning_rate: float):
+        """ Adamによる更新
+        """
+
+        if self.moments is None:
+            self.moments = {
+                key: (np.zeros_like(value), np.zeros_like(value))
+                for key, value in self.params.items()}
+
+        self.step_count += 1
+        correction1 = 1.0 - ADAM_BETA1 ** self.step_count
+        correction2 = 1.0 - ADAM_BETA2 ** self.step_count
+
+        for key, grad in grads.items():
+            m, v = self.moments[key]
+            m *= ADAM_BETA1
+            m += (1.0 - ADAM_BETA1) * grad
+            v *= ADAM_BETA2
+            v += (1.0 - ADAM_BETA2) * grad * grad
+            self.params[key] -= (learning_rate * (m / correction1) /
+                                 (np.sqrt(v / correction2) + ADAM_EPSILON)
+                                 ).astype(np.float32)
+
+        return
+
+
+def _masked_softmax_(logits: np.array, legal_mask: np.array):
+    """ 合法手のみのsoftmax(合法手がなければ全て0)
+    """
+
+    masked = np.where(legal_mask, logits, -np.inf)
+    peak = masked.max(axis=1, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0.0)
+    exp = np.where(legal_mask, np.exp(masked - peak), 0.0)
+    total = exp.sum(axis=1, keepdims=True)
+
+    return (exp / np.where(total > 0, total, 1.0)).astype(np.float32)
+
+
+class InferenceQueue():
+    def __init__(self, net: PolicyValueNet,
+                 max_batch: int = MAX_BATCH,
+                 max_wait: float = MAX_WAIT,
+                 ):
+        """ 初期化(推論スレッドを開始)
+
+        Args:
+            net (PolicyValueNet): ネットワーク
+            max_batch (int): 1回に評価する最大局面数
+            max_wait (float): 最初の要求からバッチを締め切るまでの最大秒数
+        """
+
+        self.net = net
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+
+        self.requests = queue.Queue()
+        # close後の登録を防ぐ(登録と終了要求の順序を保証)
+        self.lock = threading.Lock()
+        self.isClosed = False
+        self.batch_count = 0
+        self.position_count = 0
+
+        self.thread = threading.Thread(target=self._serve_, daemon=True)
+        self.thread.start()
+
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, player: int, opponent: int):
+        """ 評価要求の登録
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+
+        Raises:
+            RuntimeError: close後に登録した場合に例外送出
+
+        Returns:
+            (concurrent.futures.Future): 結果は(方策 (64,), 価値)
+        """
+
+        future = concurrent.futures.Future()
+        with self.lock:
+            if self.isClosed:
+                raise RuntimeError('InferenceQueue is closed')
+            self.requests.put((player, opponent, future))
+
+        return future
+
+    def evaluate(self, player: int, opponent: int):
+        """ 評価(結果が出るまで待つ)
+
+        Returns:
+            (tuple): (方策 (64,), 価値)
+        """
+
+        return self.submit(player, opponent).result()
+
+    def close(self):
+        """ 推論スレッドの終了(登録済みの要求は評価してから終了し、
+        評価されずに残った要求には例外を設定)
+        """
+
+        with self.lock:
+            if self.isClosed:
+                return
+            self.isClosed = True
+            self.requests.put(None)
+
+        self.thread.join()
+        self.thread = None
+
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None and not request[2].done():
+                request[2].set_exception(
+                    RuntimeError('InferenceQueue is closed'))
+
+        return
+
+    def _serve_(self):
+        """ 推論スレッド(要求をまとめて評価)
+        """
+
+        isClosing = False
+        while not isClosing:
+            request = self.requests.get()
+            if request is None:
+                break
+
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    request = self.requests.get(
+                        timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    isClosing = True
+                    break
+                batch.append(request)
+
+            self._evaluate_batch_(batch)
+
+        return
+
+    def _evaluate_batch_(self, batch: list):
+        """ まとめて評価して結果を設定
+        """
+
+        player = np.array([request[0] for request in batch], dtype=np.uint64)
+        opponent = np.array([request[1] for request in batch], dtype=np.uint64)
+
+        try:
+            inputs, legal_mask = encode_inputs(player, opponent)
+            policies, values = self.net.predict(inputs, legal_mask)
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, _, future), policy, value in zip(batch, policies, values):
+            future.set_result((policy, float(value)))
+
+        self.batch_count += 1
+        self.position_count += len(batch)
+
+        return
+
+
+class NetworkPlayer(players.Player):
+    def __init__(self, evaluator, isSample: bool = False, rng=None):
+        """ 初期化
+
+        Args:
+            evaluator (PolicyValueNet or InferenceQueue): 評価に使う
+                ネットワーク(InferenceQueueなら他のゲームとまとめて評価)
+            isSample (bool): Trueなら方策の確率で選択、Falseなら最大
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+        """
+
+        super().__init__(rng)
+
+        self.evaluator = evaluator
+        self.isSample = isSample
+
+        return
+
+    def select_move(self, game):
+        """ 方策から着手を選択
+        """
+
+        turn = game.player_turn
+        player = game.bit_boards[turn]
+        opponent = game.bit_boards[1-turn]
+
+        if not game.get_legal_bits(turn):
+            return None
+
+        if isinstance(self.evaluator, InferenceQueue):
+            policy, _ = self.evaluator.evaluate(player, opponent)
+        else:
+            inputs, legal_mask = encode_inputs(
+                np.array([player], dtype=np.uint64),
+                np.array([opponent], dtype=np.uint64))
+            policies, _ = self.evaluator.predict(inputs, legal_mask)
+            policy = policies[0]
+
+        if self.isSample:
+            index = self.rng.choices(range(SQUARE_COUNT), weights=policy)[0]
+        else:
+            index = int(np.argmax(policy))
+
+        return bitboard.index_to_pos(index)
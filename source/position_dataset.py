@@ -0,0 +1,298 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    position_dataset.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの局面データセット(メモリマップ)
+    棋譜をreplay.replay_positionsで一括再生し、全局面を1つのファイルへ
+    固定長レコードで書き出す。
+        black, white : 黒・白のビットボード(盤面プレーンのビット圧縮)
+        legal        : 手番側の合法手のビットボード
+        move         : 実際の着手(ビット番号)
+        turn         : 手番(BLACK_PIECE/WHITE_PIECE)
+        score        : 終局時の石差(黒 - 白)
+    索引ファイル(.index.npy)には局ごとの先頭レコード番号を保存する。
+    読み込みはnp.memmapで行い、ミニバッチは連続領域のビューで返す。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import numpy as np
+import os
+
+import batch_game
+import bitboard
+import game_records
+import replay
+import reversi_core
+import symmetry
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+
+POSITION_DTYPE = np.dtype([
+    ('black', '<u8'),
+    ('white', '<u8'),
+    ('legal', '<u8'),
+    ('move', 'i1'),
+    ('turn', 'u1'),
+    ('score', 'i1'),
+])
+
+INDEX_SUFFIX = '.index.npy'
+
+
+def process_positions(process: str):
+    """ 棋譜を再生して着手前の局面を列挙(1局、replay.replay_game_bitboards)
+
+    Args:
+        process (str): 棋譜文字列(例:'bF4wF5...')
+
+    Returns:
+        (tuple): (局面のリスト[(black, white, legal, move, turn)],
+            終局時の石差(黒 - 白))
+    """
+
+    black, white, turns, indices = replay.replay_game_bitboards(process)
+    black, white = black.tolist(), white.tolist()
+
+    positions = list()
+    for ply, (turn, index) in enumerate(zip(turns.tolist(), indices.tolist())):
+        if turn == BLACK_PIECE:
+            legal = bitboard.legal_moves(black[ply], white[ply])
+        else:
+            legal = bitboard.legal_moves(white[ply], black[ply])
+        positions.append((black[ply], white[ply], legal, index, turn))
+
+    score = bitboard.popcount(black[-1]) - bitboard.popcount(white[-1])
+
+    return positions, score
+
+
+def _is_new_position_(position: tuple, seen: set):
+    """ 対称変換で一致する局面が未出現か(出現済みの集合に追加)
+    """
+
+    black, white, _, _, turn = position
+    key = (turn,) + symmetry.canonical(black, white)[:2]
+    if key in seen:
+        return False
+    seen.add(key)
+
+    return True
+
+
+def export_positions(file_path: str, records=None, isDedup: bool = False):
+    """ 棋譜を局面データセットに書き出し
+
+    Args:
+        file_path (str): 出力先ファイル
+        records (iterable): 棋譜dict(result,process)の列
+            (未指定ならgame_result.txt)
+        isDedup (bool): Trueなら対称変換で一致する局面は最初の1つのみ
+
+    Returns:
+        (tuple): (局数, 局面数)
+    """
+
+    if records is None:
+        records = (record for _, record in game_records.iter_game_records(
+            isFullRecord=True))
+
+    game_starts = [0]
+    total = 0
+    seen = set()
+
+    def _write_chunk_(f, processes):
+        nonlocal total
+        black, white, legal, moves, turns, offsets, scores = \
+            replay.replay_positions(processes)
+
+        chunk = np.empty(len(black), dtype=POSITION_DTYPE)
+        chunk['black'] = black
+        chunk['white'] = white
+        chunk['legal'] = legal
+        chunk['move'] = moves
+        chunk['turn'] = turns
+        chunk['score'] = np.repeat(scores, np.diff(offsets))
+
+        counts = np.diff(offsets)
+        if isDedup:
+            keep = np.fromiter(
+                (_is_new_position_((b, w, None, None, t), seen)
+                 for b, w, t in zip(black.tolist(), white.tolist(),
+                                    turns.tolist())),
+                dtype=bool, count=len(black))
+            chunk = chunk[keep]
+            kept = np.zeros(len(keep) + 1, dtype=np.int64)
+            np.cumsum(keep, out=kept[1:])
+            counts = np.diff(kept[offsets])
+
+        f.write(chunk.tobytes())
+        game_starts.extend((total + np.cumsum(counts)).tolist())
+        total += int(counts.sum())
+
+        return
+
+    with open(file_path, 'wb') as f:
+        processes = list()
+        for record in records:
+            processes.append(record['process'])
+            if len(processes) >= replay.BATCH_GAMES:
+                _write_chunk_(f, processes)
+                processes = list()
+        if processes:
+            _write_chunk_(f, processes)
+
+    np.save(file_path + INDEX_SUFFIX, np.array(game_starts, dtype=np.int64))
+
+    return len(game_starts) - 1, total
+
+
+def unpack_bits(bits: np.array):
+    """ ビットボード配列を8x8のプレーンに展開
+
+    Args:
+        bits (np.array): ビットボード(uint64)、形状(N,)
+
+    Returns:
+        (np.array): uint8(0/1)、形状(N, 8, 8)。[x_index, y_index]の並び
+    """
+
+    planes = batch_game.unpack_bits(bits).view(np.uint8)
+
+    return planes.reshape(-1, bitboard.BOARD_SIZE, bitboard.BOARD_SIZE)
+
+
+class PositionDataset():
+    def __init__(self, file_path: str):
+        """ 初期化(メモリマップで開く)
+
+        Args:
+            file_path (str): データセットファイル
+        """
+
+        self.file_path = file_path
+
+        size = os.path.getsize(file_path)
+        if size:
+            self.positions = np.memmap(
+                file_path, dtype=POSITION_DTYPE, mode='r')
+        else:
+            self.positions = np.zeros(0, dtype=POSITION_DTYPE)
+
+        index_path = file_path + INDEX_SUFFIX
+        if os.path.exists(index_path):
+            self.game_starts = np.load(index_path, mmap_mode='r')
+        else:
+            self.game_starts = None
+
+        return
+
+    def __len__(self):
+        return len(self.positions)
+
+    def game_count(self):
+        """ 局数
+
+        Returns:
+            (int): 局数(索引がなければNone)
+        """
+
+        if self.game_starts is None:
+            return None
+
+        return len(self.game_starts) - 1
+
+    def game(self, number: int):
+        """ N局目の全局面(ビュー)
+
+        Args:
+            number (int): 局番号(0始まり)
+
+        Returns:
+            (np.memmap): 局面レコード
+        """
+
+        start, stop = self.game_starts[number], self.game_starts[number + 1]
+
+        return self.positions[start:stop]
+
+    def batches(self, batch_size: int, isShuffle: bool = True,
+                seed=None, isCopy: bool = False):
+        """ ミニバッチの列挙
+
+        isCopyがFalseの場合は連続したbatch_size件をビューのまま返し、
+        バッチの順序のみをシャッフルする(コピーなし)。
+        Trueの場合は局面単位でシャッフルして新しい配列を返す。
+
+        Args:
+            batch_size (int): バッチサイズ
+            isShuffle (bool): Trueならシャッフル
+            seed (int): 乱数シード
+            isCopy (bool): Trueなら局面単位でシャッフル(コピーあり)
+
+        Yields:
+            (np.array): 局面レコードの配列
+        """
+
+        rng = np.random.default_rng(seed)
+        count = len(self.positions)
+
+        if isCopy:
+            order = np.arange(count)
+            if isShuffle:
+                rng.shuffle(order)
+            for start in range(0, count, batch_size):
+                indices = np.sort(order[start:start + batch_size])
+                yield self.positions[indices]
+            return
+
+        starts = np.arange(0, count, batch_size)
+        if isShuffle:
+            rng.shuffle(starts)
+        for start in starts:
+            yield self.positions[start:start + batch_size]
+
+        return
+
+
+def to_planes(batch: np.array):
+    """ 局面レコードを学習用の入力に変換
+
+    Args:
+        batch (np.array): 局面レコードの配列
+
+    Returns:
+        (tuple): (盤面プレーン uint8 (N, 2, 8, 8)[手番側、相手側],
+            合法手マスク uint8 (N, 8, 8),
+            手番側から見た終局時の石差 int (N,))
+    """
+
+    black = unpack_bits(batch['black'])
+    white = unpack_bits(batch['white'])
+    isWhite = (batch['turn'] == WHITE_PIECE)[:, None, None]
+
+    player = np.where(isWhite, white, black)
+    opponent = np.where(isWhite, black, white)
+    planes = np.stack([player, opponent], axis=1)
+
+    legal = unpack_bits(batch['legal'])
+    score = np.where(batch['turn'] == WHITE_PIECE,
+                     -batch['score'].astype(int), batch['score'].astype(int))
+
+    return planes, legal, score
+
+
+if __name__ == '__main__':
+    import sys
+
+    output = sys.argv[1] if len(sys.argv) > 1 else \
+        os.path.join(reversi_core.DATA_PATH, 'positions.bin')
+    games, positions = export_positions(output)
+    print('{} games, {} positions exported.'.format(games, positions))
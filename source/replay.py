@@ -0,0 +1,256 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    replay.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの棋譜の一括再生
+    複数局の指手を(局, 手数)の配列に並べ、手数ごとに全局をまとめて
+    batch_gameのビットボード演算で進める。出力は事前に確保した配列に
+    書き込み、np.appendによる再確保を行わない。
+    盤面は初期局面を含めて1局あたり(手数 + 1)局面。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import numpy as np
+
+import batch_game
+import bitboard
+import game_records
+import reversi_core
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+EMPTY_PIECE = reversi_core.EMPTY_PIECE
+
+# 1回に再生する局数
+BATCH_GAMES = 4096
+
+_UINT64_ONE = np.uint64(1)
+
+
+def parse_moves(game_record):
+    """ 指手を手番とビット番号の配列に変換
+
+    Args:
+        game_record (str or list): 棋譜文字列('bF4wF5...')または指手のリスト
+
+    Returns:
+        (tuple): (手番 np.array(int8), ビット番号 np.array(int8))
+    """
+
+    if not isinstance(game_record, str):
+        game_record = ''.join(game_record)
+
+    codes = np.frombuffer(game_record.encode('ascii'), dtype=np.uint8)
+    codes = codes.reshape(-1, game_records.MOVE_LENGTH).astype(np.int8)
+
+    turns = (codes[:, 0] == ord('w')).astype(np.int8)
+    indices = (codes[:, 1] - 0x41) * bitboard.BOARD_SIZE + (codes[:, 2] - 0x31)
+
+    return turns, indices.astype(np.int8)
+
+
+def replay_bitboards(game_list: list):
+    """ 複数局の一括再生
+
+    Args:
+        game_list (list): 棋譜文字列または指手のリストのリスト
+
+    Returns:
+        (tuple): (黒 np.array(uint64), 白 np.array(uint64),
+            局ごとの先頭局面番号 np.array(int64)、形状(局数 + 1,))
+    """
+
+    return _replay_parsed_(
+        [parse_moves(game_record) for game_record in game_list])
+
+
+def _replay_parsed_(parsed: list):
+    """ 複数局の一括再生(parse_movesの結果から)
+
+    Returns:
+        (tuple): replay_bitboardsと同じ
+    """
+
+    game_count = len(parsed)
+
+    lengths = np.array([len(turns) for turns, _ in parsed], dtype=np.int64)
+    offsets = np.zeros(game_count + 1, dtype=np.int64)
+    np.cumsum(lengths + 1, out=offsets[1:])
+
+    black = np.empty(offsets[-1], dtype=np.uint64)
+    white = np.empty(offsets[-1], dtype=np.uint64)
+    if not game_count:
+        return black, white, offsets
+
+    max_plies = int(lengths.max())
+    turn_table = np.zeros((game_count, max_plies), dtype=np.int8)
+    index_table = np.zeros((game_count, max_plies), dtype=np.int8)
+    for number, (turns, indices) in enumerate(parsed):
+        turn_table[number, :len(turns)] = turns
+        index_table[number, :len(indices)] = indices
+
+    boards = np.empty((game_count, 2), dtype=np.uint64)
+    boards[:, BLACK_PIECE] = bitboard.INITIAL_BLACK
+    boards[:, WHITE_PIECE] = bitboard.INITIAL_WHITE
+
+    starts = offsets[:-1]
+    black[starts] = boards[:, BLACK_PIECE]
+    white[starts] = boards[:, WHITE_PIECE]
+
+    for ply in range(max_plies):
+        games = np.flatnonzero(lengths > ply)
+        turns = turn_table[games, ply].astype(np.intp)
+        move_bits = _UINT64_ONE << index_table[games, ply].astype(np.uint64)
+
+        player = boards[games, turns]
+        opponent = boards[games, 1 - turns]
+        flipped = batch_game.flips(player, opponent, move_bits)
+        boards[games, turns] = player | flipped | move_bits
+        boards[games, 1 - turns] = opponent & ~flipped
+
+        positions = starts[games] + ply + 1
+        black[positions] = boards[games, BLACK_PIECE]
+        white[positions] = boards[games, WHITE_PIECE]
+
+    return black, white, offsets
+
+
+def to_planes(black: np.array, white: np.array):
+    """ ビットボードを盤面配列に変換
+
+    Args:
+        black (np.array): 黒のビットボード(uint64)、形状(N,)
+        white (np.array): 白のビットボード(uint64)、形状(N,)
+
+    Returns:
+        (np.array): int8、形状(N, 3, 8, 8)
+            [盤面(EMPTY_PIECE/BLACK_PIECE/WHITE_PIECE), 黒盤面, 白盤面]
+    """
+
+    shape = (len(black), bitboard.BOARD_SIZE, bitboard.BOARD_SIZE)
+    black_board = batch_game.unpack_bits(black).view(np.int8).reshape(shape)
+    white_board = batch_game.unpack_bits(white).view(np.int8).reshape(shape)
+
+    planes = np.empty((len(black), 3) + shape[1:], dtype=np.int8)
+    planes[:, 0] = EMPTY_PIECE + black_board * (BLACK_PIECE - EMPTY_PIECE) + \
+        white_board * (WHITE_PIECE - EMPTY_PIECE)
+    planes[:, 1] = black_board
+    planes[:, 2] = white_board
+
+    return planes
+
+
+def replay_positions(game_list: list):
+    """ 複数局の着手前の局面を一括で列挙(終局後の局面は含まない)
+
+    Args:
+        game_list (list): 棋譜文字列または指手のリストのリスト
+
+    Returns:
+        (tuple): (黒, 白, 手番側の合法手 np.array(uint64),
+            着手のビット番号 np.array(int8), 手番 np.array(int8),
+            局ごとの先頭局面番号 np.array(int64)、形状(局数 + 1,),
+            終局時の石差(黒 - 白) np.array(int64)、形状(局数,))
+    """
+
+    parsed = [parse_moves(game_record) for game_record in game_list]
+    black, white, offsets = _replay_parsed_(parsed)
+    game_count = len(parsed)
+
+    final = offsets[1:] - 1
+    scores = batch_game.popcount(black[final]).astype(np.int64) - \
+        batch_game.popcount(white[final]).astype(np.int64)
+
+    keep = np.ones(len(black), dtype=bool)
+    keep[final] = False
+    black, white = black[keep], white[keep]
+
+    if game_count:
+        turns = np.concatenate([turns for turns, _ in parsed])
+        moves = np.concatenate([indices for _, indices in parsed])
+    else:
+        turns = np.empty(0, dtype=np.int8)
+        moves = np.empty(0, dtype=np.int8)
+
+    isWhite = turns == WHITE_PIECE
+    player = np.where(isWhite, white, black)
+    opponent = np.where(isWhite, black, white)
+    legal = batch_game.legal_moves(player, opponent)
+
+    return black, white, legal, moves, turns, \
+        offsets - np.arange(game_count + 1), scores
+
+
+def replay_game_bitboards(game_record):
+    """ 1局の再生(ビットボード)
+
+    Args:
+        game_record (str or list): 棋譜文字列または指手のリスト
+
+    Returns:
+        (tuple): (黒 np.array(uint64), 白 np.array(uint64)、
+            形状(手数 + 1,), 手番 np.array(int8), ビット番号 np.array(int8))
+    """
+
+    turns, indices = parse_moves(game_record)
+
+    # 1局のみの場合は配列演算よりビットボードの整数演算が速い
+    black = np.empty(len(turns) + 1, dtype=np.uint64)
+    white = np.empty(len(turns) + 1, dtype=np.uint64)
+    boards = [bitboard.INITIAL_BLACK, bitboard.INITIAL_WHITE]
+    black[0], white[0] = boards
+    moves = zip(turns.tolist(), indices.tolist())
+    for ply, (turn, index) in enumerate(moves, 1):
+        player, opponent = boards[turn], boards[1-turn]
+        flipped = bitboard.flips(player, opponent, index)
+        boards[turn] = player | flipped | (1 << index)
+        boards[1-turn] = opponent & ~flipped
+        black[ply], white[ply] = boards
+
+    return black, white, turns, indices
+
+
+def replay_game_array(game_record):
+    """ 1局の再生
+
+    Args:
+        game_record (str or list): 棋譜文字列または指手のリスト
+
+    Returns:
+        (np.array): int8、形状(手数 + 1, 3, 8, 8)
+    """
+
+    black, white, _, _ = replay_game_bitboards(game_record)
+
+    return to_planes(black, white)
+
+
+def iter_replay(game_iter, batch_games: int = BATCH_GAMES):
+    """ 棋譜の逐次一括再生(大量の棋譜向け)
+
+    Args:
+        game_iter (iterable): 棋譜文字列または指手のリストの列
+        batch_games (int): 1回に再生する局数
+
+    Yields:
+        (tuple): replay_bitboardsの結果(batch_games局ごと)
+    """
+
+    game_list = list()
+    for game_record in game_iter:
+        game_list.append(game_record)
+        if len(game_list) >= batch_games:
+            yield replay_bitboards(game_list)
+            game_list = list()
+
+    if game_list:
+        yield replay_bitboards(game_list)
+
+    return
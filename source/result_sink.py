@@ -0,0 +1,299 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    result_sink.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの棋譜の書き出し先
+    BufferedResultWriterは棋譜をJSON行としてバッファし、件数または
+    経過時間で1回の追記にまとめて書き出す。拡張子が.gzならgzip圧縮。
+    複数プロセスから書き出す場合はプロセスごとのシャードファイルに書き、
+    merge_shardsで本体ファイルへまとめる。
+    ファイルの入れ替え(ローテーション、マージ)はos.replaceで行う。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import glob
+import gzip
+import json
+import os
+import shutil
+import time
+
+import reversi_core
+
+# バッファの書き出し条件(件数、秒)
+FLUSH_COUNT = 100
+FLUSH_INTERVAL = 5.0
+
+GZIP_SUFFIX = '.gz'
+SHARD_TAG = '.shard-'
+
+
+def open_record_file(file_path: str, mode: str = 'a'):
+    """ 棋譜ファイルを開く(拡張子が.gzならgzip)
+
+    Args:
+        file_path (str): 棋譜ファイル
+        mode (str): 'a','w','r'のいずれか
+
+    Returns:
+        (file): テキストモードのファイルオブジェクト
+    """
+
+    if file_path.endswith(GZIP_SUFFIX):
+        return gzip.open(file_path, mode + 't', encoding='utf-8')
+
+    return open(file_path, mode, encoding='utf-8')
+
+
+def _tagged_path_(file_path: str, tag: str):
+    """ 拡張子の前に文字列を挿入したパス(.gzは保持)
+
+    Args:
+        file_path (str): 元のパス
+        tag (str): 挿入する文字列
+
+    Returns:
+        (str): 例 game_result.txt.gz -> game_result<tag>.txt.gz
+    """
+
+    suffix = ''
+    if file_path.endswith(GZIP_SUFFIX):
+        file_path, suffix = file_path[:-len(GZIP_SUFFIX)], GZIP_SUFFIX
+    root, ext = os.path.splitext(file_path)
+
+    return root + tag + ext + suffix
+
+
+def shard_path(file_path: str, shard_id):
+    """ シャードファイルのパス
+
+    Args:
+        file_path (str): 本体の棋譜ファイル
+        shard_id (int or str): シャード識別子(プロセスIDなど)
+
+    Returns:
+        (str): 例 game_result.txt -> game_result.shard-1234.txt
+    """
+
+    return _tagged_path_(file_path, '{}{}'.format(SHARD_TAG, shard_id))
+
+
+def find_shards(file_path: str):
+    """ 本体ファイルに対応するシャードファイルの一覧
+
+    Args:
+        file_path (str): 本体の棋譜ファイル
+
+    Returns:
+        (list): シャードファイルのパス(名前順)
+    """
+
+    pattern = shard_path(glob.escape(file_path), '*')
+
+    return sorted(glob.glob(pattern))
+
+
+def merge_shards(file_path: str, shard_paths: list = None):
+    """ シャードファイルを本体ファイルに統合
+
+    本体とシャードを一時ファイルに連結してからos.replaceで入れ替え、
+    統合したシャードを削除する。
+
+    Args:
+        file_path (str): 本体の棋譜ファイル
+        shard_paths (list): シャードファイル(未指定ならfind_shards)
+
+    Returns:
+        (int): 統合したシャード数
+    """
+
+    if shard_paths is None:
+        shard_paths = find_shards(file_path)
+    if not shard_paths:
+        return 0
+
+    temp_path = _tagged_path_(file_path, '.tmp-{}'.format(os.getpid()))
+    with open_record_file(temp_path, 'w') as dst:
+        for src_path in [file_path] + list(shard_paths):
+            if not os.path.exists(src_path):
+                continue
+            with open_record_file(src_path, 'r') as src:
+                shutil.copyfileobj(src, dst)
+
+    os.replace(temp_path, file_path)
+    for src_path in shard_paths:
+        os.remove(src_path)
+
+    return len(shard_paths)
+
+
+def rotate_file(file_path: str):
+    """ 棋譜ファイルのローテーション
+
+    Args:
+        file_path (str): 棋譜ファイル
+
+    Returns:
+        (str): 退避先のパス(ファイルがなければNone)
+    """
+
+    if not os.path.exists(file_path):
+        return None
+
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    rotated_path = _tagged_path_(file_path, '.' + stamp)
+    number = 1
+    while os.path.exists(rotated_path):
+        rotated_path = _tagged_path_(file_path, '.{}-{}'.format(stamp, number))
+        number += 1
+
+    os.replace(file_path, rotated_path)
+
+    return rotated_path
+
+
+class ResultSink():
+    """ 棋譜の書き出し先(基底クラス)
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, game_record: dict):
+        """ 1局の書き出し
+
+        Args:
+            game_record (dict): 棋譜(result,process)
+        """
+
+        raise NotImplementedError
+
+    def write_many(self, game_records: list):
+        """ 複数局の書き出し
+
+        Args:
+            game_records (list): 棋譜(result,process)のリスト
+        """
+
+        for game_record in game_records:
+            self.write(game_record)
+
+        return
+
+    def flush(self):
+        """ バッファの書き出し
+        """
+
+        return
+
+    def close(self):
+        """ 終了処理
+        """
+
+        self.flush()
+
+        return
+
+
+class BufferedResultWriter(ResultSink):
+    def __init__(self,
+                 file_path: str = None,
+                 flush_count: int = FLUSH_COUNT,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 max_bytes: int = None,
+                 ):
+        """ 初期化
+
+        Args:
+            file_path (str): 追記先ファイル(未指定ならgame_result.txt、
+                拡張子が.gzならgzip圧縮)
+            flush_count (int): この件数たまったら書き出し
+            flush_interval (float): 前回の書き出しからこの秒数を過ぎたら書き出し
+                (Noneなら件数のみ)
+            max_bytes (int): 書き出し後にこのサイズを超えたらローテーション
+        """
+
+        if file_path is None:
+            file_path = reversi_core.RESULT_FILE_PATH
+
+        self.file_path = file_path
+        self.flush_count = max(1, flush_count)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+
+        self.lines = list()
+        self.last_flush = time.monotonic()
+
+        return
+
+    def write(self, game_record: dict):
+        """ 1局の書き出し(バッファに追加)
+        """
+
+        self.lines.append(json.dumps(game_record)+'\n')
+
+        if len(self.lines) >= self.flush_count:
+            self.flush()
+        elif self.flush_interval is not None and \
+                time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+        return
+
+    def flush(self):
+        """ バッファの書き出し(1回の追記)
+        """
+
+        if self.lines:
+            with open_record_file(self.file_path, 'a') as f:
+                f.write(''.join(self.lines))
+            self.lines = list()
+
+            if self.max_bytes is not None and \
+                    os.path.getsize(self.file_path) >= self.max_bytes:
+                rotate_file(self.file_path)
+
+        self.last_flush = time.monotonic()
+
+        return
+
+    def rotate(self):
+        """ バッファを書き出してからローテーション
+
+        Returns:
+            (str): 退避先のパス
+        """
+
+        self.flush()
+
+        return rotate_file(self.file_path)
+
+
+class ShardedResultWriter(BufferedResultWriter):
+    def __init__(self, file_path: str = None, shard_id=None, **kwargs):
+        """ 初期化(プロセスごとのシャードファイルへ書き出し)
+
+        Args:
+            file_path (str): 本体の棋譜ファイル(未指定ならgame_result.txt)
+            shard_id (int or str): シャード識別子(未指定ならプロセスID)
+            kwargs (dict): BufferedResultWriterの引数
+        """
+
+        if file_path is None:
+            file_path = reversi_core.RESULT_FILE_PATH
+        if shard_id is None:
+            shard_id = os.getpid()
+
+        super().__init__(shard_path(file_path, shard_id), **kwargs)
+
+        return
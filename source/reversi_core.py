@@ -0,0 +1,493 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    reversi_core.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシのルール・盤面状態(GUI非依存)
+    盤面、着手、パス・終了判定、コマ数、棋譜記録を扱う。
+    pygameをimportしないため、自己対戦などのヘッドレス実行で使用する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import json
+import numpy as np
+import os
+
+import bitboard
+
+EMPTY_PIECE = -1
+BLACK_PIECE = 0
+WHITE_PIECE = 1
+
+BLACK_WIN = 0
+WHITE_WIN = 1
+DRAW = 2
+PASS = -1
+
+# 棋譜データの保存先(モジュール位置基準)
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+RESULT_FILE_PATH = os.path.join(DATA_PATH, 'game_result.txt')
+
+
+class ReversiException(Exception):
+    NOT_EMPTY = 'NOT EMPTY SQUARE'
+
+
+def to_pieces_array(black: int, white: int, board_squares=(8, 8)):
+    """ ビットボードを盤面配列に変換
+
+    Args:
+        black (int): 黒のビットボード
+        white (int): 白のビットボード
+        board_squares (tuple): マス目
+
+    Returns:
+        (np.array): 未配置をEMPTY_PIECE、駒をBLACK_PIECE/WHITE_PIECEとした
+            int8の盤面配列
+    """
+
+    def _unpack_(bits):
+        byte_array = np.array([bits], dtype='<u8').view(np.uint8)
+        return np.unpackbits(byte_array, bitorder='little').astype(bool)
+
+    board = np.full(bitboard.SQUARE_COUNT, EMPTY_PIECE, dtype=np.int8)
+    board[_unpack_(black)] = BLACK_PIECE
+    board[_unpack_(white)] = WHITE_PIECE
+
+    return board.reshape(board_squares)
+
+
+def from_pieces_array(pieces_on_board: np.array):
+    """ 盤面配列をビットボードに変換(int8・旧形式(nan)のどちらも可)
+
+    Args:
+        pieces_on_board (np.array): 盤面配列
+
+    Returns:
+        (tuple): (黒のビットボード, 白のビットボード)
+    """
+
+    flat = np.asarray(pieces_on_board).reshape(bitboard.SQUARE_COUNT)
+
+    def _pack_(mask):
+        packed = np.packbits(mask, bitorder='little')
+        return int(packed.view('<u8')[0])
+
+    return _pack_(flat == BLACK_PIECE), _pack_(flat == WHITE_PIECE)
+
+
+def to_legacy_array(pieces_on_board: np.array):
+    """ int8の盤面配列を旧形式(未配置をnanとしたfloat64)に変換
+
+    Args:
+        pieces_on_board (np.array): int8の盤面配列(形状は任意)
+
+    Returns:
+        (np.array): float64の盤面配列
+    """
+
+    legacy = pieces_on_board.astype(np.float64)
+    legacy[pieces_on_board == EMPTY_PIECE] = np.nan
+
+    return legacy
+
+
+class BoardState():
+    """ 局面(ビットボードと手番)
+
+    リプレイバッファなどに大量に保持するため__slots__で属性を固定する。
+    """
+
+    __slots__ = ('black', 'white', 'turn')
+
+    def __init__(self, black: int, white: int, turn: int):
+        """ 初期化
+
+        Args:
+            black (int): 黒のビットボード
+            white (int): 白のビットボード
+            turn (int): 手番（BLACK_PIECE/WHITE_PIECE）
+        """
+
+        self.black = black
+        self.white = white
+        self.turn = turn
+
+        return
+
+    def __eq__(self, other):
+        if not isinstance(other, BoardState):
+            return NotImplemented
+        return (self.black, self.white, self.turn) == \
+            (other.black, other.white, other.turn)
+
+    def __hash__(self):
+        return hash((self.black, self.white, self.turn))
+
+    def __repr__(self):
+        return 'BoardState(black={:#018x}, white={:#018x}, turn={})'.format(
+            self.black, self.white, self.turn)
+
+    def to_array(self):
+        """ int8の盤面配列
+
+        Returns:
+            (np.array): 盤面配列
+        """
+
+        return to_pieces_array(self.black, self.white)
+
+
+class ReversiCore():
+    def __init__(self):
+        """ 初期化
+        """
+
+        # マス目
+        self.board_squares = (bitboard.BOARD_SIZE, bitboard.BOARD_SIZE)
+
+        # 棋譜の書き出し先(Noneならgame_result.txtに1局ずつ追記)
+        self.result_sink = None
+
+        self.init_game_record()
+
+        self.init_pieces()
+
+        return
+
+    def set_result_sink(self, result_sink):
+        """ 棋譜の書き出し先の設定
+
+        Args:
+            result_sink (result_sink.ResultSink): 書き出し先
+                (Noneならgame_result.txtに1局ずつ追記)
+        """
+
+        self.result_sink = result_sink
+
+        return
+
+    def init_game_record(self):
+        """ 棋譜の初期化
+        """
+
+        self.game_record = {
+            'result': {
+                'black': None, 'wihte': None,
+            },
+            'process': '',
+        }
+
+    def init_pieces(self):
+        """ 盤面の初期化
+        """
+
+        self.set_position(
+            bitboard.INITIAL_BLACK, bitboard.INITIAL_WHITE, BLACK_PIECE)
+
+        return
+
+    def set_position(self, black: int, white: int, turn: int):
+        """ 局面の設定
+
+        Args:
+            black (int): 黒のビットボード
+            white (int): 白のビットボード
+            turn (int): 手番（BLACK_PIECE/WHITE_PIECE）
+        """
+
+        # ビットボード(BLACK_PIECE/WHITE_PIECEをインデックスとする)
+        self.bit_boards = [black, white]
+
+        # 手番変数
+        self.player_turn = turn
+
+        # コマ数・未配置マス目(着手ごとに更新)、合法手(局面ごとにキャッシュ)
+        self.piece_counts = [bitboard.popcount(black), bitboard.popcount(white)]
+        self.empty_bits = ~(black | white) & bitboard.FULL_MASK
+        self.legal_bits = [None, None]
+
+        return
+
+    @property
+    def pieces_on_board(self):
+        """ 盤面配列(ビットボードから生成)
+
+        Returns:
+            (np.array): 未配置をEMPTY_PIECEとしたint8の盤面配列
+        """
+
+        return to_pieces_array(
+            self.bit_boards[BLACK_PIECE],
+            self.bit_boards[WHITE_PIECE],
+            self.board_squares,
+        )
+
+    def get_state(self):
+        """ 現在の局面
+
+        Returns:
+            (BoardState): 局面
+        """
+
+        black, white = self.bit_boards
+
+        return BoardState(black, white, self.player_turn)
+
+    def set_state(self, state: BoardState):
+        """ 局面の復元
+
+        Args:
+            state (BoardState): 局面
+        """
+
+        self.set_position(state.black, state.white, state.turn)
+
+        return
+
+    def player_procedure(self, mpos_index: list):
+        """ プレイヤーが指定したマス目インデックスに対する動作
+
+        Args:
+            mpos_index (list):マス目インデックス(x_index,y_index)
+
+        Returns:
+            (bool): 有効な手の場合True
+        """
+
+        # 空いているマス目か判定
+        if not self.judge_empty_square(mpos_index):
+            return False
+
+        turn = self.player_turn
+        index = bitboard.pos_to_index(mpos_index)
+        flipped = bitboard.flips(
+            self.bit_boards[turn], self.bit_boards[1-turn], index)
+
+        # 有効なマス目か判定
+        if not flipped:
+            return False
+
+        # 指定したマス目とひっくり返すマス目に代入
+        self.bit_boards[turn] |= flipped | (1 << index)
+        self.bit_boards[1-turn] &= ~flipped
+
+        # コマ数・未配置マス目・合法手の更新
+        flipped_count = bitboard.popcount(flipped)
+        self.piece_counts[turn] += flipped_count + 1
+        self.piece_counts[1-turn] -= flipped_count
+        self.empty_bits &= ~(1 << index)
+        # 合法手は次に参照されたときに算出
+        self.legal_bits = [None, None]
+
+        x_index, y_index = mpos_index
+        self.record_play_turn(pos=(int(x_index), int(y_index)), turn=turn)
+
+        # プレイヤーターンの切替
+        self.player_turn = 1 - turn
+
+        return True
+
+    def judge_trun(self, player_turn, pieces_on_board=None):
+        """ パス・ゲーム終了判定
+
+        Args:
+            player_turn (int): Playerターン（BLACK_PIECE/WHITE_PIECE）
+            pieces_on_board (np.array): 未使用(判定はビットボードで行う)
+
+        Returns:
+            (dict): 'player_turn'(次の手番)と、パス・終了時は'judge'
+        """
+
+        isOver = False
+
+        ret_dict = dict()
+
+        # コマ数取得(着手時に更新済み)
+        black, white = self.piece_counts
+
+        # 黒がすべてなくなったら白の勝ち
+        if not black:
+            return {'player_turn': player_turn, 'judge': WHITE_WIN}
+        # 白がすべてなくなったら黒の勝ち
+        if not white:
+            return {'player_turn': player_turn, 'judge': BLACK_WIN}
+
+        # 現在のPlayerターンと相手の合法手(局面ごとに1回だけ算出)
+        judge1 = self.get_legal_bits(player_turn)
+        judge2 = self.get_legal_bits(1-player_turn) if not judge1 else 0
+
+        # 配置できるマス目がない(PASS)、盤面が埋まった場合も含む
+        if not judge1 and not judge2:
+            isOver = True
+        elif not judge1:
+            player_turn = 1 - player_turn
+            ret_dict.setdefault('judge', PASS)
+
+        ret_dict.setdefault('player_turn', player_turn)
+
+        if isOver:
+            judge = None
+            # 勝ち負け判定
+            if black > white:
+                judge = BLACK_WIN
+            elif black < white:
+                judge = WHITE_WIN
+            else:
+                judge = DRAW
+            ret_dict.setdefault('judge', judge)
+
+        return ret_dict
+
+    def get_legal_bits(self, turn: int = None):
+        """ 合法手のビットボード
+
+        Args:
+            turn (int): Playerターン(未指定なら現在の手番)
+
+        Returns:
+            (int): 合法手のマス目に立つビットボード
+        """
+
+        if turn is None:
+            turn = self.player_turn
+
+        legal = self.legal_bits[turn]
+        if legal is None:
+            legal = bitboard.legal_moves(
+                self.bit_boards[turn], self.bit_boards[1-turn])
+            self.legal_bits[turn] = legal
+
+        return legal
+
+    def get_legal_moves(self, turn: int = None):
+        """ 合法手のリスト
+
+        Args:
+            turn (int): Playerターン(未指定なら現在の手番)
+
+        Returns:
+            (list): マス目インデックス(x_index,y_index)のリスト
+        """
+
+        return [bitboard.index_to_pos(index)
+                for index in bitboard.iter_bits(self.get_legal_bits(turn))]
+
+    def judge_empty_square(self, pos_index: list):
+        """ 未配置マス目の判定
+
+        Args:
+            pos_index (list): マス目インデックス(x_index,y_index)
+        Returns:
+            (bool): 指定されたマス目が未配置ならTrue
+        """
+
+        if not bitboard.in_board(pos_index):
+            return False
+
+        return bool(self.empty_bits >> bitboard.pos_to_index(pos_index) & 1)
+
+    def judge_put_square(self, pos_index: np.array, turn: int):
+        """ マス目配置の判定
+
+        Args:
+            pos_index (np.array): マス目インデックス(x_index,y_index)
+            turn (int): Playerターン（BLACK_PIECE/WHITE_PIECE）
+
+        Returns:
+            candidate_pos(list): dict型（position,directtion,count）のリスト
+        """
+
+        candidate_pos = list()
+
+        if not bitboard.in_board(pos_index):
+            return candidate_pos
+
+        # ビットボードで方向ごとのひっくり返し可能な駒を算出
+        lines = bitboard.flips_by_direction(
+            self.bit_boards[turn],
+            self.bit_boards[1-turn],
+            bitboard.pos_to_index(pos_index),
+        )
+        for direct, line in lines:
+            pos_list = [list(bitboard.index_to_pos(index)) for index in line]
+            candidate_pos.append(
+                {
+                    'position': pos_list,
+                    'directtion': np.array(direct),
+                    'count': len(pos_list),
+                }
+            )
+
+        return candidate_pos
+
+    def count_pieces(self, pieces_on_board=None):
+        """ 黒白コマ数カウント
+
+        Args:
+            pieces_on_board (np.array): 未使用(ビットボードから数える)
+
+        Returns:
+            (dict): BLACK_PIECE,WHITE_PIECEをKeyとして、個数をDict型で返信
+        """
+
+        return {
+            BLACK_PIECE: self.piece_counts[BLACK_PIECE],
+            WHITE_PIECE: self.piece_counts[WHITE_PIECE],
+        }
+
+    def record_play_turn(self, pos: tuple, turn: int):
+        """ 指しての記録
+
+        Args:
+            pos (tuple): マス目インデックス(x_index,y_index)
+            turn (int): プレイヤーターン
+        """
+
+        if isinstance(pos, tuple) and isinstance(turn, int):
+            if len(pos) == 2:
+                x_index, y_index = pos
+                hex_A = 0x41
+                xkey = chr(hex_A + x_index)
+                hex_1 = 0x31
+                ykey = chr(hex_1 + y_index)
+
+            if turn == BLACK_PIECE:
+                player_key = 'b'
+            elif turn == WHITE_PIECE:
+                player_key = 'w'
+
+            process = self.game_record['process']
+
+            process += '{}{}{}'.format(player_key, xkey, ykey)
+            self.game_record['process'] = process
+
+        return
+
+    def record_game_result(self, pieces_on_board=None, isWrite: bool = True):
+        """ ゲーム結果の記録
+
+        Args:
+            pieces_on_board (np.array): 未使用(ビットボードから数える)
+            isWrite (bool): Trueならresult_sink(未設定ならgame_result.txt)に追記
+        """
+
+        counters = self.count_pieces()
+
+        self.game_record['result']['black'] = counters[BLACK_PIECE]
+        self.game_record['result']['wihte'] = counters[WHITE_PIECE]
+
+        if isWrite and self.result_sink is not None:
+            self.result_sink.write(self.game_record)
+        elif isWrite and os.path.exists(DATA_PATH):
+            record_txt = json.dumps(self.game_record)
+            with open(RESULT_FILE_PATH, 'a') as f:
+                f.write(record_txt+'\n')
+
+        return
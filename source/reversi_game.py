@@ -1,11 +1,14 @@
 """
 FileName:
 --------------------------------------------------------------------------------
-    draw_game.py
+    reversi_game.py
 
 Description:
 --------------------------------------------------------------------------------
-    リバーシのゲーム描画
+    リバーシのゲーム実行
+    ルール・盤面状態はreversi_core、GUI描画はdraw_gameが担当する。
+    draw_game(pygame)はGUI実行時のみimportする。
+    GUIはイベント駆動で、自動配置の思考はワーカースレッドで実行する。
 
 History:
 --------------------------------------------------------------------------------
@@ -13,482 +16,374 @@ History:
 
 """
 
-import json
 import numpy as np
 import os
-import pygame
-import random
-import time
-import sys
+import threading
 
-source_path = os.getcwd() + '\\source'
-if os.path.exists(source_path):
-    sys.path.append(source_path)
-    import draw_game
-else:
-    print('error:The source code path is incorrect.')
-    sys.exit()
+import players
+import reversi_core
 
-BLACK_PIECE = draw_game.BLACK_PIECE
-WHITE_PIECE = draw_game.WHITE_PIECE
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+EMPTY_PIECE = reversi_core.EMPTY_PIECE
 
-BLACK_WIN = draw_game.BLACK_WIN
-WHITE_WIN = draw_game.WHITE_WIN
-DRAW = draw_game.DRAW
-PASS = draw_game.PASS
+BLACK_WIN = reversi_core.BLACK_WIN
+WHITE_WIN = reversi_core.WHITE_WIN
+DRAW = reversi_core.DRAW
+PASS = reversi_core.PASS
 
+ReversiException = reversi_core.ReversiException
 
-class ReversiException(Exception):
-    NOT_EMPTY = 'NOT EMPTY SQUARE'
+# GUIの描画フレームレート上限
+FRAME_RATE = 30
+# 自動配置の着手後、次の自動配置までの表示時間(ミリ秒)
+AUTO_MOVE_DELAY = 100
+# 終局表示の時間(ミリ秒)
+GAME_OVER_WAIT = 1000
 
 
-class ReversiGame(draw_game.BoardSurface):
+class ReversiGame(reversi_core.ReversiCore):
     def __init__(self):
         """ 初期化
         """
 
         super().__init__()
 
-        self.init_game_record()
+        # GUI描画(BoardSurface)はGUI実行時に生成
+        self.surface = None
+
+        # 自動配置プレイヤー(手番ごと)
+        self.auto_players = {
+            BLACK_PIECE: players.RandomPlayer(),
+            WHITE_PIECE: players.RandomPlayer(),
+        }
+
+        # 定石(自動配置プレイヤーより先に参照し、Noneなら通常の選択)
+        self.book_player = None
 
         return
 
-    def init_game_record(self):
-        """ 盤面配列初期化
+    def set_opening_book(self, book_player: players.Player):
+        """ 定石の設定
+
+        Args:
+            book_player (players.Player): 定石になければNoneを返す
+                プレイヤー(opening_book.BookPlayer)、Noneなら解除
         """
 
-        self.game_record = {
-            'result': {
-                'black': None, 'wihte': None,
-            },
-            'process': '',
-        }
+        self.book_player = book_player
+
+        return
+
+    def set_auto_player(self, turn: int, player: players.Player):
+        """ 自動配置プレイヤーの設定
+
+        Args:
+            turn (int): Playerターン（BLACK_PIECE/WHITE_PIECE）
+            player (players.Player): 自動配置プレイヤー
+        """
+
+        self.auto_players[turn] = player
+
+        return
+
+    def init_surface(self):
+        """ GUI描画の初期化
+
+        Returns:
+            (draw_game.BoardSurface): 盤面描画
+        """
+
+        import draw_game
+
+        if self.surface is None:
+            self.surface = draw_game.BoardSurface()
+
+        return self.surface
 
     def run(self,
             isMsample: bool = False,
             isAutoBlack: bool = False,
-            isAutoWhite: bool = False
+            isAutoWhite: bool = False,
+            isRecord: bool = True,
             ):
         """ ゲーム実行開始
+
+        Args:
+            isMsample (bool): Trueならヘッドレス自動対戦(機械学習サンプル用)
+            isAutoBlack (bool): 自動配置フラグ
+            isAutoWhite (bool): 自動配置フラグ
+            isRecord (bool): Trueならゲーム結果をgame_result.txtに追記
+
+        Returns:
+            (dict): 棋譜(result,process)
         """
 
         self.init_game_record()
 
         self.init_pieces()
 
+        for player in self.auto_players.values():
+            player.reset()
+
         if not isMsample:
-            # Pygeme(GUI)初期化
-            self.init_pygeme()
-            # 背景描画
-            self.draw_background()
-        else:
-            isAutoBlack = True
-            isAutoWhite = True
+            self.run_gui(isAutoBlack, isAutoWhite, isRecord)
+            return self.game_record
 
         while(True):
-            if not isMsample:
-                # 盤面枠描画
-                self.draw_board_frame()
-                # 駒描画
-                self.draw_pieces(self.pieces_on_board)
-                # プレイヤーターン描画
-                self.draw_player(self.player_turn)
-                # 黒白コマ数描画
-                self.draw_counter(self.pieces_on_board)
-                # GUI描画更新
-                pygame.display.update()
-
             # ゲームの判定
-            judge = self.judge_trun(self.player_turn, self.pieces_on_board)
+            judge = self.judge_trun(self.player_turn)
             if 'player_turn' in judge:
                 self.player_turn = judge['player_turn']
             if 'judge' in judge:
                 game_judge = judge['judge']
                 if game_judge != PASS:
-                    self.record_game_result(self.pieces_on_board)
-                    if not isMsample:
-                        self.draw_game_over(judge)
-                        pygame.display.update()
-                        time.sleep(1)
-                        pygame.quit()
-                        break
-                    else:
-                        break
+                    self.record_game_result(isWrite=isRecord)
+                    break
 
             # 自動配置処理
-            if self.player_turn == WHITE_PIECE and isAutoBlack:
-                self.auto_player(isMsample)
-                if not isMsample:
-                    time.sleep(0.1)
-            elif self.player_turn == BLACK_PIECE and isAutoWhite:
-                self.auto_player(isMsample)
-                if not isMsample:
-                    time.sleep(0.1)
-
-            # GUIイベント処理
-            if not isMsample:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        break
-                    if event.type == pygame.MOUSEBUTTONDOWN:
-                        if event.button == pygame.BUTTON_LEFT:
-                            x, y = event.pos
-                            self.mouse_left_clicked(event.pos)
+            self.auto_player(isMsample)
 
         return self.game_record
 
-    def init_pieces(self):
-        """ 盤面配列の初期化
-        """
-
-        # 盤面配列
-        self.pieces_on_board = np.full(self.board_squares, np.nan)
-
-        # 初期コマ配置
-        self.pieces_on_board[3, 3] = BLACK_PIECE
-        self.pieces_on_board[4, 4] = BLACK_PIECE
-        self.pieces_on_board[3, 4] = WHITE_PIECE
-        self.pieces_on_board[4, 3] = WHITE_PIECE
-
-        # 手番変数（黒が先手）
-        self.player_turn = BLACK_PIECE
-
-        return
-
-    def mouse_left_clicked(self, pos: list):
-        """ マウス左クリックイベント
+    def is_auto_turn(self, isAutoBlack: bool, isAutoWhite: bool):
+        """ 現在の手番が自動配置か判定
 
         Args:
-            pos (list): マウスクリック座標(x,y)
-        """
+            isAutoBlack (bool): 自動配置フラグ(白番で自動配置)
+            isAutoWhite (bool): 自動配置フラグ(黒番で自動配置)
 
-        # offset補正
-        board_pos = np.array(pos)-np.array(self.screnn_offset)
-        # インデックス値に変換
-        ans = board_pos/np.array(self.square_size)
-        ans = ans.astype('uint8')
-        mpos_index = ans.tolist()
+        Returns:
+            (bool): 自動配置ならTrue
+        """
 
-        # 有効なクリック化を判定し、駒情報の更新、プレイヤーターン切替など。
-        self.player_procedure(mpos_index)
+        if self.player_turn == WHITE_PIECE:
+            return isAutoBlack
 
-    def player_procedure(self, mpos_index: list):
-        """ プレイヤーが指定したマス目インデックスに対する動作
+        return isAutoWhite
 
-        Args:
-            mpos_index (list):マス目インデックス(x_index,y_index)
+    def run_gui(self,
+                isAutoBlack: bool = False,
+                isAutoWhite: bool = False,
+                isRecord: bool = True,
+                ):
+        """ GUIのイベント駆動ループ
 
-        Raises:
-            ReversiException: インデックス値が違反している場合に例外送出
+        pygameのイベントを待機し、描画はFRAME_RATEを上限とする。
+        盤面の判定は着手があった場合のみ行い、自動配置の思考は
+        ワーカースレッドで実行して結果をイベントで受け取る。
 
-        Returns:
-            (bool): 有効な手の場合True
+        Args:
+            isAutoBlack (bool): 自動配置フラグ
+            isAutoWhite (bool): 自動配置フラグ
+            isRecord (bool): Trueならゲーム結果をgame_result.txtに追記
         """
-        try:
-            # 空いているマス目か判定
-            if self.judge_empty_square(mpos_index):
-                # 有効なマス目か判定
-                candidate_pos = self.judge_put_square(
-                    pos_index=mpos_index,
-                    turn=self.player_turn,
-                )
-
-                if candidate_pos:
-                    for cand in candidate_pos:
-                        for x_index, y_index in cand['position']:
-                            # ひっくり返すマス目に代入
-                            self.pieces_on_board[
-                                x_index, y_index] = self.player_turn
-
-                    # 指定したマス目に代入
-                    x_index, y_index = mpos_index
-                    self.pieces_on_board[x_index, y_index] = self.player_turn
-
-                    self.record_play_turn(
-                        pos=(x_index, y_index), turn=self.player_turn
-                    )
-
-                    # プレイヤーターンの切替
-                    self.player_turn = 1 - self.player_turn
-                    return True
 
-        except ReversiException:
-            raise ReversiException(ReversiException.NOT_EMPTY)
+        import pygame
 
-        return False
+        surface = self.init_surface()
+        # Pygeme(GUI)初期化
+        surface.init_pygeme()
+        # 背景描画
+        surface.draw_background()
 
-    def judge_trun(self, player_turn, pieces_on_board):
-        """ パス・ゲーム終了判定
+        move_event = pygame.event.custom_type()
+        # マウス移動では起床しない
+        pygame.event.set_blocked(pygame.MOUSEMOTION)
+        clock = pygame.time.Clock()
 
-        Returns:
-            [type]: [description]
-        """
+        isJudge = True
+        isRedraw = True
+        thinker = None
+        # 次の自動配置を開始できる時刻、終局表示の終了時刻(ミリ秒)
+        next_auto_time = 0
+        game_over_time = None
 
-        X, Y = 0, 1
-        isOver = False
-
-        ret_dict = dict()
-
-        # コマ数取得
-        counters = self.count_pieces(pieces_on_board)
-        black = counters[BLACK_PIECE]
-        white = counters[WHITE_PIECE]
-
-        # 黒がすべてなくなったら白の勝ち
-        if not black:
-            return WHITE_WIN
-        # 白がすべてなくなったら黒の勝ち
-        if not white:
-            return BLACK_WIN
-
-        # 駒未配置箇所の取得
-        empty = np.where(np.isnan(pieces_on_board))
-        # 駒未配置箇所のカウント
-        empty_count = np.count_nonzero(np.isnan(pieces_on_board))
-
-        # 駒未配置箇所がなくなったら終了
-        if empty_count:
-            # 未配置箇所が現在のPlayerターンで有効なマス目があるかを判定
-            empty_pos_list = [(x, y) for x, y in zip(empty[X], empty[Y])]
-            judge1, judge2 = list(), list()
-            for empty_pos in empty_pos_list:
-                pos = self.judge_put_square(
-                    pos_index=empty_pos,
-                    turn=player_turn,
-                )
-                if pos:
-                    judge1.append(pos)
-            for empty_pos in empty_pos_list:
-                pos = self.judge_put_square(
-                    pos_index=empty_pos,
-                    turn=1-player_turn,
-                )
-                if pos:
-                    judge2.append(pos)
-            # 配置できるマス目がない(PASS)
-            if not judge1 and not judge2:
-                isOver = True
-            elif not judge1:
-                player_turn = 1 - player_turn
-                ret_dict.setdefault('judge', PASS)
-
-        elif not empty_count:
-            isOver = True
-
-        ret_dict.setdefault('player_turn', player_turn)
-
-        if isOver:
-            judge = None
-            # 勝ち負け判定
-            if black > white:
-                judge = BLACK_WIN
-            elif black < white:
-                judge = WHITE_WIN
+        while(True):
+            # 着手後のみゲームの判定
+            if isJudge:
+                isJudge = False
+                judge = self.judge_trun(self.player_turn)
+                if 'player_turn' in judge:
+                    self.player_turn = judge['player_turn']
+                if 'judge' in judge and judge['judge'] != PASS:
+                    self.record_game_result(isWrite=isRecord)
+                    game_over_time = pygame.time.get_ticks() + GAME_OVER_WAIT
+
+            if isRedraw:
+                isRedraw = False
+                pieces_on_board = self.pieces_on_board
+                # 盤面枠描画
+                surface.draw_board_frame()
+                # 駒描画
+                surface.draw_pieces(pieces_on_board)
+                # プレイヤーターン描画
+                surface.draw_player(self.player_turn)
+                # 黒白コマ数描画
+                surface.draw_counter(pieces_on_board)
+                if game_over_time is not None:
+                    surface.draw_game_over(judge)
+                # GUI描画更新
+                surface.update_display()
+
+            now = pygame.time.get_ticks()
+            if game_over_time is not None:
+                if now >= game_over_time:
+                    break
+                timeout = game_over_time - now
+            elif thinker is None and self.is_auto_turn(isAutoBlack, isAutoWhite):
+                if now >= next_auto_time:
+                    # 自動配置の思考を開始
+                    thinker = threading.Thread(
+                        target=self._think_,
+                        args=(self.get_state(), move_event),
+                        daemon=True,
+                    )
+                    thinker.start()
+                    timeout = 0
+                else:
+                    timeout = next_auto_time - now
             else:
-                judge = DRAW
-            ret_dict.setdefault('judge', judge)
+                timeout = 0
+
+            # GUIイベント処理(timeout=0ならイベントが来るまで待機)
+            events = [pygame.event.wait(timeout)] + pygame.event.get()
+            for event in events:
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    return
+                if event.type == pygame.VIDEOEXPOSE:
+                    surface.isFullUpdate = True
+                    isRedraw = True
+                if event.type == move_event:
+                    thinker = None
+                    # 思考に失敗した場合(pos=None)も間隔を空けて再試行
+                    next_auto_time = pygame.time.get_ticks() + AUTO_MOVE_DELAY
+                    # 思考中に局面が変わっていなければ着手
+                    if event.state == self.get_state() and \
+                            event.pos is not None and \
+                            self.player_procedure(event.pos):
+                        isJudge = isRedraw = True
+                if event.type == pygame.MOUSEBUTTONDOWN:
+                    if event.button == pygame.BUTTON_LEFT and \
+                            thinker is None and game_over_time is None and \
+                            not self.is_auto_turn(isAutoBlack, isAutoWhite):
+                        if self.mouse_left_clicked(event.pos):
+                            isJudge = isRedraw = True
+                            next_auto_time = pygame.time.get_ticks() + \
+                                AUTO_MOVE_DELAY
+
+            # 描画フレームレートの上限
+            clock.tick(FRAME_RATE)
+
+        pygame.quit()
 
-        return ret_dict
+        return
 
-    def judge_empty_square(self, pos_index: list):
-        """ 未配置マス目の判定
+    def _think_(self, state: reversi_core.BoardState, move_event: int):
+        """ 自動配置の思考(ワーカースレッド)
 
         Args:
-            pos_index (list): マス目インデックス(x_index,y_index)
-        Raises:
-            ReversiException: 未配置マス目がない場合、例外送出
-        Returns:
-            (bool): 指定されたマス目が未配置ならTrue
+            state (reversi_core.BoardState): 思考開始時の局面
+            move_event (int): 結果を通知するpygameのイベント種別
         """
 
-        X, Y = 0, 1
+        import pygame
 
-        empty = np.where(np.isnan(self.pieces_on_board))
-        if empty:
-            empty_pos_list = [(x, y) for x, y in zip(empty[X], empty[Y])]
-            if tuple(pos_index) in empty_pos_list:
-                return True
-            else:
-                return False
+        # 描画中の盤面に触れないよう局面の複製で思考
+        game = reversi_core.ReversiCore()
+        game.set_state(state)
+        pos = None
+        try:
+            pos = self.select_auto_move(game)
+        finally:
+            # 例外でも通知してGUIの思考待ちを解除(例外はスレッドの外へ送出)
+            try:
+                pygame.event.post(pygame.event.Event(
+                    move_event, pos=pos, state=state))
+            except pygame.error:
+                # 思考中にウィンドウが閉じられた
+                pass
 
-        raise ReversiException(ReversiException.NOT_EMPTY)
+        return
 
-    def judge_put_square(self, pos_index: np.array, turn: int):
-        """ マス目配置の判定
+    def mouse_left_clicked(self, pos: list):
+        """ マウス左クリックイベント
 
         Args:
-            pos_index (np.array): マス目インデックス(x_index,y_index)
-            turn (int): Playerターン（BLACK_PIECE/WHITE_PIECE）
+            pos (list): マウスクリック座標(x,y)
 
         Returns:
-            candidate_pos(list): dict型（position,directtion,count）のリスト
+            (bool): 有効な手の場合True
         """
 
-        candidate_pos = list()
-
-        X, Y = 0, 1
-
-        # Playerの相手側の駒配置を取得
-        target = np.where(self.pieces_on_board == 1-turn)
-        if target:
-            target_pos_list = [(x, y) for x, y in zip(target[X], target[Y])]
-
-            # 隣接八方向を示す配列
-            direction = np.array(
-                [
-                    [-1, -1], [0, -1], [1, -1],
-                    [-1, 0],        [1, 0],
-                    [-1, 1], [0, 1], [1, 1],
-                ]
-            )
-
-            def _judge_direction_(pos, direct):
-                if pos is None:
-                    return False
-                ans = pos + direct
-                x_index, y_index = ans.tolist()
-                try:
-                    if x_index < 0 or y_index < 0:
-                        return False
-
-                    piece = self.pieces_on_board[x_index, y_index]
-                    if piece == turn:
-                        return True
-                    elif piece == 1-turn:
-                        return ans
-                    else:
-                        return False
-                except IndexError:
-                    return False
-
-            # 指定マス目の隣接八方向のマス目インデックスを算出
-            re_pos = np.array(pos_index)+direction
-            if re_pos.any():
-                for pos, direct in zip(re_pos, direction):
-                    if tuple(pos.tolist()) in target_pos_list:
-                        # ひっくり返し可能なコマ数をカウント
-                        count = 1
-                        pos_list = [pos.tolist(), ]
-                        isJudge = True
-                        # 隣接方向にさらにひっくり返す駒があるかを確認
-                        while(isJudge):
-                            ans = _judge_direction_(pos, direct)
-                            # bool値ならひっくり返す駒がない
-                            if isinstance(ans, bool):
-                                isJudge = False
-                                # Trueの場合、挟み込み可能。
-                                if ans:
-                                    pos = pos.tolist()
-                                    candidate_pos.append(
-                                        {
-                                            'position': pos_list,
-                                            'directtion': direct,
-                                            'count': count,
-                                        }
-                                    )
-                            else:
-                                # 先の隣接駒情報へ更新
-                                pos = ans
-                                pos_list.append(pos.tolist())
-                                count += 1
-
-        return candidate_pos
+        # offset補正
+        board_pos = np.array(pos)-np.array(self.surface.screnn_offset)
+        # インデックス値に変換
+        ans = board_pos/np.array(self.surface.square_size)
+        ans = ans.astype('uint8')
+        mpos_index = ans.tolist()
+
+        # 有効なクリック化を判定し、駒情報の更新、プレイヤーターン切替など。
+        return self.player_procedure(mpos_index)
 
     def auto_player(self, isMsample: bool):
         """ 自動配置処理
-        """
-
-        X, Y = 0, 1
-
-        # 未配置箇所の取得
-        empty = np.where(np.isnan(self.pieces_on_board))
-        empty_pos_list = [(x, y) for x, y in zip(empty[X], empty[Y])]
-
-        limit_counter = 300
-        while(empty_pos_list):
-            # empty_pos_listインデックス値をランダム抽出
-            index = random.randint(0, len(empty_pos_list)-1)
-            pos = empty_pos_list[index]
-            # 配置可能になったら抜け出し
-            if self.player_procedure(pos):
-                break
-            if not isMsample:
-                time.sleep(0.05)
-            limit_counter -= 1
-            if not limit_counter:
-                raise 'AutoPlayer infinite loop !!'
-
-        return
-
-    def record_play_turn(self, pos: tuple, turn: int):
-        """ 指しての記録
 
         Args:
-            pos (tuple): マス目インデックス(x_index,y_index)
-            turn (int): プレイヤーターン
-        """
+            isMsample (bool): ヘッドレス実行フラグ(未使用)
 
-        if isinstance(pos, tuple) and isinstance(turn, int):
-            if len(pos) == 2:
-                x_index, y_index = pos
-                hex_A = 0x41
-                xkey = chr(hex_A + x_index)
-                hex_1 = 0x31
-                ykey = chr(hex_1 + y_index)
+        Returns:
+            (bool): 着手した場合True
+        """
 
-            if turn == BLACK_PIECE:
-                player_key = 'b'
-            elif turn == WHITE_PIECE:
-                player_key = 'w'
+        pos = self.select_auto_move(self)
+        if pos is None:
+            return False
 
-            process = self.game_record['process']
+        return self.player_procedure(pos)
 
-            process += '{}{}{}'.format(player_key, xkey, ykey)
-            self.game_record['process'] = process
+    def select_auto_move(self, game: reversi_core.ReversiCore):
+        """ 自動配置の着手選択
 
-        return
+        Args:
+            game (reversi_core.ReversiCore): 局面(手番はgame.player_turn)
 
-    def record_game_result(self, pieces_on_board):
-        """ ゲーム結果の記録
+        Returns:
+            (tuple): マス目インデックス(x_index,y_index)、合法手がなければNone
         """
 
-        counters = self.count_pieces(pieces_on_board)
-        black = counters[BLACK_PIECE]
-        white = counters[WHITE_PIECE]
-
-        self.game_record['result']['black'] = black
-        self.game_record['result']['wihte'] = white
-
-        record_txt = json.dumps(self.game_record)
+        pos = None
+        if self.book_player is not None:
+            pos = self.book_player.select_move(game)
 
-        current = os.getcwd()
-        file_path = current + "/data"
+        if pos is None:
+            player = self.auto_players[game.player_turn]
+            # 合法手から選択するため、やり直しは発生しない
+            pos = player.select_move(game)
 
-        if os.path.exists(file_path):
-            with open(file_path+'/game_result.txt', 'a') as f:
-                f.write(record_txt+'\n')
-
-        return
+        return pos
 
 
 if __name__ == '__main__':
     isPlaygame = True
 
     if isPlaygame:
-        result = ReversiGame().run(False, True, False)
+        import opening_book
+        import search
+
+        game = ReversiGame()
+        # コンピュータ側(白)は探索AI
+        game.set_auto_player(WHITE_PIECE, search.SearchPlayer(time_limit=1.0))
+        # 定石ファイルがあれば序盤は定石を優先
+        if os.path.exists(opening_book.BOOK_FILE_PATH):
+            game.set_opening_book(
+                opening_book.BookPlayer(opening_book.OpeningBook.load()))
+        result = game.run(False, True, False)
     else:
+        import self_play
+
         # 試行回数
         practice_time = 5000
-        counter = practice_time
-        # 機械学習フラグ
-        isMsample = True
-        # AutoPlayer
-        isAutoBlack = True
-        isAutoWhite = True
-
-        while(counter):
-            result = ReversiGame().run(isMsample, isAutoBlack, isAutoWhite)
-            print('Game{:4d}'.format(practice_time+1-counter))
-            print(result)
-            counter -= 1
+        # 自己対戦をプロセスプールで実行
+        self_play.run_self_play(practice_time)
@@ -0,0 +1,345 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    search.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの探索AI
+    ネガマックス(αβ枝刈り)を反復深化で実行する。
+    置換表(transposition.py)で探索済みの局面を再利用する。
+    手の並び替えは置換表の最善手、キラー手、ヒストリーの順に行う。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import time
+
+import bitboard
+import endgame
+import players
+import transposition
+
+INFINITY = 1 << 30
+# 終局時の石差に掛ける倍率(評価値より常に優先させる)
+DISC_SCALE = 1 << 16
+# 着手可能数の重み
+MOBILITY_WEIGHT = 8
+
+# 置換表のフラグ
+EXACT = transposition.EXACT
+LOWER = transposition.LOWER
+UPPER = transposition.UPPER
+
+# 時間切れ確認の間隔(ノード数、2の累乗-1)
+CHECK_INTERVAL = 1023
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def _weight_tables_(weights):
+    """ マス目の重みのバイト単位の表
+
+    Args:
+        weights (tuple): weights[x_index][y_index]の重み
+
+    Returns:
+        (list): table[バイト位置(x_index)][バイト値]の重み合計
+    """
+
+    tables = list()
+    for x_index in range(bitboard.BOARD_SIZE):
+        table = list()
+        for value in range(256):
+            total = 0
+            for y_index in range(bitboard.BOARD_SIZE):
+                if value >> y_index & 1:
+                    total += weights[x_index][y_index]
+            table.append(total)
+        tables.append(table)
+
+    return tables
+
+
+WEIGHT_TABLES = _weight_tables_(players.SQUARE_WEIGHTS)
+
+
+def evaluate(player: int, opponent: int):
+    """ 静的評価(マス目の重みと着手可能数)
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (int): 手番側から見た評価値
+    """
+
+    score = 0
+    for k in range(8):
+        shift = k * 8
+        table = WEIGHT_TABLES[k]
+        score += table[player >> shift & 0xFF] - table[opponent >> shift & 0xFF]
+
+    mobility = bitboard.popcount(bitboard.legal_moves(player, opponent)) - \
+        bitboard.popcount(bitboard.legal_moves(opponent, player))
+
+    return score + mobility * MOBILITY_WEIGHT
+
+
+def final_score(player: int, opponent: int):
+    """ 終局時の評価値
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (int): 石差にDISC_SCALEを掛けた値
+    """
+
+    return (bitboard.popcount(player) - bitboard.popcount(opponent)) * \
+        DISC_SCALE
+
+
+class SearchPlayer(players.Player):
+    def __init__(self,
+                 time_limit: float = 1.0,
+                 max_depth: int = 60,
+                 table_bits: int = 20,
+                 evaluate=evaluate,
+                 endgame_empties: int = 14,
+                 rng=None,
+                 ):
+        """ 初期化
+
+        Args:
+            time_limit (float): 1手あたりの思考時間(秒)
+            max_depth (int): 最大探索深さ
+            table_bits (int): 置換表のエントリ数(2のtable_bits乗)
+            evaluate (function): 静的評価関数 evaluate(player, opponent)
+            endgame_empties (int): 空きマスがこの数以下なら終盤完全読み
+            rng (random.Random): 乱数生成器(未指定ならrandomモジュール)
+        """
+
+        super().__init__(rng)
+
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.evaluate = evaluate
+        self.table = transposition.TranspositionTable(table_bits)
+        self.endgame_empties = endgame_empties
+        self.endgame = endgame.EndgameSolver()
+
+        self.reset()
+
+        return
+
+    def reset(self):
+        """ 新しいゲーム開始時の初期化
+        """
+
+        self.table.clear()
+        # パスを含めた最大手数分
+        self.killers = [[-1, -1] for _ in range(bitboard.SQUARE_COUNT * 2)]
+        self.history = [0] * bitboard.SQUARE_COUNT
+        self.nodes = 0
+        self.depth = 0
+
+        return
+
+    def select_move(self, game):
+        """ 反復深化で最善手を選択
+        """
+
+        turn = game.player_turn
+        index = self.search(game.bit_boards[turn], game.bit_boards[1-turn])
+        if index is None:
+            return None
+
+        return bitboard.index_to_pos(index)
+
+    def search(self, player: int, opponent: int):
+        """ 反復深化探索
+
+        Args:
+            player (int): 手番側のビットボード
+            opponent (int): 相手側のビットボード
+
+        Returns:
+            (int): 最善手のビット番号、合法手がなければNone
+        """
+
+        moves = list(bitboard.iter_bits(bitboard.legal_moves(player, opponent)))
+        if not moves:
+            return None
+        if len(moves) == 1:
+            return moves[0]
+
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit
+        self.nodes = 0
+        self.table.new_search()
+        # ヒストリーは探索ごとに減衰
+        self.history = [value >> 1 for value in self.history]
+
+        empties = bitboard.SQUARE_COUNT - bitboard.popcount(player | opponent)
+        best_move = moves[self.rng.randrange(len(moves))]
+
+        # 終盤は完全読み(思考時間の半分で読み切れなければ反復深化へ)
+        if empties <= self.endgame_empties:
+            try:
+                index, _ = self.endgame.best_move(
+                    player, opponent, deadline=start + self.time_limit / 2)
+                return index
+            except endgame.SolverTimeout:
+                pass
+
+        # 反復深化の打ち切りは残り時間を基準にする(完全読みで使った分を除く)
+        start = time.perf_counter()
+        budget = self.deadline - start
+
+        for depth in range(1, min(self.max_depth, empties) + 1):
+            try:
+                best_move, _ = self._search_root_(
+                    player, opponent, moves, best_move, depth)
+            except SearchTimeout:
+                break
+            self.depth = depth
+            # 次の深さを終える見込みがなければ打ち切り
+            if time.perf_counter() - start > budget / 2:
+                break
+
+        return best_move
+
+    def _search_root_(self, player, opponent, moves, best_move, depth):
+        """ ルート局面の探索
+
+        Returns:
+            (tuple): (最善手のビット番号, 評価値)
+        """
+
+        ordered = [best_move] + [m for m in moves if m != best_move]
+        alpha, beta = -INFINITY, INFINITY
+        best_value = -INFINITY
+
+        for index in ordered:
+            flipped = bitboard.flips(player, opponent, index)
+            value = -self._negamax_(
+                opponent & ~flipped,
+                player | flipped | (1 << index),
+                depth - 1, -beta, -alpha, 1,
+            )
+            if value > best_value:
+                best_value = value
+                best_move = index
+            if value > alpha:
+                alpha = value
+
+        key = transposition.zobrist_hash(player, opponent)
+        self.table.store(key, depth, best_value, EXACT, best_move)
+
+        return best_move, best_value
+
+    def _order_moves_(self, moves: int, tt_move: int, ply: int):
+        """ 手の並び替え(置換表の最善手、キラー手、ヒストリー順)
+
+        Returns:
+            (list): ビット番号のリスト
+        """
+
+        killers = self.killers[ply]
+        history = self.history
+        scored = list()
+        for index in bitboard.iter_bits(moves):
+            if index == tt_move:
+                score = 1 << 40
+            elif index == killers[0]:
+                score = 1 << 39
+            elif index == killers[1]:
+                score = 1 << 38
+            else:
+                score = history[index]
+            scored.append((score, index))
+        scored.sort(reverse=True)
+
+        return [index for _, index in scored]
+
+    def _negamax_(self, player, opponent, depth, alpha, beta, ply):
+        """ ネガマックス(αβ枝刈り)
+
+        Returns:
+            (int): 手番側から見た評価値
+        """
+
+        self.nodes += 1
+        if not self.nodes & CHECK_INTERVAL and \
+                time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        if depth <= 0:
+            return self.evaluate(player, opponent)
+
+        moves = bitboard.legal_moves(player, opponent)
+        if not moves:
+            if not bitboard.legal_moves(opponent, player):
+                return final_score(player, opponent)
+            # パス
+            return -self._negamax_(
+                opponent, player, depth, -beta, -alpha, ply + 1)
+
+        key = transposition.zobrist_hash(player, opponent)
+        tt_move = -1
+        entry = self.table.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth:
+                value, flag = entry[2], entry[3]
+                if flag == EXACT:
+                    return value
+                if flag == LOWER and value > alpha:
+                    alpha = value
+                elif flag == UPPER and value < beta:
+                    beta = value
+                if alpha >= beta:
+                    return value
+
+        alpha_orig = alpha
+        best_value = -INFINITY
+        best_move = -1
+
+        for index in self._order_moves_(moves, tt_move, ply):
+            flipped = bitboard.flips(player, opponent, index)
+            value = -self._negamax_(
+                opponent & ~flipped,
+                player | flipped | (1 << index),
+                depth - 1, -beta, -alpha, ply + 1,
+            )
+            if value > best_value:
+                best_value = value
+                best_move = index
+            if value > alpha:
+                alpha = value
+            if alpha >= beta:
+                # キラー手・ヒストリーの更新
+                killers = self.killers[ply]
+                if killers[0] != index:
+                    killers[1] = killers[0]
+                    killers[0] = index
+                self.history[index] += depth * depth
+                break
+
+        if best_value <= alpha_orig:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.store(key, depth, best_value, flag, best_move)
+
+        return best_value
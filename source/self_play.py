@@ -0,0 +1,221 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    self_play.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの自己対戦(プロセスプール実行)
+    ゲームをチャンク単位でワーカープロセスに分配し、結果をチャンクごとに
+    回収してBufferedResultWriterでgame_result.txtへまとめて追記する。
+    isShardedの場合は各ワーカーがシャードファイルへ直接書き出し、
+    終了時に本体ファイルへ統合する(棋譜の順序はチャンク順にならない)。
+    チャンクごとに seed + チャンク番号 で乱数を初期化するため、
+    ワーカー数によらず同じ棋譜列が再現される。
+    計測(instrument)が有効なら、ワーカーの集計をチャンクごとに合算する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import time
+
+import instrument
+import result_sink
+import reversi_core
+import reversi_game
+
+
+def play_games(task: tuple):
+    """ 自己対戦のチャンク実行(ワーカープロセス側)
+
+    Args:
+        task (tuple): (チャンク番号, 乱数シード, ゲーム数, 書き出し先ファイル)
+            書き出し先ファイルを指定するとプロセスごとのシャードへ書き出す
+
+    Returns:
+        (tuple): (チャンク番号, ゲーム数, 棋譜のリスト(シャード書き出し時は空),
+            計測の集計(instrument.collect、計測が無効ならNone))
+    """
+
+    chunk_index, seed, game_count, file_path = task
+
+    random.seed(seed)
+
+    game = reversi_game.ReversiGame()
+    records = list()
+
+    if file_path is None:
+        for _ in range(game_count):
+            records.append(game.run(isMsample=True, isRecord=False))
+        return chunk_index, game_count, records, instrument.collect()
+
+    with result_sink.ShardedResultWriter(
+            file_path, flush_count=game_count, flush_interval=None) as sink:
+        game.set_result_sink(sink)
+        for _ in range(game_count):
+            game.run(isMsample=True, isRecord=True)
+
+    return chunk_index, game_count, records, instrument.collect()
+
+
+def write_game_records(records: list, file_path: str = None):
+    """ 棋譜をまとめて追記
+
+    Args:
+        records (list): 棋譜(result,process)のリスト
+        file_path (str): 追記先ファイル(未指定ならgame_result.txt)
+    """
+
+    if file_path is None:
+        if not os.path.exists(reversi_core.DATA_PATH):
+            return
+        file_path = reversi_core.RESULT_FILE_PATH
+
+    with result_sink.BufferedResultWriter(
+            file_path, flush_count=len(records)) as sink:
+        sink.write_many(records)
+
+    return
+
+
+def run_self_play(practice_time: int,
+                  workers: int = None,
+                  chunk_size: int = 100,
+                  seed: int = 0,
+                  isRecord: bool = True,
+                  file_path: str = None,
+                  isVerbose: bool = True,
+                  isSharded: bool = False,
+                  ):
+    """ 自己対戦の実行
+
+    Args:
+        practice_time (int): 試行回数(ゲーム数)
+        workers (int): ワーカープロセス数(未指定ならCPU数)
+        chunk_size (int): 1タスクあたりのゲーム数
+        seed (int): 乱数シードの基準値
+        isRecord (bool): Trueなら棋譜をファイルへ追記
+        file_path (str): 追記先ファイル(未指定ならgame_result.txt)
+        isVerbose (bool): Trueなら進捗とスループットを表示
+        isSharded (bool): Trueならワーカーごとのシャードへ書き出して最後に統合
+
+    Returns:
+        (dict): スループット(games,seconds,games_per_sec,workers)
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunk_size = max(1, chunk_size)
+
+    if file_path is None and isRecord:
+        if os.path.exists(reversi_core.DATA_PATH):
+            file_path = reversi_core.RESULT_FILE_PATH
+        else:
+            isRecord = False
+
+    shard_file = file_path if isRecord and isSharded else None
+
+    tasks = list()
+    for chunk_index, start in enumerate(range(0, practice_time, chunk_size)):
+        game_count = min(chunk_size, practice_time - start)
+        tasks.append((chunk_index, seed + chunk_index, game_count, shard_file))
+
+    game_total = 0
+    start_time = time.perf_counter()
+
+    sink = None
+    if isRecord and not isSharded:
+        sink = result_sink.BufferedResultWriter(
+            file_path, flush_count=chunk_size)
+
+    def _collect_(results):
+        nonlocal game_total
+        # imapはチャンク番号順に結果を返す
+        for _, game_count, records, stats in results:
+            game_total += game_count
+            instrument.merge(stats)
+            instrument.count('self_play.games', game_count)
+            if sink is not None:
+                with instrument.phase('self_play.write'):
+                    sink.write_many(records)
+            if isVerbose:
+                print('Game{:8d}/{:d}'.format(game_total, practice_time))
+
+    try:
+        if workers > 1:
+            with multiprocessing.Pool(processes=workers) as pool:
+                _collect_(pool.imap(play_games, tasks))
+        else:
+            _collect_(map(play_games, tasks))
+    finally:
+        if sink is not None:
+            sink.close()
+
+    if shard_file is not None:
+        with instrument.phase('self_play.merge_shards'):
+            result_sink.merge_shards(shard_file)
+
+    seconds = time.perf_counter() - start_time
+
+    report = {
+        'games': game_total,
+        'seconds': seconds,
+        'games_per_sec': game_total / seconds if seconds else 0.0,
+        'workers': workers,
+    }
+    if instrument.isEnabled:
+        report['instrument'] = instrument.summary()
+
+    if isVerbose:
+        print('{games} games / {seconds:.2f} sec '
+              '({games_per_sec:.1f} games/sec, {workers} workers)'
+              .format(**report))
+
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reversi self-play')
+    parser.add_argument('-n', '--games', type=int, default=5000)
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('-c', '--chunk-size', type=int, default=100)
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default=None)
+    parser.add_argument('--no-record', action='store_true')
+    parser.add_argument('--sharded', action='store_true')
+    parser.add_argument('--instrument', action='store_true')
+    parser.add_argument('--instrument-output', default=None)
+    parser.add_argument('--profile', nargs='?', const='', default=None)
+    args = parser.parse_args()
+
+    if args.instrument or args.instrument_output:
+        instrument.enable()
+
+    kwargs = {
+        'workers': args.workers,
+        'chunk_size': args.chunk_size,
+        'seed': args.seed,
+        'isRecord': not args.no_record,
+        'file_path': args.output,
+        'isSharded': args.sharded,
+    }
+    if args.profile is not None:
+        # cProfileは本体プロセスのみ計測するためワーカーを使わない
+        kwargs['workers'] = 1
+        instrument.profile(run_self_play, (args.games,), kwargs,
+                           output=args.profile or None)
+    else:
+        run_self_play(args.games, **kwargs)
+
+    if instrument.isEnabled:
+        instrument.report(
+            args.instrument_output or os.environ.get(instrument.ENV_OUTPUT))
+        # 環境変数による終了時の表示と重複させない
+        instrument.reset()
@@ -0,0 +1,380 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    symmetry.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの盤面の対称変換(回転・反転の8通り)
+    変換番号kは次の順に適用する合成変換とする。
+        k & 1 : y方向の反転(y_index -> 7 - y_index)
+        k & 2 : x方向の反転(x_index -> 7 - x_index)
+        k & 4 : 転置(x_index <-> y_index)
+    ビットボード、盤面配列、指手文字列('bF4')、棋譜文字列に適用でき、
+    8通りのうち最小の(手番側, 相手側)を正規形として局面の同一視に使う。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import numpy as np
+
+import bitboard
+import game_records
+import transposition
+
+SYMMETRY_COUNT = 8
+IDENTITY = 0
+
+# 1バイト(x_index固定のy方向8マス)内のビット反転用
+_FLIP_MASKS = (
+    (1, 0x5555555555555555),
+    (2, 0x3333333333333333),
+    (4, 0x0F0F0F0F0F0F0F0F),
+)
+
+# 転置(ビット番号 x*8+y -> y*8+x)のデルタスワップ
+_TRANSPOSE_SWAPS = (
+    (28, 0x0F0F0F0F00000000),
+    (14, 0x3333000033330000),
+    (7, 0x5500550055005500),
+)
+
+
+def _flip_y_(bits: int):
+    """ y方向の反転(各バイト内のビット反転)
+    """
+
+    for shift, mask in _FLIP_MASKS:
+        bits = ((bits >> shift) & mask) | ((bits & mask) << shift)
+
+    return bits
+
+
+def _flip_x_(bits: int):
+    """ x方向の反転(バイト順の反転)
+    """
+
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+def _transpose_(bits: int):
+    """ 転置
+    """
+
+    for shift, mask in _TRANSPOSE_SWAPS:
+        t = mask & (bits ^ (bits << shift))
+        bits ^= t ^ (t >> shift)
+
+    return bits & bitboard.FULL_MASK
+
+
+def transform_bits(bits: int, k: int):
+    """ ビットボードの対称変換
+
+    Args:
+        bits (int): ビットボード
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (int): 変換後のビットボード
+    """
+
+    if k & 1:
+        bits = _flip_y_(bits)
+    if k & 2:
+        bits = _flip_x_(bits)
+    if k & 4:
+        bits = _transpose_(bits)
+
+    return bits
+
+
+def transform_pos(mpos_index: tuple, k: int):
+    """ マス目インデックスの対称変換
+
+    Args:
+        mpos_index (tuple): マス目インデックス(x_index,y_index)
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (tuple): 変換後のマス目インデックス
+    """
+
+    x_index, y_index = mpos_index
+    last = bitboard.BOARD_SIZE - 1
+    if k & 1:
+        y_index = last - y_index
+    if k & 2:
+        x_index = last - x_index
+    if k & 4:
+        x_index, y_index = y_index, x_index
+
+    return x_index, y_index
+
+
+# 変換番号ごとのビット番号の対応表
+SQUARE_TABLES = tuple(
+    tuple(bitboard.pos_to_index(transform_pos(bitboard.index_to_pos(i), k))
+          for i in range(bitboard.SQUARE_COUNT))
+    for k in range(SYMMETRY_COUNT)
+)
+
+# 逆変換の変換番号
+INVERSE = tuple(
+    next(j for j in range(SYMMETRY_COUNT)
+         if all(SQUARE_TABLES[j][SQUARE_TABLES[k][i]] == i
+                for i in range(bitboard.SQUARE_COUNT)))
+    for k in range(SYMMETRY_COUNT)
+)
+
+
+def transform_index(index: int, k: int):
+    """ ビット番号の対称変換
+
+    Args:
+        index (int): ビット番号
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (int): 変換後のビット番号
+    """
+
+    return SQUARE_TABLES[k][index]
+
+
+def transform_move(move: str, k: int):
+    """ 指手文字列の対称変換
+
+    Args:
+        move (str): 指手文字列(例:'bF4')
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (str): 変換後の指手文字列
+    """
+
+    x_index, y_index = transform_pos(
+        (ord(move[1]) - 0x41, ord(move[2]) - 0x31), k)
+
+    return '{}{}{}'.format(move[0], chr(0x41 + x_index), chr(0x31 + y_index))
+
+
+def transform_process(process: str, k: int):
+    """ 棋譜文字列の対称変換
+
+    Args:
+        process (str): 棋譜文字列(例:'bF4wF5...')
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (str): 変換後の棋譜文字列
+    """
+
+    return ''.join(transform_move(move, k)
+                   for move in game_records.split_process(process))
+
+
+def transform_array(board: np.array, k: int):
+    """ 盤面配列の対称変換
+
+    Args:
+        board (np.array): 盤面配列、形状(..., 8, 8)[x_index, y_index]
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (np.array): 変換後の盤面配列(ビュー)
+    """
+
+    if k & 1:
+        board = board[..., ::-1]
+    if k & 2:
+        board = board[..., ::-1, :]
+    if k & 4:
+        board = np.swapaxes(board, -1, -2)
+
+    return board
+
+
+def canonical(player: int, opponent: int):
+    """ 局面の正規形
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (tuple): (手番側, 相手側, 変換番号)
+            8通りの変換のうち(手番側, 相手側)が最小となるもの
+    """
+
+    best = (player, opponent, IDENTITY)
+    for k in range(1, SYMMETRY_COUNT):
+        candidate = (transform_bits(player, k), transform_bits(opponent, k), k)
+        if candidate < best:
+            best = candidate
+
+    return best
+
+
+def canonical_hash(player: int, opponent: int):
+    """ 正規形のZobristハッシュ(対称な局面は同じ値)
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (int): 64bitハッシュ値
+    """
+
+    player, opponent, _ = canonical(player, opponent)
+
+    return transposition.zobrist_hash(player, opponent)
+
+
+# 初期局面を変えない変換(棋譜全体に適用できるのはこの4通り)
+GAME_SYMMETRIES = tuple(
+    k for k in range(SYMMETRY_COUNT)
+    if transform_bits(bitboard.INITIAL_BLACK, k) == bitboard.INITIAL_BLACK
+    and transform_bits(bitboard.INITIAL_WHITE, k) == bitboard.INITIAL_WHITE
+)
+
+
+def augment_record(game_record: dict):
+    """ 棋譜の対称変換
+
+    他の4通りは初期局面の黒白が入れ替わるため、棋譜としては
+    GAME_SYMMETRIESのみを適用する(局面単位ならaugment_positionsで8通り)。
+
+    Args:
+        game_record (dict): 棋譜(result,process)
+
+    Returns:
+        (list): 変換後の棋譜のリスト(先頭は元の棋譜)
+    """
+
+    return [
+        {'result': dict(game_record.get('result') or dict()),
+         'process': transform_process(game_record['process'], k)}
+        for k in GAME_SYMMETRIES
+    ]
+
+
+# 以下、uint64配列の一括変換
+
+_NP_FLIP_MASKS = tuple(
+    (np.uint64(shift), np.uint64(mask)) for shift, mask in _FLIP_MASKS)
+_NP_TRANSPOSE_SWAPS = tuple(
+    (np.uint64(shift), np.uint64(mask)) for shift, mask in _TRANSPOSE_SWAPS)
+
+
+def transform_bits_array(bits: np.array, k: int):
+    """ ビットボード配列の対称変換
+
+    Args:
+        bits (np.array): ビットボード(uint64)
+        k (int): 変換番号(0-7)
+
+    Returns:
+        (np.array): 変換後のビットボード(uint64)
+    """
+
+    bits = np.asarray(bits, dtype=np.uint64)
+    if k & 1:
+        for shift, mask in _NP_FLIP_MASKS:
+            bits = ((bits >> shift) & mask) | ((bits & mask) << shift)
+    if k & 2:
+        bits = bits.byteswap()
+    if k & 4:
+        for shift, mask in _NP_TRANSPOSE_SWAPS:
+            t = mask & (bits ^ (bits << shift))
+            bits = bits ^ t ^ (t >> shift)
+
+    return bits
+
+
+def canonical_array(player: np.array, opponent: np.array):
+    """ 局面配列の正規形
+
+    Args:
+        player (np.array): 手番側のビットボード(uint64)
+        opponent (np.array): 相手側のビットボード(uint64)
+
+    Returns:
+        (tuple): (手番側, 相手側, 変換番号) いずれもnp.array
+    """
+
+    best_player = np.array(player, dtype=np.uint64)
+    best_opponent = np.array(opponent, dtype=np.uint64)
+    best_k = np.zeros(len(best_player), dtype=np.int8)
+
+    for k in range(1, SYMMETRY_COUNT):
+        p = transform_bits_array(player, k)
+        o = transform_bits_array(opponent, k)
+        better = (p < best_player) | ((p == best_player) & (o < best_opponent))
+        best_player = np.where(better, p, best_player)
+        best_opponent = np.where(better, o, best_opponent)
+        best_k[better] = k
+
+    return best_player, best_opponent, best_k
+
+
+def augment_positions(positions: np.array, k: int = None, rng=None):
+    """ 局面レコード(position_dataset.POSITION_DTYPE)の対称変換
+
+    Args:
+        positions (np.array): 局面レコードの配列
+        k (int): 変換番号(未指定なら8通りすべてを連結、
+            -1なら局面ごとにランダムな1通り)
+        rng (np.random.Generator): k=-1の場合の乱数生成器
+
+    Returns:
+        (np.array): 変換後の局面レコードの配列
+    """
+
+    if k is None:
+        return np.concatenate(
+            [augment_positions(positions, k) for k in range(SYMMETRY_COUNT)])
+
+    if k < 0:
+        if rng is None:
+            rng = np.random.default_rng()
+        choices = rng.integers(SYMMETRY_COUNT, size=len(positions))
+        result = np.empty(len(positions), dtype=positions.dtype)
+        for k in range(SYMMETRY_COUNT):
+            selected = choices == k
+            result[selected] = augment_positions(positions[selected], k)
+        return result
+
+    result = np.array(positions, copy=True)
+    for name in ('black', 'white', 'legal'):
+        result[name] = transform_bits_array(positions[name], k)
+    table = np.array(SQUARE_TABLES[k], dtype=np.int8)
+    result['move'] = table[positions['move']]
+
+    return result
+
+
+def dedup_positions(positions: np.array):
+    """ 対称な局面の重複除去(最初の局面を残す)
+
+    Args:
+        positions (np.array): 局面レコードの配列
+
+    Returns:
+        (np.array): 重複を除いた局面レコードの配列(元の順序)
+    """
+
+    black, white, _ = canonical_array(positions['black'], positions['white'])
+
+    keys = np.empty(len(positions), dtype=[
+        ('turn', 'u1'), ('black', '<u8'), ('white', '<u8')])
+    keys['turn'] = positions['turn']
+    keys['black'] = black
+    keys['white'] = white
+    _, first = np.unique(keys, return_index=True)
+
+    return positions[np.sort(first)]
@@ -0,0 +1,91 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    test_batch_game.py
+
+Description:
+--------------------------------------------------------------------------------
+    一括対戦(batch_game.py)のテスト
+    同じシードの一括対戦とReversiCoreの逐次対戦を1手ずつ比較する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import unittest
+
+import batch_game
+import bitboard
+import reversi_core
+
+BLACK_PIECE = reversi_core.BLACK_PIECE
+WHITE_PIECE = reversi_core.WHITE_PIECE
+PASS = reversi_core.PASS
+
+
+class BatchGameTest(unittest.TestCase):
+    def test_matches_sequential_games(self):
+        """ 合法手・手番・終局・棋譜・勝敗がReversiCoreの逐次対戦と一致する
+        """
+
+        game_count = 64
+        batch = batch_game.BatchReversi(game_count, seed=0)
+        games = [reversi_core.ReversiCore() for _ in range(game_count)]
+        judges = [None] * game_count
+
+        while True:
+            # 逐次対戦側のパス・終了判定
+            for lane, game in enumerate(games):
+                if judges[lane] is not None:
+                    continue
+                ret = game.judge_trun(game.player_turn)
+                game.player_turn = ret['player_turn']
+                if ret.get('judge', PASS) != PASS:
+                    judges[lane] = ret['judge']
+
+            self.assertEqual(batch.is_over.tolist(),
+                             [judge is not None for judge in judges])
+            for lane, game in enumerate(games):
+                if judges[lane] is None:
+                    self.assertEqual(int(batch.player_turn[lane]),
+                                     game.player_turn)
+                    self.assertEqual(int(batch.legal_bits[lane]),
+                                     game.get_legal_bits())
+
+            if all(judge is not None for judge in judges):
+                break
+
+            # 一括対戦で選んだ手を逐次対戦にも着手
+            moves = batch.random_moves()
+            for lane, game in enumerate(games):
+                if judges[lane] is None:
+                    self.assertTrue(game.player_procedure(
+                        bitboard.index_to_pos(int(moves[lane]))))
+            batch.step(moves)
+
+        self.assertEqual(batch.judge().tolist(), judges)
+
+        counts = batch.count_pieces()
+        for lane, (record, game) in enumerate(
+                zip(batch.game_records(), games)):
+            self.assertEqual(record['process'], game.game_record['process'])
+            self.assertEqual(
+                (int(counts[BLACK_PIECE][lane]),
+                 int(counts[WHITE_PIECE][lane])),
+                tuple(game.piece_counts))
+
+    def test_illegal_move(self):
+        """ 非合法手はReversiExceptionで拒否する
+        """
+
+        batch = batch_game.BatchReversi(2, seed=0)
+
+        # 初期局面の空きマス(A1)は合法手ではない
+        with self.assertRaises(reversi_core.ReversiException):
+            batch.step([bitboard.pos_to_index((0, 0))] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,187 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    test_bitboard.py
+
+Description:
+--------------------------------------------------------------------------------
+    ビットボードの合法手・反転駒算出(bitboard.py, batch_game.py)のテスト
+    マス目ごとに8方向を走査する素朴な実装と比較する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import random
+import unittest
+
+import numpy as np
+
+import batch_game
+import benchmark
+import bitboard
+
+BOARD_SIZE = bitboard.BOARD_SIZE
+
+DIRECTIONS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+              if (dx, dy) != (0, 0)]
+
+
+def naive_flips(player: int, opponent: int, x_index: int, y_index: int):
+    """ 8方向を1マスずつ走査して反転駒を算出(空きマス以外は0)
+    """
+
+    def _bit_(x, y):
+        return 1 << bitboard.pos_to_index((x, y))
+
+    if (player | opponent) & _bit_(x_index, y_index):
+        return 0
+
+    flipped = 0
+    for dx, dy in DIRECTIONS:
+        line = 0
+        x, y = x_index + dx, y_index + dy
+        while 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE and \
+                opponent & _bit_(x, y):
+            line |= _bit_(x, y)
+            x, y = x + dx, y + dy
+        if line and 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE and \
+                player & _bit_(x, y):
+            flipped |= line
+
+    return flipped
+
+
+def naive_legal_moves(player: int, opponent: int):
+    """ 反転駒のある空きマスを合法手とする
+    """
+
+    moves = 0
+    for x_index in range(BOARD_SIZE):
+        for y_index in range(BOARD_SIZE):
+            if naive_flips(player, opponent, x_index, y_index):
+                moves |= 1 << bitboard.pos_to_index((x_index, y_index))
+
+    return moves
+
+
+def random_positions(count: int, seed: int = 0):
+    """ 各マスを空き・手番側・相手側からランダムに選んだ局面と対局中の局面
+
+    Returns:
+        (list): [(手番側, 相手側)]
+    """
+
+    rng = random.Random(seed)
+    positions = list()
+    for _ in range(count):
+        player = opponent = 0
+        for index in range(bitboard.SQUARE_COUNT):
+            value = rng.random()
+            if value < 0.3:
+                player |= 1 << index
+            elif value < 0.6:
+                opponent |= 1 << index
+        positions.append((player, opponent))
+
+    # 相手駒6個を挟む最長の並び(盤端の空きマスから全方向)
+    for x_index in range(BOARD_SIZE):
+        for y_index in range(BOARD_SIZE):
+            for dx, dy in DIRECTIONS:
+                x, y = x_index + dx * 7, y_index + dy * 7
+                if not (0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE):
+                    continue
+                opponent = 0
+                for step in range(1, 7):
+                    opponent |= 1 << bitboard.pos_to_index(
+                        (x_index + dx * step, y_index + dy * step))
+                positions.append(
+                    (1 << bitboard.pos_to_index((x, y)), opponent))
+
+    for black, white, turn in benchmark.fixed_positions(count, seed):
+        if turn == 0:
+            positions.append((black, white))
+        else:
+            positions.append((white, black))
+
+    return positions
+
+
+class BitboardTest(unittest.TestCase):
+    def setUp(self):
+        self.positions = random_positions(200)
+
+    def test_legal_moves(self):
+        """ 合法手が素朴な実装と一致する
+        """
+
+        for player, opponent in self.positions:
+            self.assertEqual(bitboard.legal_moves(player, opponent),
+                             naive_legal_moves(player, opponent))
+
+    def test_flips_and_play(self):
+        """ 全空きマスの反転駒と着手後の盤面が素朴な実装と一致する
+        """
+
+        for player, opponent in self.positions:
+            for index in bitboard.iter_bits(
+                    ~(player | opponent) & bitboard.FULL_MASK):
+                expected = naive_flips(
+                    player, opponent, *bitboard.index_to_pos(index))
+                self.assertEqual(
+                    bitboard.flips(player, opponent, index), expected)
+
+                played = bitboard.play(player, opponent, index)
+                if expected:
+                    self.assertEqual(played, (
+                        player | expected | (1 << index),
+                        opponent & ~expected))
+                else:
+                    self.assertIsNone(played)
+
+    def test_popcount(self):
+        """ 駒数が立っているビット数と一致する
+        """
+
+        for player, opponent in self.positions:
+            self.assertEqual(bitboard.popcount(player), bin(player).count('1'))
+
+    def test_batch_kernels(self):
+        """ 一括算出(batch_game)が素朴な実装と一致する
+        """
+
+        player = np.array([p for p, _ in self.positions], dtype=np.uint64)
+        opponent = np.array([o for _, o in self.positions], dtype=np.uint64)
+
+        moves = batch_game.legal_moves(player, opponent)
+        self.assertEqual(
+            [int(bits) for bits in moves],
+            [naive_legal_moves(p, o) for p, o in self.positions])
+
+        # 各局面の合法手を1つずつ着手
+        rng = random.Random(1)
+        move_bits = list()
+        expected = list()
+        for p, o in self.positions:
+            legal = list(bitboard.iter_bits(naive_legal_moves(p, o)))
+            if not legal:
+                move_bits.append(0)
+                expected.append(0)
+                continue
+            index = rng.choice(legal)
+            move_bits.append(1 << index)
+            expected.append(naive_flips(p, o, *bitboard.index_to_pos(index)))
+
+        flipped = batch_game.flips(
+            player, opponent, np.array(move_bits, dtype=np.uint64))
+        self.assertEqual([int(bits) for bits in flipped], expected)
+
+        self.assertEqual(
+            batch_game.popcount(player).tolist(),
+            [bin(p).count('1') for p, _ in self.positions])
+
+
+if __name__ == '__main__':
+    unittest.main()
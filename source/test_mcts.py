@@ -0,0 +1,52 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    test_mcts.py
+
+Description:
+--------------------------------------------------------------------------------
+    モンテカルロ木探索AI(mcts.py)のテスト
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import random
+import unittest
+
+import bitboard
+import mcts
+import reversi_core
+
+
+class MCTSSelectMoveTest(unittest.TestCase):
+    def assertLegalMove(self, game, pos):
+        turn = game.player_turn
+        moves = bitboard.legal_moves(
+            game.bit_boards[turn], game.bit_boards[1-turn])
+        self.assertTrue(moves & (1 << bitboard.pos_to_index(pos)))
+
+    def test_time_limit_expired(self):
+        """ 1回も反復する前に時間切れでも合法手を返す
+        """
+
+        game = reversi_core.ReversiCore()
+        ai = mcts.MCTSPlayer(playouts=None, time_limit=0.0,
+                             rng=random.Random(0))
+
+        self.assertLegalMove(game, ai.select_move(game))
+
+    def test_pool_full(self):
+        """ ノードプールが満杯で展開できなくても合法手を返す
+        """
+
+        game = reversi_core.ReversiCore()
+        ai = mcts.MCTSPlayer(playouts=10, max_nodes=1, rng=random.Random(0))
+
+        self.assertLegalMove(game, ai.select_move(game))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    test_packed_records.py
+
+Description:
+--------------------------------------------------------------------------------
+    棋譜のバイナリ形式(packed_records.py)のテスト
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import os
+import tempfile
+import unittest
+
+import benchmark
+import packed_records
+
+
+def game_records(count: int, seed: int = 0):
+    """ 固定シードの棋譜(奇数局は結果未記録)
+    """
+
+    records = list()
+    for number, process in enumerate(benchmark.fixed_records(count, seed)):
+        if number % 2:
+            result = {'black': None, 'wihte': None}
+        else:
+            result = {'black': 30 + number, 'wihte': 34 - number}
+        records.append({'result': result, 'process': process})
+
+    return records
+
+
+class PackedRecordsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.directory.name, 'games.rvb')
+        self.index_path = self.file_path + packed_records.INDEX_SUFFIX
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_records(self, records: list):
+        with packed_records.PackedRecordWriter(self.file_path) as writer:
+            for record in records:
+                writer.write(record)
+
+    def read_records(self):
+        with packed_records.PackedRecordReader(self.file_path) as reader:
+            return list(reader), [reader.read(number)
+                                  for number in range(len(reader))]
+
+    def test_round_trip(self):
+        """ 書き込んだ棋譜を順番にも索引からも同じ内容で読み込める
+        """
+
+        records = game_records(6)
+        self.write_records(records[:4])
+        # 既存ファイルへの追記
+        self.write_records(records[4:])
+
+        iterated, indexed = self.read_records()
+
+        self.assertEqual(iterated, records)
+        self.assertEqual(indexed, records)
+
+    def test_recover_truncated_game(self):
+        """ 末尾の局が切れたファイルは索引を作り直して追記できる
+        """
+
+        records = game_records(4)
+        self.write_records(records[:3])
+
+        # 3局目の途中で切れて索引も失われた状態
+        size = os.path.getsize(self.file_path)
+        with open(self.file_path, 'r+b') as f:
+            f.truncate(size - 5)
+        os.remove(self.index_path)
+
+        self.write_records(records[3:])
+
+        iterated, indexed = self.read_records()
+        expected = records[:2] + records[3:]
+
+        self.assertEqual(iterated, expected)
+        self.assertEqual(indexed, expected)
+
+    def test_rebuild_index(self):
+        """ rebuild_indexは完全な局だけを索引にして切れた局を切り詰める
+        """
+
+        records = game_records(3)
+        self.write_records(records)
+        size = os.path.getsize(self.file_path)
+        with open(self.file_path, 'ab') as f:
+            f.write(packed_records.GAME_HEADER.pack(60, 0, 0, 0) + b'\x00')
+
+        self.assertEqual(packed_records.rebuild_index(self.file_path), 3)
+        self.assertEqual(os.path.getsize(self.file_path), size)
+        self.assertEqual(self.read_records()[0], records)
+
+    def test_invalid_header(self):
+        """ 形式の異なるファイルは読み込みも追記もしない
+        """
+
+        with open(self.file_path, 'wb') as f:
+            f.write(b'not a packed record file')
+
+        with self.assertRaises(ValueError):
+            packed_records.PackedRecordWriter(self.file_path)
+        with self.assertRaises(ValueError):
+            packed_records.rebuild_index(self.file_path)
+        self.assertFalse(os.path.exists(self.index_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
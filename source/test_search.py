@@ -0,0 +1,66 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    test_search.py
+
+Description:
+--------------------------------------------------------------------------------
+    探索AI(search.py)のテスト
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import random
+import time
+import unittest
+
+import benchmark
+import bitboard
+import endgame
+import search
+
+
+def endgame_position(empties: int, seed: int = 0):
+    """ 空きマスがempties個の局面(手番側, 相手側)
+    """
+
+    rng = random.Random(seed)
+    while True:
+        _, positions = benchmark.random_game(rng)
+        for black, white, turn in positions:
+            if bitboard.SQUARE_COUNT - bitboard.popcount(black | white) \
+                    == empties:
+                if turn == 0:
+                    return black, white
+                return white, black
+
+
+class SearchTimeoutTest(unittest.TestCase):
+    def test_deepening_after_solver_timeout(self):
+        """ 完全読みが時間切れでも反復深化が深さ1で打ち切られない
+        """
+
+        player, opponent = endgame_position(14)
+        moves = bitboard.legal_moves(player, opponent)
+        self.assertGreater(bitboard.popcount(moves), 1)
+
+        ai = search.SearchPlayer(time_limit=0.4, endgame_empties=14)
+
+        def _timeout_(player, opponent, isWLD=False, deadline=None):
+            # 打ち切り時刻まで読んだ後に時間切れ
+            time.sleep(max(0.0, deadline - time.perf_counter()))
+            raise endgame.SolverTimeout()
+
+        ai.endgame.best_move = _timeout_
+
+        index = ai.search(player, opponent)
+
+        self.assertTrue(moves & (1 << index))
+        self.assertGreater(ai.depth, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
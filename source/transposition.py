@@ -0,0 +1,150 @@
+"""
+FileName:
+--------------------------------------------------------------------------------
+    transposition.py
+
+Description:
+--------------------------------------------------------------------------------
+    リバーシの置換表
+    局面はZobristハッシュで引き、固定サイズ・深さ優先で置き換える。
+    search.py(中盤探索)とendgame.py(終盤完全読み)で共用する。
+
+History:
+--------------------------------------------------------------------------------
+    2022/01/06 作成
+
+"""
+
+import random
+
+import bitboard
+
+# 置換表のフラグ
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+def _zobrist_tables_(seed: int):
+    """ Zobristハッシュ用のバイト単位の表
+
+    マス目ごとの乱数をバイト単位でXORしておき、
+    1局面16回の参照でハッシュ値を求める。
+
+    Args:
+        seed (int): 乱数シード
+
+    Returns:
+        (tuple): (手番側の表, 相手側の表)
+    """
+
+    rng = random.Random(seed)
+    result = list()
+    for _ in range(2):
+        keys = [rng.getrandbits(64) for _ in range(bitboard.SQUARE_COUNT)]
+        tables = list()
+        for k in range(8):
+            table = list()
+            for value in range(256):
+                key = 0
+                for j in range(8):
+                    if value >> j & 1:
+                        key ^= keys[k * 8 + j]
+                table.append(key)
+            tables.append(table)
+        result.append(tables)
+
+    return tuple(result)
+
+
+ZOBRIST_TABLES = _zobrist_tables_(0x5EED)
+
+
+def zobrist_hash(player: int, opponent: int):
+    """ 局面のZobristハッシュ
+
+    Args:
+        player (int): 手番側のビットボード
+        opponent (int): 相手側のビットボード
+
+    Returns:
+        (int): 64bitハッシュ値
+    """
+
+    p_tables, o_tables = ZOBRIST_TABLES
+    h = 0
+    for k in range(8):
+        shift = k * 8
+        h ^= p_tables[k][player >> shift & 0xFF]
+        h ^= o_tables[k][opponent >> shift & 0xFF]
+
+    return h
+
+
+class TranspositionTable():
+    def __init__(self, size_bits: int = 20):
+        """ 初期化
+
+        Args:
+            size_bits (int): エントリ数(2のsize_bits乗)
+        """
+
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.clear()
+
+        return
+
+    def clear(self):
+        """ 全エントリの消去
+        """
+
+        self.entries = [None] * self.size
+        self.age = 0
+
+        return
+
+    def new_search(self):
+        """ 探索開始(古いエントリを置き換え対象にする)
+        """
+
+        self.age += 1
+
+        return
+
+    def probe(self, key: int):
+        """ エントリの参照
+
+        Args:
+            key (int): Zobristハッシュ
+
+        Returns:
+            (tuple): (key, depth, value, flag, move, age)、なければNone
+        """
+
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+
+        return None
+
+    def store(self, key: int, depth: int, value: int, flag: int, move: int):
+        """ エントリの保存
+
+        空き・別局面の古いエントリ・同じ深さ以下のエントリを置き換える。
+
+        Args:
+            key (int): Zobristハッシュ
+            depth (int): 残り探索深さ
+            value (int): 評価値
+            flag (int): EXACT/LOWER/UPPER
+            move (int): 最善手のビット番号(なければ-1)
+        """
+
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[5] != self.age or depth >= entry[1] or \
+                entry[0] == key:
+            self.entries[index] = (key, depth, value, flag, move, self.age)
+
+        return